@@ -2,23 +2,43 @@
 SSS (Sight Seeing System) - FastAPI Backend
 Main application file with API endpoints
 """
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from app import models
-from app.database import get_db
-
-from app.routers import (
-    user_router,
-    category_router,
-    location_router,
-    review_router,
-    itinerary_router,
-)
-from app.routers.vietmap_routes import router as vietmap_router
-from app.routers.recommendation_vietmap_routes import router as recommend_vietmap_router
-from app.routers.ai_routes import router as ai_router
-from app.routers.ai_recommend_routes import router as ai_recommend_router
+import importlib
+import os
+
+from app.startup_report import timed, startup_report, print_startup_report
+
+with timed("fastapi"):
+    from fastapi import FastAPI, Depends, HTTPException
+    from fastapi.middleware.cors import CORSMiddleware
+    from sqlalchemy.orm import Session
+with timed("app.models, app.database"):
+    from app import models
+    from app.database import get_db
+with timed("app.services"):
+    importlib.import_module("app.services")
+
+with timed("app.routers"):
+    from app.routers import (
+        user_router,
+        category_router,
+        location_router,
+        review_router,
+        itinerary_router,
+    )
+with timed("app.routers.vietmap_routes"):
+    from app.routers.vietmap_routes import router as vietmap_router
+with timed("app.routers.recommendation_vietmap_routes"):
+    from app.routers.recommendation_vietmap_routes import router as recommend_vietmap_router
+
+# AI_ROUTES_ENABLED=0 leaves the AI routes out, for a worker group that
+# never serves /api/ai (route /api/ai to workers with it enabled).
+# AI_WARMUP=1 builds the AI service at startup instead of on first use.
+# STARTUP_REPORT_ENABLED=1 serves /api/startup-report (debugging only: it
+# is unauthenticated and shows module internals); the report is printed
+# at startup either way.
+AI_ROUTES_ENABLED = os.getenv("AI_ROUTES_ENABLED", "1").lower() in ("1", "true", "on", "yes")
+AI_WARMUP = os.getenv("AI_WARMUP", "0").lower() in ("1", "true", "on", "yes")
+STARTUP_REPORT_ENABLED = os.getenv("STARTUP_REPORT_ENABLED", "0").lower() in ("1", "true", "on", "yes")
 
 
 app = FastAPI(
@@ -29,8 +49,14 @@ app = FastAPI(
 
 app.include_router(vietmap_router)
 app.include_router(recommend_vietmap_router)
-app.include_router(ai_router)
-app.include_router(ai_recommend_router)
+
+if AI_ROUTES_ENABLED:
+    with timed("app.routers.ai_routes"):
+        from app.routers.ai_routes import router as ai_router
+    with timed("app.routers.ai_recommend_routes"):
+        from app.routers.ai_recommend_routes import router as ai_recommend_router
+    app.include_router(ai_router)
+    app.include_router(ai_recommend_router)
 
 # CORS middleware
 app.add_middleware(
@@ -58,6 +84,23 @@ async def root():
     }
 
 
+@app.on_event("startup")
+async def report_startup():
+    """Warm up the AI stack if asked, then print the startup report."""
+    if AI_ROUTES_ENABLED and AI_WARMUP:
+        from app.services.ai_service import get_ai_service
+
+        get_ai_service()
+    print_startup_report()
+
+
+if STARTUP_REPORT_ENABLED:
+    @app.get("/api/startup-report")
+    async def get_startup_report():
+        """Import and init cost per module (AI init appears after first use)"""
+        return startup_report()
+
+
 @app.get("/health")
 async def health_check(db: Session = Depends(get_db)):
     """Health check endpoint"""
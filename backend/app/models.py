@@ -1,7 +1,7 @@
 """
 SQLAlchemy ORM Models
 """
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Date, Text, ForeignKey, ARRAY, CheckConstraint
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, Date, Text, ForeignKey, ARRAY, CheckConstraint, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -56,6 +56,21 @@ class Location(Base):
     rating = Column(Float)
     review_count = Column(Integer, default=0)
 
+    # Ratings imported with the location (e.g. 4.7 from 1500 source
+    # reviews) that have no rows in reviews; rating and review_count
+    # combine them with the platform reviews below
+    base_review_count = Column(Integer, nullable=False, default=0)
+    base_rating_sum = Column(Float, nullable=False, default=0)
+
+    # Running aggregates of the platform reviews, maintained on every
+    # review write
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count_1 = Column(Integer, nullable=False, default=0)
+    rating_count_2 = Column(Integer, nullable=False, default=0)
+    rating_count_3 = Column(Integer, nullable=False, default=0)
+    rating_count_4 = Column(Integer, nullable=False, default=0)
+    rating_count_5 = Column(Integer, nullable=False, default=0)
+
     opening_hours = Column(JSONB)
     closing_hours = Column(JSONB)
 
@@ -100,6 +115,7 @@ class Review(Base):
     
     __table_args__ = (
         CheckConstraint("rating >= 1 AND rating <= 5", name='check_review_rating'),
+        UniqueConstraint('user_id', 'location_id', name='uq_reviews_user_location'),
     )
     
     # Relationships
@@ -1,14 +1,27 @@
 # app/routers/ai_recommend_routes.py
 
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.ai_service import AIService
+from app.services.ai_service import get_ai_service, track_llm_usage
+from app.services.chat_sessions import (
+    load_session,
+    merge_intent,
+    record_turn,
+    save_session,
+    session_context,
+    session_summary,
+)
+from app.services.reply_templates import render_recommendation_reply
 from app.services.recommend_vietmap import generate_recommendations_vietmap
+from app.services.category_index import get_category_index
+from app.services.intent_rules import get_gazetteer
 from app.database import get_db
 from app.services.user_service import UserService
 from app.services.location_service import LocationService
 from app.services.vietmap_service import VietMapService
 import json
+import os
 
 router = APIRouter(prefix="/api/ai", tags=["AI Recommend Chat"])
 
@@ -16,9 +29,14 @@ router = APIRouter(prefix="/api/ai", tags=["AI Recommend Chat"])
 class ChatRequest(BaseModel):
     message: str
     user_id: str  # FE gửi userId để AI biết người này là ai
+    session_id: str | None = None  # giữ ngữ cảnh giữa các lượt chat
 
 
-ai = AIService()
+# Latency budget (seconds) for the LLM reply; past it a template reply is sent
+RECOMMEND_ANSWER_BUDGET = float(os.getenv("RECOMMEND_ANSWER_BUDGET", "2.5"))
+
+# Keep proxies (nginx) from buffering the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 
 @router.post("/recommend-chat")
@@ -27,52 +45,169 @@ async def recommend_chat(req: ChatRequest, db=Depends(get_db)):
     # 1. AI PARSE
     # ---------------------------------------
 
-    parsed_raw = await ai.parse_user_message(req.message)
+    # Only what this turn adds: earlier turns are in the session
+    session = load_session(req.session_id)
+    with track_llm_usage() as usage:
+        parsed = await parse_turn(req.message, session, db)
+        if parsed is None:
+            response = {"reply": "Xin lỗi, hệ thống không hiểu yêu cầu này."}
+        else:
+            response = await recommend_from_intent(
+                parsed, req.message, req.user_id, db, session=session
+            )
+
+    record_turn(session, usage, response.get("selected_locations", []))
+    save_session(session)
+    response["session"] = session_summary(session)
+    return response
+
+
+async def parse_turn(message: str, session: dict, db):
+    """Extract this turn's intent delta and merge it into the session (None if unparsable)."""
+    parsed_raw = await get_ai_service().parse_user_message(
+        message, gazetteer=get_gazetteer(db), context=session_context(session)
+    )
     try:
-        parsed = json.loads(parsed_raw)
+        delta = json.loads(parsed_raw)
     except:
-        return {"reply": "Xin lỗi, hệ thống không hiểu yêu cầu này."}
+        return None
+    if "error" in delta:
+        # Parse failed: keep what earlier turns established
+        delta = {"raw_text": message}
+    return merge_intent(session, delta)
+
+
+async def recommend_from_intent(
+    parsed: dict,
+    message: str,
+    user_id: str,
+    db,
+    session: dict = None
+):
+    """Run steps 2-4 of recommend-chat on an already extracted intent."""
+    results, fallback_reply = await select_from_intent(parsed, user_id, db, session)
+    if not results:
+        return {"reply": fallback_reply}
 
-    # ---------------------------------------
-    # 2. XỬ LÝ DỮ LIỆU TỪ KẾT QUẢ PARSED
-    # ---------------------------------------
+    reply, reply_source = await answer_within_budget(results, message)
 
-    start_location_name = parsed.get("start")
+    return {
+        "reply": reply,
+        "reply_source": reply_source,
+        "selected_locations": selected_locations(results),
+    }
 
-    start_point = None
 
-    if start_location_name:
-        try:
-            geo_res = await VietMapService.geocode(start_location_name)
+async def answer_within_budget(results: list, message: str):
+    """
+    LLM reply if it arrives within RECOMMEND_ANSWER_BUDGET, else the
+    template reply. Returns (reply, "llm" | "template").
+    """
+    try:
+        reply = await get_ai_service().generate_short_answer(
+            build_answer_prompt(results, message), timeout=RECOMMEND_ANSWER_BUDGET
+        )
+        return reply, "llm"
+    except Exception as e:
+        print(f"AI answer fallback to template: {e!r}")
+        return render_recommendation_reply(results, message), "template"
 
-            found_location = False
-            if isinstance(geo_res, dict) and geo_res.get("code") == "OK":
-                features = geo_res.get("data", {}).get("features", [])
-                if features and len(features) > 0:
-                    coords = features[0].get("geometry", {}).get("coordinates", [])
-                    if len(coords) >= 2:
-                        start_point = {"lat": coords[1], "lng": coords[0]}
-                        found_location = True
 
-            elif isinstance(geo_res, list) and len(geo_res) > 0:
-                first = geo_res[0]
-                if "lat" in first and "lng" in first:
-                    start_point = {"lat": first["lat"], "lng": first["lng"]}
-                    found_location = True
+@router.post("/recommend-chat/stream")
+async def recommend_chat_stream(req: ChatRequest, db=Depends(get_db)):
+    """
+    Streaming recommend-chat (Server-Sent Events):
 
-            if not found_location:
-                # Nếu không tìm thấy tọa độ, nhưng có tên, ta không thể tính khoảng cách
-                print(f"Không tìm thấy tọa độ cho: {start_location_name}")
+    - event "locations": selected_locations, as soon as scoring is done
+    - event "token": pieces of the reply while Gemini writes it
+    - event "done": the full reply
+    - event "error": the reply could not be (fully) generated
+    """
+    session = load_session(req.session_id)
+
+    async def turn_events(picked: list):
+        parsed = await parse_turn(req.message, session, db)
+        if parsed is None:
+            yield sse_event("done", {"reply": "Xin lỗi, hệ thống không hiểu yêu cầu này."})
+            return
+
+        results, fallback_reply = await select_from_intent(parsed, req.user_id, db, session)
+        if not results:
+            yield sse_event("locations", {"selected_locations": []})
+            yield sse_event("done", {"reply": fallback_reply})
+            return
+
+        picked.extend(selected_locations(results))
+        yield sse_event("locations", {"selected_locations": picked})
+        async for event in stream_reply(
+            build_answer_prompt(results, req.message),
+            fallback=render_recommendation_reply(results, req.message)
+        ):
+            yield event
+
+    async def events():
+        picked = []
+        with track_llm_usage() as usage:
+            async for event in turn_events(picked):
+                yield event
+        record_turn(session, usage, picked)
+        save_session(session)
+        yield sse_event("session", session_summary(session))
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_reply(prompt: str, fallback: str = None):
+    """
+    Stream AIService.stream_short_answer as "token" events, then "done" (or
+    "error"). If the model fails before its first piece, a fallback
+    reply is sent as "done" instead.
+    """
+    pieces = []
+    try:
+        async for text in get_ai_service().stream_short_answer(prompt):
+            pieces.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        print(f"AI stream Error: {e!r}")
+        if fallback and not pieces:
+            yield sse_event("done", {"reply": fallback, "reply_source": "template"})
+        else:
+            yield sse_event("error", {"reply": "".join(pieces)})
+        return
+    yield sse_event("done", {"reply": "".join(pieces)})
+
+
+async def select_from_intent(parsed: dict, user_id: str, db, session: dict = None):
+    """
+    Geocode the start point and score locations for an extracted intent.
 
-        except Exception as e:
-            print(f"Geocode error: {e}")
+    With a session, its start point is reused (and a newly geocoded one
+    stored), so an unchanged start is geocoded once per conversation.
+
+    Returns:
+        (results, None) with the selected locations, or (None, reply)
+        with the message to send when nothing can be recommended
+    """
+    # ---------------------------------------
+    # 2. XỬ LÝ DỮ LIỆU TỪ KẾT QUẢ PARSED
+    # ---------------------------------------
+
+    start_point = session.get("start_point") if session else None
+    if start_point is None:
+        start_point = await geocode_start(parsed.get("start"))
+        if session is not None:
+            session["start_point"] = start_point
 
     if not start_point:
-        return {
-            "reply": "Tôi cần biết vị trí xuất phát của bạn để gợi ý (ví dụ: 'Tôi đang ở Chợ Bến Thành')."
-        }
+        return None, "Tôi cần biết vị trí xuất phát của bạn để gợi ý (ví dụ: 'Tôi đang ở Chợ Bến Thành')."
 
-    user = UserService(db).get_user_with_history(req.user_id)
+    user = UserService(db).get_user_with_history(user_id)
     locations = LocationService(db).get_all()
 
     raw_prefs = parsed.get("preferences", {})
@@ -103,16 +238,51 @@ async def recommend_chat(req: ChatRequest, db=Depends(get_db)):
         payload=payload_dict,
         user_prefs=prefs,
         max_stops=3,  # Mặc định hoặc lấy từ parsed
+        category_index=get_category_index(db),
     )
 
+    if not results:
+        return None, "Tôi chưa tìm được địa điểm phù hợp, bạn thử mô tả rõ hơn nhé!"
+    return results, None
+
+
+async def geocode_start(start_location_name: str):
+    """Coordinates {lat, lng} of the start place named by the user, or None."""
+    start_point = None
+
+    if start_location_name:
+        try:
+            geo_res = await VietMapService.geocode(start_location_name)
+
+            found_location = False
+            if isinstance(geo_res, dict) and geo_res.get("code") == "OK":
+                features = geo_res.get("data", {}).get("features", [])
+                if features and len(features) > 0:
+                    coords = features[0].get("geometry", {}).get("coordinates", [])
+                    if len(coords) >= 2:
+                        start_point = {"lat": coords[1], "lng": coords[0]}
+                        found_location = True
+
+            elif isinstance(geo_res, list) and len(geo_res) > 0:
+                first = geo_res[0]
+                if "lat" in first and "lng" in first:
+                    start_point = {"lat": first["lat"], "lng": first["lng"]}
+                    found_location = True
+
+            if not found_location:
+                # Nếu không tìm thấy tọa độ, nhưng có tên, ta không thể tính khoảng cách
+                print(f"Không tìm thấy tọa độ cho: {start_location_name}")
+
+        except Exception as e:
+            print(f"Geocode error: {e}")
+
+    return start_point
+
+
+def build_answer_prompt(results: list, message: str) -> str:
     # ---------------------------------------
     # 4. TẠO CÂU TRẢ LỜI CONVERSATIONAL
     # ---------------------------------------
-    if not results:
-        return {
-            "reply": "Tôi chưa tìm được địa điểm phù hợp, bạn thử mô tả rõ hơn nhé!"
-        }
-
     # Build danh sách location cho AI
     summary = "\n".join(
         [
@@ -121,7 +291,7 @@ async def recommend_chat(req: ChatRequest, db=Depends(get_db)):
         ]
     )
 
-    prompt_answer = f"""
+    return f"""
     Viết câu trả lời ngắn gọn, thân thiện kiểu hướng dẫn viên du lịch.
 
     Dựa trên các địa điểm đã được hệ thống chọn:
@@ -129,22 +299,19 @@ async def recommend_chat(req: ChatRequest, db=Depends(get_db)):
     {summary}
 
     Người dùng đã hỏi:
-    "{req.message}"
+    "{message}"
 
     Hãy trả lời bằng 2–3 câu, không lan man.
     """
 
-    reply = await ai.generate_short_answer(prompt_answer)
 
-    return {
-        "reply": reply,
-        "selected_locations": [
-            {
-                "id": r["location_id"],
-                "name": r["name_vi"],
-                "district": r["district"],
-                "score": r["score"],
-            }
-            for r in results
-        ],
-    }
+def selected_locations(results: list) -> list:
+    return [
+        {
+            "id": r["location_id"],
+            "name": r["name_vi"],
+            "district": r["district"],
+            "score": r["score"],
+        }
+        for r in results
+    ]
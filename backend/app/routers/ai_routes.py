@@ -1,55 +1,150 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.ai_service import AIService
-from app.routers.ai_recommend_routes import recommend_chat
+from app.database import get_db
+from app.services.ai_service import get_ai_service, track_llm_usage
+from app.services.chat_sessions import (
+    load_session,
+    merge_intent,
+    record_turn,
+    save_session,
+    session_context,
+    session_summary,
+)
+from app.services.intent_rules import get_gazetteer, rule_stats
+from app.services.llm_scheduler import llm_scheduler
+from app.services.llm_hedging import hedging_metrics
+from app.routers.ai_recommend_routes import (
+    SSE_HEADERS,
+    recommend_from_intent,
+    stream_reply,
+)
 
 router = APIRouter(prefix="/api/ai", tags=["AI"])
 
+# Sent when the model fails or misses its deadline
+CHAT_FALLBACK_REPLY = (
+    "Xin lỗi, hiện mình chưa trả lời được. "
+    "Bạn thử lại sau ít phút hoặc hỏi mình gợi ý địa điểm nhé."
+)
+
 
 class AIRequest(BaseModel):
     message: str
     
 class ChatRouterRequest(BaseModel):
     message: str
-    user_id: int | None = None
-
+    user_id: str | None = None
+    session_id: str | None = None  # returned as session.session_id after each turn
 
-ai_service = AIService()
 
 
 @router.post("/parse")
 async def parse_message(req: AIRequest):
-    result = await ai_service.parse_user_message(req.message)
+    result = await get_ai_service().parse_user_message(req.message)
     return {"ai_result": result}
 
 
 @router.post("/chat")
 async def chat(req: AIRequest):
-    return {"reply": await ai_service.generate_short_answer(req.message)}
+    return {"reply": await short_reply(req.message)}
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: AIRequest):
+    """Streaming /chat: "token" events while Gemini writes, then "done"."""
+    return StreamingResponse(
+        stream_reply(req.message), media_type="text/event-stream", headers=SSE_HEADERS
+    )
 
 
 @router.post("/chat-router")
-async def chat_router(req: ChatRouterRequest):
-    decision = await ai_service.classify_mode(req.message)
+async def chat_router(req: ChatRouterRequest, response: Response, db=Depends(get_db)):
+    session = load_session(req.session_id)
+    with track_llm_usage() as usage:
+        result = await _route_chat(req, db, session)
+
+    record_turn(session, usage, result["selected_locations"])
+    save_session(session)
+    result["session"] = session_summary(session)
+
+    # Debug headers: LLM round-trips spent on this request
+    response.headers["X-LLM-Calls"] = str(usage["calls"])
+    response.headers["X-LLM-Prompt-Tokens"] = str(result["session"]["prompt_tokens"])
+    response.headers["X-LLM-Cache-Hits"] = str(usage["cache_hits"])
+    response.headers["X-LLM-Strategy"] = result.pop("strategy")
+    response.headers["X-Intent-Rule-Hit-Rate"] = str(rule_stats()["hit_rate"])
+    return result
+
+
+@router.get("/intent-rules/stats")
+def intent_rule_stats():
+    """How often the rule fast path answered without an LLM call."""
+    return rule_stats()
+
+
+@router.get("/scheduler/stats")
+def scheduler_stats():
+    """LLM slots in use, queue depth and wait times per lane."""
+    return llm_scheduler.metrics()
+
+
+@router.get("/hedging/stats")
+def hedging_stats():
+    """Hedge rate, hedge win rate, fallbacks and latency per model."""
+    return hedging_metrics()
+
+
+async def short_reply(message: str) -> str:
+    """
+    LLM chat reply, or CHAT_FALLBACK_REPLY when the call fails or misses
+    its deadline (LLMTimeout), so the request never ends in a 500.
+    """
+    try:
+        return await get_ai_service().generate_short_answer(message)
+    except Exception as e:
+        print(f"AI chat fallback reply: {e!r}")
+        return CHAT_FALLBACK_REPLY
+
+
+async def _route_chat(req: ChatRouterRequest, db, session: dict) -> dict:
+    # Rules first, then mode and intent in one call (see AIService.route_message);
+    # earlier turns are sent as context so only this turn's changes are extracted
+    routed = await get_ai_service().route_message(
+        req.message, gazetteer=get_gazetteer(db), context=session_context(session)
+    )
 
     # If recommend was chosen, we need user_id for your recommend-chat logic
-    if decision["mode"] == "recommend":
+    if routed["mode"] == "recommend":
         if req.user_id is None:
             return {
                 "mode": "recommend",
                 "reply": "Bạn muốn mình gợi ý lịch trình/địa điểm. Cho mình user_id (để cá nhân hoá) hoặc nói rõ điểm xuất phát nhé.",
-                "selected_locations": []
+                "selected_locations": [],
+                "strategy": routed["strategy"]
             }
 
-        # Call existing recommend-chat endpoint logic
-        resp = await recommend_chat({"message": req.message, "user_id": req.user_id})
+        if routed["intent"] is None and not session["intent"]:
+            resp = {"reply": "Xin lỗi, hệ thống không hiểu yêu cầu này."}
+        else:
+            # Reuse the extracted intent instead of parsing the message again
+            intent = merge_intent(session, routed["intent"] or {"raw_text": req.message})
+            resp = await recommend_from_intent(
+                intent, req.message, req.user_id, db, session=session
+            )
         # Ensure unified shape
         return {
             "mode": "recommend",
             "reply": resp.get("reply", ""),
-            "selected_locations": resp.get("selected_locations", [])
+            "selected_locations": resp.get("selected_locations", []),
+            "strategy": routed["strategy"]
         }
 
     # Normal chat
-    reply = await ai_service.generate_short_answer(req.message)
-    return {"mode": "chat", "reply": reply, "selected_locations": []}
\ No newline at end of file
+    reply = await short_reply(req.message)
+    return {
+        "mode": "chat",
+        "reply": reply,
+        "selected_locations": [],
+        "strategy": routed["strategy"]
+    }
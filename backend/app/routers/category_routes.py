@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.services.category_service import CategoryService
-from app.schemas.category_schema import CategoryResponse
+from app.schemas.category_schema import CategoryResponse, CategoryCountResponse
 
 router = APIRouter(prefix="/api/categories", tags=["Categories"])
 
@@ -12,6 +12,11 @@ def list_categories(db: Session = Depends(get_db)):
     return CategoryService(db).get_all()
 
 
+@router.get("/counts", response_model=list[CategoryCountResponse])
+def list_categories_with_counts(db: Session = Depends(get_db)):
+    return CategoryService(db).get_all_with_counts()
+
+
 @router.get("/{category_id}", response_model=CategoryResponse)
 def get_category(category_id: int, db: Session = Depends(get_db)):
     return CategoryService(db).get_by_id(category_id)
@@ -1,8 +1,21 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.services.itinerary_service import ItineraryService
-from app.schemas.itinerary_schema import ItineraryCreate, ItineraryResponse
+from app.services.itinerary_pipeline import build_itinerary_from_recommendations
+from app.services.itinerary_export import EXPORT_FORMATS
+from app.schemas.itinerary_schema import (
+    ItineraryCreate,
+    ItineraryResponse,
+    ItineraryDetailResponse,
+    ItineraryEditRequest,
+    ItineraryEditResponse,
+    ItineraryReorderRequest,
+    ItineraryBuildRequest,
+    ItineraryBuildResponse,
+)
 
 router = APIRouter(prefix="/api/itineraries", tags=["Itineraries"])
 
@@ -12,11 +25,111 @@ def create_itinerary(data: ItineraryCreate, db: Session = Depends(get_db)):
     return ItineraryService(db).create_itinerary(data.dict())
 
 
-@router.get("/{itinerary_id}", response_model=ItineraryResponse)
+@router.post("/from-recommendations", response_model=ItineraryBuildResponse)
+async def build_from_recommendations(
+    data: ItineraryBuildRequest,
+    db: Session = Depends(get_db)
+):
+    if "lat" not in data.start_point or "lng" not in data.start_point:
+        raise HTTPException(status_code=422, detail="start_point needs lat and lng")
+    if not 1 <= data.max_stops <= 10:
+        raise HTTPException(status_code=422, detail="max_stops must be between 1 and 10")
+
+    result = await build_itinerary_from_recommendations(
+        db,
+        data.user_id,
+        start_point=data.start_point,
+        preferences=data.preferences,
+        max_stops=data.max_stops,
+        transport_mode=data.transport_mode,
+        name=data.name,
+        trip_date=data.trip_date
+    )
+    if not result:
+        raise HTTPException(
+            status_code=400,
+            detail="User not found or no locations could be recommended"
+        )
+    return result
+
+
+@router.get("/{itinerary_id}", response_model=ItineraryDetailResponse)
 def get_details(itinerary_id: str, db: Session = Depends(get_db)):
-    return ItineraryService(db).get_itinerary_details(itinerary_id)
+    details = ItineraryService(db).get_itinerary_details(itinerary_id)
+    if not details:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+    return details
+
+
+@router.get("/{itinerary_id}/export")
+def export_itinerary(
+    itinerary_id: str,
+    format: str = "geojson",
+    db: Session = Depends(get_db)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}"
+        )
+    service = ItineraryService(db)
+    itinerary = service.get_by_id(itinerary_id)
+    if not itinerary:
+        raise HTTPException(status_code=404, detail="Itinerary not found")
+
+    media_type, extension, exporter = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        exporter(itinerary, lambda: service.iter_itinerary_locations(itinerary.id)),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="itinerary-{itinerary.id}.{extension}"'
+        }
+    )
+
+
+@router.get("/user/{user_id}", response_model=list[ItineraryDetailResponse])
+def get_by_user(
+    user_id: str,
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    return ItineraryService(db).get_user_itineraries_details(
+        user_id, status=status, skip=skip, limit=limit
+    )
+
+
+@router.patch("/{itinerary_id}/stops", response_model=ItineraryEditResponse)
+async def edit_stops(
+    itinerary_id: str,
+    data: ItineraryEditRequest,
+    db: Session = Depends(get_db)
+):
+    details = await ItineraryService(db).apply_itinerary_edits(
+        itinerary_id,
+        [op.model_dump(exclude_none=True) for op in data.operations]
+    )
+    if not details:
+        raise HTTPException(
+            status_code=400,
+            detail="Itinerary not found or invalid edit operations"
+        )
+    return details
 
 
-@router.get("/user/{user_id}", response_model=list[ItineraryResponse])
-def get_by_user(user_id: str, db: Session = Depends(get_db)):
-    return ItineraryService(db).get_itineraries_for_user(user_id)
+@router.put("/{itinerary_id}/order", response_model=ItineraryEditResponse)
+async def reorder_stops(
+    itinerary_id: str,
+    data: ItineraryReorderRequest,
+    db: Session = Depends(get_db)
+):
+    details = await ItineraryService(db).reorder_itinerary(
+        itinerary_id, data.location_ids
+    )
+    if not details:
+        raise HTTPException(
+            status_code=400,
+            detail="Itinerary not found or location_ids do not match its stops"
+        )
+    return details
@@ -4,6 +4,7 @@ from app.database import get_db
 from app.services.user_service import UserService
 from app.services.location_service import LocationService
 from app.services.recommend_vietmap import generate_recommendations_vietmap
+from app.services.category_index import get_category_index
 
 from app.schemas.recommendation_schema import RecommendationRequest
 
@@ -23,6 +24,7 @@ async def recommend_route_aware(req: RecommendationRequest, db: Session = Depend
         payload=payload_dict,
         user_prefs=req.preferences,
         max_stops=req.max_stops,
+        category_index=get_category_index(db),
     )
 
     return {"count": len(rec), "recommendations": rec}
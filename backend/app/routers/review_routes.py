@@ -1,15 +1,77 @@
-from fastapi import APIRouter, Depends
+import json
+from typing import Dict, Iterator
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.services import review_service
 from app.services.review_service import ReviewService
 from app.schemas.review_schema import ReviewCreate, ReviewResponse
 
 router = APIRouter(prefix="/api/reviews", tags=["Reviews"])
 
+# insert_review error code -> HTTP status
+ERROR_STATUS = {
+    review_service.INVALID_RATING: 422,
+    review_service.USER_NOT_FOUND: 404,
+    review_service.LOCATION_NOT_FOUND: 404,
+    review_service.DUPLICATE_REVIEW: 409,
+    review_service.DATABASE_ERROR: 500,
+}
+
 
 @router.post("/", response_model=ReviewResponse)
 def create_review(data: ReviewCreate, db: Session = Depends(get_db)):
-    return ReviewService(db).create_review(**data.model_dump())
+    review, error = ReviewService(db).insert_review(**data.model_dump())
+    if error:
+        raise HTTPException(status_code=ERROR_STATUS[error], detail=error)
+    return review
+
+
+def _parse_review_line(line: bytes) -> Dict:
+    try:
+        return ReviewCreate.model_validate(json.loads(line)).model_dump()
+    except (ValueError, ValidationError):
+        # No valid rating: counted as invalid by bulk_ingest_reviews
+        return {}
+
+
+def iter_ndjson_reviews(request: Request) -> Iterator[Dict]:
+    """
+    Parse an NDJSON request body (one ReviewCreate per line) as it arrives.
+
+    Meant for sync endpoints: body chunks are pulled from the event loop
+    one at a time, so only the current chunk is held in memory.
+    """
+    chunks = request.stream()
+    buffer = b''
+    while True:
+        try:
+            chunk = anyio.from_thread.run(chunks.__anext__)
+        except StopAsyncIteration:
+            break
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if line.strip():
+                yield _parse_review_line(line)
+    if buffer.strip():
+        yield _parse_review_line(buffer)
+
+
+@router.post("/bulk")
+def bulk_ingest_reviews(
+    request: Request,
+    batch_size: int = 1000,
+    db: Session = Depends(get_db)
+):
+    """Import reviews from an NDJSON body (Content-Type: application/x-ndjson)."""
+    return ReviewService(db).bulk_ingest_reviews(
+        iter_ndjson_reviews(request),
+        batch_size=batch_size
+    )
 
 
 @router.get("/location/{location_id}", response_model=list[ReviewResponse])
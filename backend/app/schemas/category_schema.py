@@ -11,3 +11,7 @@ class CategoryResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class CategoryCountResponse(CategoryResponse):
+    location_count: int
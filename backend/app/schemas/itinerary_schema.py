@@ -1,6 +1,6 @@
 import uuid
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict, Literal
 from datetime import date, datetime
 
 
@@ -18,7 +18,7 @@ class ItineraryResponse(BaseModel):
     user_id: uuid.UUID
     name: str
     description: Optional[str]
-    start_point: dict
+    start_point: Optional[dict]
     end_point: Optional[dict]
     total_distance: Optional[float]
     estimated_duration: Optional[int]
@@ -28,3 +28,67 @@ class ItineraryResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class ItineraryStopLocation(BaseModel):
+    id: uuid.UUID
+    name: str
+    name_vi: str
+    address: Optional[str]
+    district: Optional[str]
+    latitude: float
+    longitude: float
+    average_visit_duration: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+
+class ItineraryStopResponse(BaseModel):
+    visit_order: int
+    location: ItineraryStopLocation
+    distance_from_previous: Optional[float]
+    travel_time: Optional[int]
+    transport_mode: Optional[str]
+
+
+class ItineraryDetailResponse(BaseModel):
+    itinerary: ItineraryResponse
+    locations: List[ItineraryStopResponse]
+    total_stops: int
+
+
+class ItineraryEditOperation(BaseModel):
+    op: Literal['add', 'remove', 'reorder']
+    location_id: Optional[uuid.UUID] = None
+    position: Optional[int] = None
+    transport_mode: Optional[str] = None
+    location_ids: Optional[List[uuid.UUID]] = None
+
+
+class ItineraryEditRequest(BaseModel):
+    operations: List[ItineraryEditOperation]
+
+
+class ItineraryEditResponse(ItineraryDetailResponse):
+    legs: Dict[str, int]
+
+
+class ItineraryReorderRequest(BaseModel):
+    location_ids: List[uuid.UUID]
+
+
+class ItineraryBuildRequest(BaseModel):
+    user_id: uuid.UUID
+    start_point: dict
+    preferences: Optional[dict] = None
+    max_stops: int = 3
+    transport_mode: Literal['walk', 'car', 'bus', 'grab'] = 'car'
+    name: Optional[str] = None
+    trip_date: Optional[date] = None
+
+
+class ItineraryBuildResponse(BaseModel):
+    details: ItineraryDetailResponse
+    timings_ms: Dict[str, float]
+    leg_sources: Dict[str, int]
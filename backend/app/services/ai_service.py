@@ -1,15 +1,115 @@
 # app/services/ai_service.py
 
 import os
-import google.generativeai as genai
 import re
 import json
+import copy
+import hashlib
+import time
+import asyncio
+import unicodedata
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional
 from dotenv import load_dotenv
 
+from app.services.cache import make_cache
+from app.services.llm_providers import LLMProvider, get_llm_provider
+from app.services.llm_hedging import with_hedging
+from app.startup_report import timed
+from app.services.llm_scheduler import LLMScheduler, LLMTimeout, llm_scheduler
+from app.services.intent_rules import (
+    RULE_CONFIDENCE_THRESHOLD,
+    Gazetteer,
+    extract_intent,
+    record_rule_result,
+)
+
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+# ===============================
+#  RESPONSE CACHE
+# ===============================
+
+# Bump a version whenever its prompt template changes, so cached answers
+# for the old prompt are no longer used.
+PARSE_PROMPT_VERSION = "parse-v1"
+CLASSIFY_PROMPT_VERSION = "classify-v1"
+ROUTE_PROMPT_VERSION = "route-v1"
+
+AI_CACHE_TTL = int(os.getenv("AI_CACHE_TTL", str(6 * 3600)))
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "5000"))
+
+response_cache = make_cache("ai_response", maxsize=AI_CACHE_SIZE, ttl=AI_CACHE_TTL)
+
+
+def normalize_message(message: str) -> str:
+    """
+    Normalize a message for cache lookups: case-folded, accents removed,
+    whitespace collapsed.
+
+    Example:
+        normalize_message("  Quán CÀ PHÊ   gần Bến Thành ")
+        # "quan ca phe gan ben thanh"
+    """
+    text = unicodedata.normalize("NFD", message.casefold().replace("đ", "d"))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.split())
+
+
+def response_cache_key(prompt_version: str, message: str, context: Optional[dict] = None) -> str:
+    key = f"{prompt_version}:{normalize_message(message)}"
+    if context:
+        digest = hashlib.sha1(
+            json.dumps(context, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:16]
+        key = f"{key}:{digest}"
+    return key
+
+
+def context_block(context: Optional[dict]) -> str:
+    """Prompt section with the structured state of earlier turns (see chat_sessions)."""
+    if not context:
+        return ""
+    return f"""
+Conversation so far (structured, from earlier turns):
+{json.dumps(context, ensure_ascii=False)}
+The new message continues this conversation. When extracting, return only
+what the new message adds or changes and leave every other field empty.
+"""
+
+
+# ===============================
+#  LLM USAGE PER REQUEST
+# ===============================
+
+_llm_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_llm_usage():
+    """
+    Count LLM calls, cache hits and rule fast-path hits made inside the
+    block (including tasks started from it), and the characters of the
+    prompts sent.
+
+    Example:
+        with track_llm_usage() as usage:
+            await ai.route_message(message)
+        print(usage["calls"], usage["cache_hits"], usage["rule_hits"])
+    """
+    usage = {"calls": 0, "cache_hits": 0, "rule_hits": 0, "prompt_chars": 0}
+    token = _llm_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _llm_usage.reset(token)
+
+
+def _record_usage(kind: str, amount: int = 1):
+    usage = _llm_usage.get()
+    if usage is not None:
+        usage[kind] += amount
 
 # ===============================
 #  AI PROMPT TEMPLATE
@@ -41,6 +141,43 @@ If data is missing, use empty string or empty array.
 Return ONLY JSON.
 """
 
+# Classification and extraction in one call (see AIService.route_message)
+ROUTE_PROMPT = """
+You are an intent router and extraction engine.
+
+You MUST output only valid JSON. No prose. No markdown.
+
+Choose mode:
+- "recommend" if the user is asking for itinerary, places to go, suggestions, route planning, nearby food/coffee/attractions, schedule, plan trip.
+- "chat" otherwise.
+
+When mode is "recommend", fill "intent" (only extract necessary information;
+preferences contains any extra details the user mentioned). When mode is
+"chat", "intent" may be empty.
+
+JSON structure:
+{
+  "mode": "chat|recommend",
+  "confidence": 0.0,
+  "intent": {
+    "intent": "",       // fast, budget, unknown,...
+    "start": "",
+    "end": "",
+    "destinations": [], //only middle points, not start/end
+    "poi_type": "",
+    "preferences": {},  // { "key": "preference" }
+    "raw_text": ""
+  }
+}
+If data is missing, use empty string or empty array.
+Return ONLY JSON.
+"""
+
+# "merged": one classify+extract call, falling back to "parallel" when its
+# answer is unusable; "parallel": classify_mode and parse_user_message
+# concurrently (extraction runs speculatively)
+AI_ROUTER_STRATEGY = os.getenv("AI_ROUTER_STRATEGY", "merged")
+
 
 # ===============================
 #  AI Service Class
@@ -48,14 +185,86 @@ Return ONLY JSON.
 
 
 class AIService:
-    def __init__(self):
-        self.model = genai.GenerativeModel("gemini-2.5-flash")
+    def __init__(
+        self,
+        provider: Optional[LLMProvider] = None,
+        lane: str = "interactive",
+        scheduler: Optional[LLMScheduler] = None
+    ):
+        # Gemini by default; LLM_PROVIDER=stub for offline load tests,
+        # LLM_HEDGE=on to hedge slow calls (see llm_hedging)
+        # Chat requests use "interactive"; batch jobs should pass "background"
+        self.lane = lane
+        self.scheduler = scheduler or llm_scheduler
+        self.provider = provider or with_hedging(get_llm_provider(), self.scheduler, lane)
+
+    async def _generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        _record_usage("calls")
+        _record_usage("prompt_chars", len(prompt))
+        return await self.scheduler.run(
+            lambda: self.provider.generate(prompt), lane=self.lane, timeout=timeout
+        )
+
+    @staticmethod
+    def _cached(cache_key: str):
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            _record_usage("cache_hits")
+        return cached
+
+    @staticmethod
+    def fast_intent(
+        message: str,
+        gazetteer: Gazetteer,
+        context: Optional[dict] = None
+    ) -> Optional[dict]:
+        """
+        Extract the intent with rules only (see intent_rules).
+
+        Returns:
+            The intent dict if the rules are confident enough
+            (RULE_CONFIDENCE_THRESHOLD), else None
+        """
+        known_start = bool(context and context.get("start"))
+        intent, confidence = extract_intent(message, gazetteer, known_start=known_start)
+        hit = confidence >= RULE_CONFIDENCE_THRESHOLD
+        record_rule_result(hit)
+        if not hit:
+            return None
+        _record_usage("rule_hits")
+        return {**intent, "confidence": confidence}
+
+    async def parse_user_message(
+        self,
+        message: str,
+        gazetteer: Optional[Gazetteer] = None,
+        context: Optional[dict] = None
+    ):
+        """
+        Convert user natural text → Structured JSON (Async) with cleaning.
+
+        With a gazetteer, simple messages are extracted by rules and
+        Gemini is only asked when the rules are not confident.
+
+        With a context (earlier turns, see chat_sessions.session_context),
+        only the fields this message adds or changes are extracted.
+
+        Answers that parse as JSON are cached per normalized message, so
+        repeated questions skip Gemini.
+        """
+        if gazetteer is not None:
+            intent = self.fast_intent(message, gazetteer, context)
+            if intent is not None:
+                return json.dumps(intent, ensure_ascii=False)
+
+        cache_key = response_cache_key(PARSE_PROMPT_VERSION, message, context)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return cached
 
-    async def parse_user_message(self, message: str):
-        """Convert user natural text → Structured JSON (Async) with cleaning."""
         prompt = f"""
         {SYSTEM_PROMPT}
-
+        {context_block(context)}
         User message:
         \"\"\"{message}\"\"\"
 
@@ -64,8 +273,7 @@ class AIService:
 
         try:
             # Gọi Google Gemini
-            response = await self.model.generate_content_async(prompt)
-            raw_text = response.text
+            raw_text = await self._generate(prompt)
             
             # Tìm nội dung nằm giữa ```json và ``` (nếu có)
             clean_text = raw_text.strip()
@@ -75,6 +283,12 @@ class AIService:
             if match:
                 clean_text = match.group(1).strip()
             
+            try:
+                if isinstance(json.loads(clean_text), dict):
+                    response_cache.set(cache_key, clean_text)
+            except ValueError:
+                pass
+            
             return clean_text
             
         except Exception as e:
@@ -82,21 +296,63 @@ class AIService:
             # Trả về chuỗi JSON lỗi mặc định để Router không bị crash
             return '{"error": "AI parsing failed", "intent": "general_question"}'
 
-    async def generate_short_answer(self, message: str):
-        prompt = f"""
+    @staticmethod
+    def _short_answer_prompt(message: str) -> str:
+        return f"""
         You are a helpful, concise Vietnamese tourism assistant.
         Answer SHORT and on-point, no rambling.
 
         User: {message}
         """
-        response = await self.model.generate_content_async(prompt)
-        return response.text
 
-    async def classify_mode(self, message: str) -> dict:
+    async def generate_short_answer(self, message: str, timeout: Optional[float] = None):
+        """
+        Short conversational answer.
+
+        Args:
+            message: Question or answer prompt
+            timeout: Seconds allowed, queueing included (default: the lane's
+                deadline); LLMTimeout is raised when exceeded
+        """
+        return await self._generate(self._short_answer_prompt(message), timeout=timeout)
+
+    async def stream_short_answer(self, message: str) -> AsyncIterator[str]:
+        """
+        Same answer as generate_short_answer, yielded piece by piece as
+        the model produces it.
+
+        Example:
+            async for text in ai.stream_short_answer("Bảo tàng nào đẹp?"):
+                print(text, end="")
+        """
+        prompt = self._short_answer_prompt(message)
+        _record_usage("calls")
+        _record_usage("prompt_chars", len(prompt))
+        async with self.scheduler.slot(self.lane) as deadline:
+            pieces = self.provider.stream(prompt).__aiter__()
+            while True:
+                try:
+                    text = await asyncio.wait_for(
+                        pieces.__anext__(), max(0.0, deadline - time.monotonic())
+                    )
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise LLMTimeout("LLM stream did not finish before its deadline")
+                yield text
+
+    async def classify_mode(self, message: str, context: Optional[dict] = None) -> dict:
         """
         Decide whether to run recommendation pipeline or normal chat.
         Returns: {"mode": "recommend"|"chat", "confidence": float}
+
+        Successful classifications are cached per normalized message.
         """
+        cache_key = response_cache_key(CLASSIFY_PROMPT_VERSION, message, context)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return dict(cached)
+
         prompt = f"""
 You are a strict classifier.
 Return ONLY valid JSON. No prose.
@@ -104,7 +360,7 @@ Return ONLY valid JSON. No prose.
 Choose mode:
 - "recommend" if the user is asking for itinerary, places to go, suggestions, route planning, nearby food/coffee/attractions, schedule, plan trip.
 - "chat" otherwise.
-
+{context_block(context)}
 User message:
 \"\"\"{message}\"\"\"
 
@@ -112,8 +368,7 @@ Return JSON:
 {{"mode":"chat|recommend","confidence":0.0}}
 """
         try:
-            response = await self.model.generate_content_async(prompt)
-            text = response.text.strip()
+            text = (await self._generate(prompt)).strip()
 
             # strip ```json blocks if Gemini wraps it
             match = re.search(r"```(?:json)?(.*?)```", text, re.DOTALL)
@@ -127,8 +382,127 @@ Return JSON:
             if mode not in ("chat", "recommend"):
                 mode = "chat"
 
-            return {"mode": mode, "confidence": conf}
+            result = {"mode": mode, "confidence": conf}
+            response_cache.set(cache_key, result)
+            return dict(result)
 
         except Exception as e:
             print(f"AI classify_mode Error: {e}")
-            return {"mode": "chat", "confidence": 0.0}
\ No newline at end of file
+            return {"mode": "chat", "confidence": 0.0}
+
+    async def classify_and_parse(self, message: str, context: Optional[dict] = None) -> Optional[dict]:
+        """
+        Classify a message and extract its intent with a single LLM call.
+
+        Returns:
+            {"mode": "recommend"|"chat", "confidence": float, "intent": dict},
+            or None if the answer is not usable JSON
+        """
+        cache_key = response_cache_key(ROUTE_PROMPT_VERSION, message, context)
+        cached = self._cached(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        prompt = f"""
+{ROUTE_PROMPT}
+{context_block(context)}
+User message:
+\"\"\"{message}\"\"\"
+
+Return JSON:
+"""
+        try:
+            text = (await self._generate(prompt)).strip()
+
+            match = re.search(r"```(?:json)?(.*?)```", text, re.DOTALL)
+            if match:
+                text = match.group(1).strip()
+
+            data = json.loads(text)
+            mode = data.get("mode")
+            intent = data.get("intent")
+            if mode not in ("chat", "recommend") or not isinstance(intent, dict):
+                return None
+
+            result = {
+                "mode": mode,
+                "confidence": float(data.get("confidence", 0.5)),
+                "intent": intent,
+            }
+            response_cache.set(cache_key, result)
+            return copy.deepcopy(result)
+
+        except Exception as e:
+            print(f"AI classify_and_parse Error: {e}")
+            return None
+
+    async def route_message(
+        self,
+        message: str,
+        gazetteer: Optional[Gazetteer] = None,
+        context: Optional[dict] = None
+    ) -> dict:
+        """
+        Decide the mode of a message and extract its intent.
+
+        With a gazetteer, messages the rule fast path extracts confidently
+        are routed to "recommend" without any LLM call (strategy "rules").
+
+        With AI_ROUTER_STRATEGY=merged (default) this is one LLM call. If
+        that answer is unusable, or with AI_ROUTER_STRATEGY=parallel, the
+        classifier and the extractor run concurrently, so extraction is
+        ready if the mode turns out to be "recommend".
+
+        Returns:
+            {"mode", "confidence", "intent" (dict or None), "strategy"}
+
+        Example:
+            routed = await ai.route_message("quán cà phê gần Bến Thành")
+            if routed["mode"] == "recommend":
+                print(routed["intent"]["start"])
+        """
+        if gazetteer is not None:
+            intent = self.fast_intent(message, gazetteer, context)
+            if intent is not None:
+                return {
+                    "mode": "recommend",
+                    "confidence": intent["confidence"],
+                    "intent": intent,
+                    "strategy": "rules",
+                }
+
+        if AI_ROUTER_STRATEGY == "merged":
+            merged = await self.classify_and_parse(message, context)
+            if merged is not None:
+                return {**merged, "strategy": "merged"}
+
+        decision, parsed_raw = await asyncio.gather(
+            self.classify_mode(message, context),
+            self.parse_user_message(message, context=context),  # rules already tried above
+        )
+        try:
+            intent = json.loads(parsed_raw)
+        except ValueError:
+            intent = None
+        if not isinstance(intent, dict) or "error" in intent:
+            intent = None
+
+        return {**decision, "intent": intent, "strategy": "parallel"}
+
+
+_ai_service: Optional[AIService] = None
+
+
+def get_ai_service() -> AIService:
+    """
+    The process-wide AIService, built on first use.
+
+    Building it loads the LLM SDK (see GeminiProvider), so workers that
+    never serve AI traffic never pay for it.
+    """
+    global _ai_service
+
+    if _ai_service is None:
+        with timed("AIService", kind="init"):
+            _ai_service = AIService()
+    return _ai_service
@@ -0,0 +1,209 @@
+"""
+Cache Backends
+
+Shared helpers for the in-process and Redis-backed stores used by the
+service layer: a Redis client accessor, an in-process LRU/TTL cache, a
+Redis cache with the same interface, and shared version numbers for
+invalidating per-process data across workers.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+
+_redis_client = None
+
+
+def get_redis_client(url: Optional[str] = None):
+    """
+    Get a shared Redis client.
+
+    Args:
+        url: Redis URL (defaults to the REDIS_URL environment variable)
+
+    Returns:
+        redis.Redis instance, or None if Redis is not configured
+
+    Example:
+        client = get_redis_client()
+        if client:
+            client.ping()
+    """
+    global _redis_client
+
+    url = url or REDIS_URL
+    if not url:
+        return None
+
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(url, decode_responses=True)
+    return _redis_client
+
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry time-to-live.
+
+    Example:
+        cache = TTLCache(maxsize=1000, ttl=3600)
+        cache.set("key", {"value": 1})
+        cache.get("key")  # {"value": 1} until it expires or is evicted
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    Redis-backed cache with the same interface as TTLCache.
+
+    Values are stored as JSON under "sss:<namespace>:<key>"; eviction is
+    left to Redis (TTL plus the server's maxmemory policy).
+    """
+
+    def __init__(self, client, namespace: str, ttl: float = 3600):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"sss:{self.namespace}:{key}"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self.client.get(self._key(key))
+            return json.loads(raw) if raw is not None else None
+        except Exception as e:
+            print(f"Redis cache error: {e}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self.client.set(self._key(key), json.dumps(value), ex=int(ttl or self.ttl))
+        except Exception as e:
+            print(f"Redis cache error: {e}")
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            print(f"Redis cache error: {e}")
+
+    def clear(self):
+        try:
+            keys = list(self.client.scan_iter(self._key("*")))
+            if keys:
+                self.client.delete(*keys)
+        except Exception as e:
+            print(f"Redis cache error: {e}")
+
+
+def make_cache(namespace: str, maxsize: int = 1024, ttl: float = 3600):
+    """
+    Create a cache, backed by Redis when CACHE_BACKEND=redis.
+
+    Args:
+        namespace: Key prefix for the Redis backend
+        maxsize: Maximum entries for the in-process backend
+        ttl: Default time-to-live in seconds
+
+    Returns:
+        TTLCache or RedisCache
+
+    Example:
+        ROUTE_CACHE = make_cache("route_leg", maxsize=10000, ttl=86400)
+    """
+    if CACHE_BACKEND == "redis":
+        client = get_redis_client()
+        if client is not None:
+            return RedisCache(client, namespace, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+class CacheVersion:
+    """
+    Version number of a group of cached data, shared by all workers.
+
+    Writers bump the version; readers tag what they build or cache with
+    the version they read first and treat anything tagged with an older
+    version as stale. With CACHE_BACKEND=redis the number is a Redis
+    counter, so a bump in one worker reaches every worker and replica;
+    otherwise it is per process.
+
+    Example:
+        CATEGORY_VERSION = CacheVersion("category")
+        version = CATEGORY_VERSION.get()
+        ...  # build, tag with version
+        CATEGORY_VERSION.bump()  # after a write
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._local = 0
+        self._client = get_redis_client() if CACHE_BACKEND == "redis" else None
+
+    def _key(self) -> str:
+        return f"sss:version:{self.name}"
+
+    def get(self) -> int:
+        if self._client is not None:
+            try:
+                return int(self._client.get(self._key()) or 0)
+            except Exception as e:
+                print(f"Redis cache error: {e}")
+        return self._local
+
+    def bump(self) -> int:
+        self._local += 1
+        if self._client is not None:
+            try:
+                return int(self._client.incr(self._key()))
+            except Exception as e:
+                print(f"Redis cache error: {e}")
+        return self._local
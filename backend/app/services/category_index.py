@@ -0,0 +1,260 @@
+"""
+Category Index
+
+In-memory membership index for fast multi-category filtering.
+
+Every location gets an ordinal (its position in the index) and every
+facet value - category, district, price level, active flag - maps to a
+bitset of the ordinals that have it. Bitsets are Python ints, so AND,
+OR and NOT are single integer operations:
+
+    index = get_category_index(db)
+    bits = index.match(
+        all_categories=["museum"],
+        price_levels=["low"],
+        districts=["Quận 1"]
+    )
+    location_ids = index.location_ids(bits)
+
+The index is built with two queries and rebuilt after
+CATEGORY_INDEX_TTL seconds, or as soon as invalidate_category_index()
+has been called - in any worker when CACHE_BACKEND=redis, since the
+index is tagged with the shared CATEGORY_VERSION it was built at.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import uuid
+
+from sqlalchemy.orm import Session
+
+from app.models import Category, Location, LocationCategory
+from .cache import CacheVersion
+
+CATEGORY_INDEX_TTL = int(os.getenv("CATEGORY_INDEX_TTL", "300"))
+
+FACETS = ('category', 'district', 'price', 'active')
+
+# Bumped on every write to categories, location-category links or
+# indexed location columns (see invalidate_category_index)
+CATEGORY_VERSION = CacheVersion("category")
+
+
+def _bitset(ordinals: Iterable[int], size: int) -> int:
+    """Build a bitset from ordinals in one pass (no int reallocation per bit)."""
+    buffer = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        buffer[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class CategoryIndex:
+    """
+    Facet bitsets over a fixed list of locations.
+
+    Facet values are strings: category ids (names are accepted and
+    resolved), district names, price levels, and 'true' for the active
+    flag.
+    """
+
+    def __init__(
+        self,
+        location_ids: List[uuid.UUID],
+        facets: Dict[Tuple[str, str], int],
+        category_names: Dict[str, str],
+        version: int = 0
+    ):
+        self.version = version
+        self.location_ids_by_ordinal = location_ids
+        self.ordinals = {location_id: i for i, location_id in enumerate(location_ids)}
+        self.facets = facets
+        self.category_names = category_names
+        self.category_ids_by_name = {name: cid for cid, name in category_names.items()}
+        self.universe = (1 << len(location_ids)) - 1
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.location_ids_by_ordinal)
+
+    def _value(self, facet: str, value) -> str:
+        value = str(value)
+        if facet == 'category' and value not in self.category_names:
+            return self.category_ids_by_name.get(value, value)
+        return value
+
+    def bits(self, facet: str, value) -> int:
+        """Bitset of the locations having one facet value (0 if unknown)."""
+        return self.facets.get((facet, self._value(facet, value)), 0)
+
+    def all_of(self, facet: str, values: Iterable) -> int:
+        """Locations having every value (AND)."""
+        result = self.universe
+        for value in values:
+            result &= self.bits(facet, value)
+        return result
+
+    def any_of(self, facet: str, values: Iterable) -> int:
+        """Locations having at least one value (OR)."""
+        result = 0
+        for value in values:
+            result |= self.bits(facet, value)
+        return result
+
+    def none_of(self, facet: str, values: Iterable) -> int:
+        """Locations having none of the values (NOT)."""
+        return self.universe & ~self.any_of(facet, values)
+
+    def match(
+        self,
+        all_categories: Optional[Iterable] = None,
+        any_categories: Optional[Iterable] = None,
+        exclude_categories: Optional[Iterable] = None,
+        districts: Optional[Iterable[str]] = None,
+        price_levels: Optional[Iterable[str]] = None,
+        active_only: bool = True
+    ) -> int:
+        """
+        Combine facet filters into one bitset.
+
+        Args:
+            all_categories: Categories a location must all have (AND)
+            any_categories: Categories of which it needs one (OR)
+            exclude_categories: Categories it must not have (NOT)
+            districts: Allowed districts (OR)
+            price_levels: Allowed price levels (OR)
+            active_only: Only active locations
+
+        Returns:
+            Bitset of matching location ordinals
+
+        Example:
+            bits = index.match(any_categories=[cafe_id, museum_id],
+                               exclude_categories=["shopping"])
+        """
+        result = self.bits('active', 'true') if active_only else self.universe
+        if all_categories:
+            result &= self.all_of('category', all_categories)
+        if any_categories:
+            result &= self.any_of('category', any_categories)
+        if exclude_categories:
+            result &= self.none_of('category', exclude_categories)
+        if districts:
+            result &= self.any_of('district', districts)
+        if price_levels:
+            result &= self.any_of('price', price_levels)
+        return result
+
+    def location_ids(self, bits: int) -> List[uuid.UUID]:
+        """Location UUIDs of the set bits, in ordinal order."""
+        digits = format(bits, 'b')[::-1]
+        ids = []
+        ordinal = digits.find('1')
+        while ordinal != -1:
+            ids.append(self.location_ids_by_ordinal[ordinal])
+            ordinal = digits.find('1', ordinal + 1)
+        return ids
+
+    @staticmethod
+    def count(bits: int) -> int:
+        """Number of locations in a bitset."""
+        return bin(bits).count('1')
+
+    def has(self, location_id: uuid.UUID, facet: str, value) -> bool:
+        """Whether a location has a facet value."""
+        ordinal = self.ordinals.get(location_id)
+        return ordinal is not None and bool(self.bits(facet, value) >> ordinal & 1)
+
+    def categories_of(self, location_id: uuid.UUID) -> List[str]:
+        """Category ids (as strings) of one location."""
+        ordinal = self.ordinals.get(location_id)
+        if ordinal is None:
+            return []
+        return [
+            category_id for category_id in self.category_names
+            if self.facets.get(('category', category_id), 0) >> ordinal & 1
+        ]
+
+
+def build_category_index(db: Session, version: int = 0) -> CategoryIndex:
+    """
+    Build the index with one query for locations and one for categories.
+
+    Args:
+        db: Database session
+        version: CATEGORY_VERSION read before the queries
+
+    Returns:
+        CategoryIndex instance
+    """
+    locations = db.query(
+        Location.id, Location.is_active, Location.district, Location.price_level
+    ).order_by(Location.id).all()
+    links = db.query(
+        LocationCategory.location_id, LocationCategory.category_id
+    ).all()
+    category_names = {str(row.id): row.name for row in db.query(Category.id, Category.name)}
+
+    ordinals = {row.id: i for i, row in enumerate(locations)}
+    members: Dict[Tuple[str, str], List[int]] = {}
+    for row in locations:
+        ordinal = ordinals[row.id]
+        if row.is_active:
+            members.setdefault(('active', 'true'), []).append(ordinal)
+        if row.district:
+            members.setdefault(('district', row.district), []).append(ordinal)
+        if row.price_level:
+            members.setdefault(('price', row.price_level), []).append(ordinal)
+    for link in links:
+        members.setdefault(('category', str(link.category_id)), []).append(
+            ordinals[link.location_id]
+        )
+
+    return CategoryIndex(
+        [row.id for row in locations],
+        {key: _bitset(values, len(locations)) for key, values in members.items()},
+        category_names,
+        version
+    )
+
+
+_index: Optional[CategoryIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_category_index(db: Session) -> CategoryIndex:
+    """
+    Get the process-wide index, building it if missing, older than
+    CATEGORY_INDEX_TTL or built before the current CATEGORY_VERSION.
+
+    Args:
+        db: Database session used when a (re)build is needed
+
+    Returns:
+        CategoryIndex instance
+    """
+    global _index
+
+    index = _index
+    version = CATEGORY_VERSION.get()
+    if (
+        index is None
+        or index.version != version
+        or time.monotonic() - index.built_at > CATEGORY_INDEX_TTL
+    ):
+        with _index_lock:
+            if _index is None or _index is index:
+                _index = build_category_index(db, version)
+            index = _index
+    return index
+
+
+def invalidate_category_index():
+    """
+    Mark every worker's index stale; each rebuilds it on its next
+    get_category_index call.
+    """
+    global _index
+    CATEGORY_VERSION.bump()
+    _index = None
@@ -5,11 +5,37 @@ Service class for managing location categories.
 """
 
 from typing import Optional, List
+from sqlalchemy import func, and_
 from sqlalchemy.orm import Session
 import uuid
 
 from app.models import Category, LocationCategory, Location
 from .base_service import BaseService
+from .cache import make_cache
+from .category_index import CATEGORY_VERSION, invalidate_category_index
+
+
+# Categories with active location counts, as served by get_all_with_counts.
+# Keyed by CATEGORY_VERSION, so invalidate_category_caches makes every
+# worker's entry stale; the TTL only bounds staleness after writes that
+# bypass the services.
+CATEGORY_COUNTS_KEY = "all"
+_category_counts_cache = make_cache("category_counts", maxsize=1, ttl=600)
+
+
+def _category_counts_key() -> str:
+    return f"{CATEGORY_COUNTS_KEY}:v{CATEGORY_VERSION.get()}"
+
+
+def invalidate_category_caches():
+    """
+    Drop the cached category counts and the category index.
+    
+    Call after changing categories, location-category links or a
+    location's is_active, district or price_level.
+    """
+    _category_counts_cache.delete(_category_counts_key())
+    invalidate_category_index()
 
 
 class CategoryService(BaseService[Category]):
@@ -53,7 +79,10 @@ class CategoryService(BaseService[Category]):
             print(f"Category '{name}' already exists")
             return None
         
-        return self.create(name=name, name_vi=name_vi, icon=icon)
+        category = self.create(name=name, name_vi=name_vi, icon=icon)
+        if category:
+            invalidate_category_caches()
+        return category
     
     def get_by_name(self, name: str) -> Optional[Category]:
         """
@@ -137,6 +166,10 @@ class CategoryService(BaseService[Category]):
         """
         Get all categories with location counts.
         
+        Counts only active locations. Served from cache when warm,
+        otherwise computed with one grouped query over categories,
+        location_categories and locations.
+        
         Returns:
             List of dictionaries with category and location count
             
@@ -146,24 +179,55 @@ class CategoryService(BaseService[Category]):
                 print(f"{cat['name_vi']}: {cat['location_count']} locations")
         """
         try:
-            categories = self.get_all()
-            result = []
+            key = _category_counts_key()
+            cached = _category_counts_cache.get(key)
+            if cached is None:
+                rows = self.db.query(
+                    Category.id,
+                    Category.name,
+                    Category.name_vi,
+                    Category.icon,
+                    func.count(Location.id).label('location_count')
+                ).outerjoin(
+                    LocationCategory, LocationCategory.category_id == Category.id
+                ).outerjoin(
+                    Location, and_(
+                        Location.id == LocationCategory.location_id,
+                        Location.is_active == True
+                    )
+                ).group_by(Category.id).order_by(Category.name).all()
+                
+                cached = [
+                    {
+                        'id': str(row.id),
+                        'name': row.name,
+                        'name_vi': row.name_vi,
+                        'icon': row.icon,
+                        'location_count': row.location_count
+                    }
+                    for row in rows
+                ]
+                _category_counts_cache.set(key, cached)
             
-            for category in categories:
-                count = self.count_locations_by_category(category.id)
-                result.append({
-                    'id': category.id,
-                    'name': category.name,
-                    'name_vi': category.name_vi,
-                    'icon': category.icon,
-                    'location_count': count
-                })
-            
-            return result
+            return [{**entry, 'id': uuid.UUID(entry['id'])} for entry in cached]
         except Exception as e:
             print(f"Error getting categories with counts: {e}")
             return []
     
+    def update(self, id: uuid.UUID, **kwargs) -> Optional[Category]:
+        """Update a category and drop the cached category data."""
+        category = super().update(id, **kwargs)
+        if category:
+            invalidate_category_caches()
+        return category
+    
+    def delete(self, id: uuid.UUID) -> bool:
+        """Delete a category and drop the cached category data."""
+        deleted = super().delete(id)
+        if deleted:
+            invalidate_category_caches()
+        return deleted
+    
     def search_categories(self, query: str) -> List[Category]:
         """
         Search categories by name (English or Vietnamese).
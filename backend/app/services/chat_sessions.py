@@ -0,0 +1,155 @@
+"""
+Chat Sessions
+
+Structured state of a chat conversation, kept between turns so a
+follow-up message ("còn quán ăn thì sao?") only has to be parsed for
+what it adds or changes:
+
+    session = load_session(session_id)
+    context = session_context(session)      # sent with the parse prompt
+    intent = merge_intent(session, delta)   # earlier turns + this delta
+    ...
+    record_turn(session, usage, selected_ids)
+    save_session(session)
+
+Sessions live in the shared cache (in-process TTL cache, or Redis with
+CACHE_BACKEND=redis) for CHAT_SESSION_TTL seconds after the last turn.
+The geocoded start point is kept too, so an unchanged start is not
+geocoded again. Every turn records the prompt size sent to the LLM.
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from .cache import make_cache
+
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", str(30 * 60)))
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+
+# Turns kept in a session's history
+TURN_HISTORY = 20
+
+INTENT_FIELDS = ("intent", "start", "end", "destinations", "poi_type", "preferences")
+
+_sessions = make_cache("chat_session", maxsize=CHAT_SESSION_MAX, ttl=CHAT_SESSION_TTL)
+
+
+def estimate_tokens(chars: int) -> int:
+    """Rough token count for a prompt size (about 4 characters per token)."""
+    return (chars + 3) // 4
+
+
+def new_session(session_id: Optional[str] = None) -> Dict:
+    return {
+        "session_id": session_id or str(uuid.uuid4()),
+        "intent": {},
+        "start_point": None,
+        "selected_locations": [],
+        "turns": 0,
+        "prompt_chars": 0,
+        "prompt_tokens": 0,
+        "history": [],
+    }
+
+
+def load_session(session_id: Optional[str]) -> Dict:
+    """
+    Get a session, or a new empty one if the id is unknown or expired.
+
+    Args:
+        session_id: Session id sent by the client (None starts a session)
+
+    Returns:
+        Session state dict
+    """
+    state = _sessions.get(session_id) if session_id else None
+    return state or new_session(session_id)
+
+
+def save_session(state: Dict):
+    """Store a session (resets its TTL)."""
+    _sessions.set(state["session_id"], state)
+
+
+def session_context(state: Dict) -> Optional[Dict]:
+    """
+    The compact context of earlier turns to send with a parse prompt.
+
+    Returns:
+        Known intent fields and the last selected location names, or
+        None on the first turn
+    """
+    known = {key: value for key, value in state["intent"].items() if value}
+    if state["selected_locations"]:
+        known["selected_locations"] = [loc["name"] for loc in state["selected_locations"]]
+    return known or None
+
+
+def merge_intent(state: Dict, delta: Dict) -> Dict:
+    """
+    Apply the intent extracted from this turn to the session.
+
+    Non-empty fields of the delta replace earlier ones; preferences are
+    merged key by key. Changing the start drops the cached start point.
+
+    Args:
+        state: Session state (updated in place)
+        delta: Intent extracted from the new message
+
+    Returns:
+        The merged intent (with this turn's raw_text)
+    """
+    intent = dict(state["intent"])
+    for key in INTENT_FIELDS:
+        value = delta.get(key)
+        if key == "preferences":
+            if isinstance(value, dict) and value:
+                intent["preferences"] = {**intent.get("preferences", {}), **value}
+        elif value and value != "unknown":
+            if key == "start" and value != intent.get("start"):
+                state["start_point"] = None
+            intent[key] = value
+
+    state["intent"] = intent
+    return {**intent, "raw_text": delta.get("raw_text", "")}
+
+
+def record_turn(state: Dict, usage: Dict, selected_locations: List[Dict]):
+    """
+    Count a finished turn: LLM prompt size and the locations picked.
+
+    Args:
+        state: Session state (updated in place)
+        usage: Counters from track_llm_usage() for this turn
+        selected_locations: The turn's selected_locations (id, name, ...)
+    """
+    prompt_chars = usage.get("prompt_chars", 0)
+    turn = {
+        "turn": state["turns"] + 1,
+        "at": datetime.now(timezone.utc).isoformat(),
+        "llm_calls": usage.get("calls", 0),
+        "prompt_chars": prompt_chars,
+        "prompt_tokens": estimate_tokens(prompt_chars),
+    }
+
+    state["turns"] += 1
+    state["prompt_chars"] += prompt_chars
+    state["prompt_tokens"] += turn["prompt_tokens"]
+    state["history"] = (state["history"] + [turn])[-TURN_HISTORY:]
+    if selected_locations:
+        state["selected_locations"] = [
+            {"id": loc["id"], "name": loc["name"]} for loc in selected_locations
+        ]
+
+
+def session_summary(state: Dict) -> Dict:
+    """Session info returned to the client after a turn."""
+    last = state["history"][-1] if state["history"] else {}
+    return {
+        "session_id": state["session_id"],
+        "turn": state["turns"],
+        "prompt_tokens": last.get("prompt_tokens", 0),
+        "total_prompt_tokens": state["prompt_tokens"],
+    }
@@ -0,0 +1,374 @@
+"""
+Intent Rules
+
+Deterministic fast path for intent extraction. Simple requests such as
+"tôi đang ở Chợ Bến Thành, muốn đi uống cà phê" or "coffee near Notre
+Dame" are matched against Vietnamese/English keyword patterns and a
+gazetteer of location and category names, producing the same JSON
+schema as the LLM extraction prompt (intent, start, end, destinations,
+poi_type, preferences, raw_text) plus a confidence score:
+
+    gazetteer = get_gazetteer(db)
+    intent, confidence = extract_intent(message, gazetteer)
+    if confidence >= RULE_CONFIDENCE_THRESHOLD:
+        ...  # no LLM call needed
+
+Place names and start patterns are matched on accent-free, case-folded
+text; extracted place names are returned as written by the user (or the
+gazetteer's Vietnamese name when the place is known). Keywords and cues
+are written with their accents and matched on case-folded text, where
+an accented letter also matches its bare letter: "rẻ" matches "rẻ" and
+"re" but not "rẽ" (turn), "gấp" not "gặp" (meet).
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import Category, Location
+
+RULE_CONFIDENCE_THRESHOLD = float(os.getenv("RULE_CONFIDENCE_THRESHOLD", "0.7"))
+GAZETTEER_TTL = int(os.getenv("GAZETTEER_TTL", "300"))
+
+# poi_type -> keywords (see _has_cue). poi_type is replaced by the matching
+# category name when the gazetteer has one (e.g. "cafe" -> "Café").
+POI_KEYWORDS = {
+    'cafe': ['cà phê', 'cafe', 'coffee', 'trà sữa', 'milk tea', 'uống nước'],
+    'food': [
+        'đi ăn', 'ăn uống', 'ăn trưa', 'ăn tối', 'ăn sáng', 'quán ăn', 'nhà hàng',
+        'restaurant', 'food', 'eat', 'lunch', 'dinner', 'breakfast'
+    ],
+    'museum': ['bảo tàng', 'museum'],
+    'historical': ['di tích', 'lịch sử', 'historical', 'historic', 'heritage'],
+    'shopping': ['mua sắm', 'shopping', 'trung tâm thương mại', 'mall', 'chợ đêm', 'market'],
+    'entertainment': ['vui chơi', 'giải trí', 'entertainment', 'fun', 'nightlife'],
+}
+
+# Words that make a message a recommendation request
+RECOMMEND_CUES = [
+    'gợi ý', 'đề xuất', 'nên đi', 'đi đâu', 'ở đâu', 'gần đây', 'gần', 'muốn đi',
+    'lịch trình', 'recommend', 'suggest', 'where', 'near', 'nearby', 'around',
+    'itinerary', 'plan', 'visit', 'tham quan',
+]
+
+# "<cue> <place>" patterns for the start point; the place runs to the
+# next clause boundary. Bare "từ"/"from" only count in "từ X đến ..." /
+# "from X to ..." ("tư vấn", "từ thiện", "from now on" are not places).
+_BOUNDARY = (
+    r"(?=\s*(?:[,.;!?]|$|\s(?:va|roi|muon|thi|de|nhung|and|then|to|for|want|"
+    r"looking|can|di|den)\b))"
+)
+START_PATTERNS = [
+    re.compile(
+        r"\b(?:dang o|o gan|dang dung o|(?:toi|minh|em|anh) o|xuat phat tu|bat dau tu)"
+        r"\s+(?P<place>.+?)" + _BOUNDARY
+    ),
+    re.compile(r"\btu\s+(?P<place>.+?)(?=\s+den\b)"),
+    re.compile(r"\b(?:i am at|i'm at|im at|starting from|start from)\s+(?P<place>.+?)" + _BOUNDARY),
+    re.compile(r"\bfrom\s+(?P<place>.+?)(?=\s+to\b)"),
+    re.compile(r"\b(?:gan|near|nearby|around|close to)\s+(?P<place>.+?)" + _BOUNDARY),
+]
+
+# "near me", "gần đây", "ở nhà": no place given
+NOT_PLACES = {'day', 'do', 'me', 'here', 'by', 'toi', 'minh', 'nha', 'home'}
+
+BUDGET_CUES = ['rẻ', 'giá rẻ', 'tiết kiệm', 'bình dân', 'cheap', 'budget', 'affordable']
+FAST_CUES = ['nhanh', 'gấp', 'quick', 'fast', 'hurry']
+
+# Things the rules do not extract; their presence lowers the confidence
+COMPLEX_CUES = [
+    'không', 'nhưng', 'ngoại trừ', 'trừ', 'not', "don't", 'but', 'except', 'instead',
+    'ngày mai', 'tomorrow', 'giờ', 'hour', 'người', 'people', 'trẻ em', 'kids',
+]
+
+_stats = {'attempts': 0, 'hits': 0}
+
+
+def _normalize_with_offsets(text: str) -> Tuple[str, List[int]]:
+    """
+    Case-fold, strip accents and collapse whitespace, keeping for every
+    output character the index of the input character it came from.
+    """
+    chars: List[str] = []
+    offsets: List[int] = []
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            if chars and chars[-1] != ' ':
+                chars.append(' ')
+                offsets.append(i)
+            continue
+        folded = unicodedata.normalize('NFD', ch.casefold().replace('đ', 'd'))
+        for part in folded:
+            if not unicodedata.combining(part):
+                chars.append(part)
+                offsets.append(i)
+    if chars and chars[-1] == ' ':
+        chars.pop()
+        offsets.pop()
+    return ''.join(chars), offsets
+
+
+def _normalize(text: str) -> str:
+    return _normalize_with_offsets(text)[0]
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(rf"(?<!\w){re.escape(phrase)}(?!\w)", text) is not None
+
+
+def _fold(text: str) -> str:
+    """Case-fold and collapse whitespace, keeping accents."""
+    return ' '.join(unicodedata.normalize('NFC', text).casefold().split())
+
+
+@lru_cache(maxsize=None)
+def _cue_pattern(cue: str) -> re.Pattern:
+    """Whole-word pattern where each accented letter also matches its bare letter."""
+    parts = []
+    for ch in unicodedata.normalize('NFC', cue.casefold()):
+        bare = _normalize(ch)
+        parts.append(re.escape(ch) if bare in ('', ch) else f"[{ch}{bare}]")
+    return re.compile(rf"(?<!\w){''.join(parts)}(?!\w)")
+
+
+def _has_cue(folded: str, cues: List[str]) -> bool:
+    """
+    Whether folded text (see _fold) contains one of the cues.
+
+    Accents the user typed must match the cue's: "gia re" and "giá rẻ"
+    match 'giá rẻ', "rẽ" does not match 'rẻ'.
+    """
+    return any(_cue_pattern(cue).search(folded) for cue in cues)
+
+
+class Gazetteer:
+    """
+    Accent-free location and category names.
+
+    Location names (English and Vietnamese) map to the Vietnamese display
+    name, category names to the category name as stored.
+    """
+
+    def __init__(self, places: Dict[str, str], categories: Dict[str, str]):
+        self.places = places
+        self.categories = categories
+        # Longest names first so "highlands coffee nguyen hue" wins over "nguyen hue"
+        self._place_names = sorted(places, key=len, reverse=True)
+        self.built_at = time.monotonic()
+
+    def find_places(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Non-overlapping place mentions in normalized text.
+
+        Returns:
+            List of (start, end, display name), in text order
+        """
+        found: List[Tuple[int, int, str]] = []
+        for name in self._place_names:
+            if name not in text:
+                continue
+            for match in re.finditer(rf"(?<!\w){re.escape(name)}(?!\w)", text):
+                start, end = match.span()
+                if all(end <= s or start >= e for s, e, _ in found):
+                    found.append((start, end, self.places[name]))
+        return sorted(found)
+
+    def category(self, poi_type: str) -> Optional[str]:
+        """Category name for a poi_type or category mention, if one exists."""
+        return self.categories.get(_normalize(poi_type))
+
+
+def build_gazetteer(db: Session) -> Gazetteer:
+    """
+    Build the gazetteer from active locations and all categories.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Gazetteer instance
+    """
+    places: Dict[str, str] = {}
+    rows = db.query(Location.name, Location.name_vi).filter(Location.is_active == True).all()
+    for row in rows:
+        display = row.name_vi or row.name
+        for name in (row.name, row.name_vi):
+            key = _normalize(name or '')
+            # Very short names ("A1") match too much text
+            if len(key) >= 4:
+                places.setdefault(key, display)
+
+    categories = {_normalize(row.name): row.name for row in db.query(Category.name)}
+    return Gazetteer(places, categories)
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer(db: Session) -> Gazetteer:
+    """
+    Get the process-wide gazetteer, rebuilding it when older than
+    GAZETTEER_TTL seconds.
+
+    Args:
+        db: Database session used when a (re)build is needed
+
+    Returns:
+        Gazetteer instance
+    """
+    global _gazetteer
+
+    gazetteer = _gazetteer
+    if gazetteer is None or time.monotonic() - gazetteer.built_at > GAZETTEER_TTL:
+        with _gazetteer_lock:
+            if _gazetteer is None or _gazetteer is gazetteer:
+                _gazetteer = build_gazetteer(db)
+            gazetteer = _gazetteer
+    return gazetteer
+
+
+def _find_start(
+    original: str,
+    text: str,
+    offsets: List[int],
+    places: List[Tuple[int, int, str]]
+) -> Tuple[str, Optional[Tuple[int, int]], bool]:
+    """
+    Find the start point.
+
+    Returns:
+        (name, span in normalized text, known to the gazetteer)
+    """
+    for pattern in START_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        start, end = match.span('place')
+        # A known place inside the captured text is the start point
+        for place_start, place_end, display in places:
+            if start <= place_start < end:
+                return display, (place_start, place_end), True
+        name = original[offsets[start]:offsets[end - 1] + 1].strip(' ,.;!?')
+        if name and text[start:end] not in NOT_PLACES:
+            return name, (start, end), False
+    return '', None, False
+
+
+def extract_intent(
+    message: str,
+    gazetteer: Gazetteer,
+    known_start: bool = False
+) -> Tuple[Dict, float]:
+    """
+    Extract the LLM intent schema from a message with rules only.
+
+    Args:
+        message: User message
+        gazetteer: Location and category names (see get_gazetteer)
+        known_start: An earlier turn already gave the start point, so a
+            follow-up without one is still complete
+
+    Returns:
+        (intent, confidence) where intent has the keys intent, start,
+        end, destinations, poi_type, preferences and raw_text, and
+        confidence is between 0.0 and 1.0. Unless the start point is a
+        gazetteer place (or comes from an earlier turn), confidence
+        stays below RULE_CONFIDENCE_THRESHOLD: free text after a start
+        cue is left to the LLM.
+
+    Example:
+        intent, confidence = extract_intent(
+            "Tôi đang ở Chợ Bến Thành, muốn đi uống cà phê", gazetteer
+        )
+        # intent["start"] == "Chợ Bến Thành", intent["poi_type"] == "Café"
+    """
+    text, offsets = _normalize_with_offsets(message)
+    folded = _fold(message)
+    places = gazetteer.find_places(text)
+    start, start_span, start_known = _find_start(message, text, offsets, places)
+
+    destinations = [
+        display for place_start, place_end, display in places
+        if not start_span or place_end <= start_span[0] or place_start >= start_span[1]
+    ]
+
+    poi_type = ''
+    for category_key, category_name in gazetteer.categories.items():
+        if _contains(text, category_key):
+            poi_type = category_name
+            break
+    if not poi_type:
+        for key, keywords in POI_KEYWORDS.items():
+            if _has_cue(folded, keywords):
+                poi_type = gazetteer.category(key) or key
+                break
+
+    preferences = {}
+    intent = 'unknown'
+    if _has_cue(folded, BUDGET_CUES):
+        intent = 'budget'
+        preferences['budget'] = 'low'
+    elif _has_cue(folded, FAST_CUES):
+        intent = 'fast'
+        preferences['pace'] = 'fast'
+
+    wants_recommendation = bool(poi_type) or _has_cue(folded, RECOMMEND_CUES)
+
+    confidence = 0.0
+    if wants_recommendation:
+        confidence += 0.3
+    if start_known:
+        confidence += 0.4
+    elif known_start and not start:
+        confidence += 0.3
+    if poi_type:
+        confidence += 0.2
+    if len(text.split()) <= 15:
+        confidence += 0.1
+    if _has_cue(folded, COMPLEX_CUES):
+        confidence -= 0.3
+    if len(destinations) > 1:
+        # Multi-stop routes need the LLM to tell end points from stops
+        confidence -= 0.2
+    if not (start_known or (known_start and not start)):
+        confidence = min(confidence, RULE_CONFIDENCE_THRESHOLD - 0.1)
+
+    return {
+        'intent': intent,
+        'start': start,
+        'end': '',
+        'destinations': destinations,
+        'poi_type': poi_type,
+        'preferences': preferences,
+        'raw_text': message
+    }, round(max(0.0, min(1.0, confidence)), 2)
+
+
+def record_rule_result(hit: bool):
+    """Count one fast-path attempt and whether it was confident enough."""
+    _stats['attempts'] += 1
+    if hit:
+        _stats['hits'] += 1
+
+
+def rule_stats() -> Dict:
+    """
+    Fast-path usage since process start.
+
+    Returns:
+        {"attempts", "hits", "hit_rate", "threshold"}
+    """
+    attempts = _stats['attempts']
+    return {
+        'attempts': attempts,
+        'hits': _stats['hits'],
+        'hit_rate': round(_stats['hits'] / attempts, 3) if attempts else 0.0,
+        'threshold': RULE_CONFIDENCE_THRESHOLD
+    }
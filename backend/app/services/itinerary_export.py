@@ -0,0 +1,240 @@
+"""
+Itinerary Export
+
+Renders an itinerary as GPX, GeoJSON or ICS, one chunk at a time.
+
+Every exporter is a generator over the itinerary's stops (streamed from
+the database with ItineraryService.iter_itinerary_locations), so the
+document is never built in memory as a whole. Legs use the routed path
+from the leg cache when there is one, and a straight line otherwise; an
+export never calls the routing API.
+"""
+
+import json
+from datetime import datetime, time, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from app.models import Itinerary
+from .route_legs import cached_geometry
+
+DEFAULT_DAY_START = time(8, 0)
+
+StopSource = Callable[[], Iterator[Dict]]
+
+
+def _point(stop: Dict) -> Dict:
+    location = stop['location']
+    return {'id': location.id, 'lat': location.latitude, 'lng': location.longitude}
+
+
+def _start_point(itinerary: Itinerary) -> Optional[Dict]:
+    start = itinerary.start_point or {}
+    if 'lat' in start and 'lng' in start:
+        return {'lat': start['lat'], 'lng': start['lng']}
+    return None
+
+
+def iter_legs(
+    itinerary: Itinerary,
+    stops: Iterator[Dict]
+) -> Iterator[Tuple[Dict, Optional[List[Tuple[float, float]]]]]:
+    """
+    Pair every stop with the path of the leg that leads to it.
+
+    Args:
+        itinerary: Itinerary instance (its start point begins the first leg)
+        stops: Stops in visit order
+
+    Yields:
+        (stop, path) where path is a list of (lat, lng) points, or None
+        for a first stop without a start point
+    """
+    previous = _start_point(itinerary)
+    for stop in stops:
+        point = _point(stop)
+        path = None
+        if previous:
+            path = cached_geometry(previous, point, stop['transport_mode'] or 'car') or [
+                (previous['lat'], previous['lng']),
+                (point['lat'], point['lng'])
+            ]
+        yield stop, path
+        previous = point
+
+
+def export_gpx(itinerary: Itinerary, stops: StopSource) -> Iterator[str]:
+    """
+    Render an itinerary as GPX 1.1: one waypoint per stop, then a track
+    with one segment per leg.
+
+    Args:
+        itinerary: Itinerary instance
+        stops: Callable returning a fresh stop iterator (called twice,
+            since GPX puts all waypoints before the track)
+
+    Yields:
+        Chunks of the GPX document
+    """
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<gpx version="1.1" creator="SSS" xmlns="http://www.topografix.com/GPX/1/1">\n'
+    yield f"  <metadata><name>{escape(itinerary.name)}</name></metadata>\n"
+
+    for stop in stops():
+        location = stop['location']
+        label = f"{stop['visit_order']}. {location.name_vi or location.name}"
+        yield (
+            f"  <wpt lat={quoteattr(str(location.latitude))} lon={quoteattr(str(location.longitude))}>"
+            f"<name>{escape(label)}</name>"
+            f"<desc>{escape(location.address or '')}</desc></wpt>\n"
+        )
+
+    yield f"  <trk><name>{escape(itinerary.name)}</name>\n"
+    for _, path in iter_legs(itinerary, stops()):
+        if not path:
+            continue
+        points = ''.join(f'<trkpt lat="{lat}" lon="{lng}"/>' for lat, lng in path)
+        yield f"    <trkseg>{points}</trkseg>\n"
+    yield "  </trk>\n</gpx>\n"
+
+
+def export_geojson(itinerary: Itinerary, stops: StopSource) -> Iterator[str]:
+    """
+    Render an itinerary as a GeoJSON FeatureCollection: a Point per stop
+    and a LineString per leg.
+
+    Args:
+        itinerary: Itinerary instance
+        stops: Callable returning a stop iterator
+
+    Yields:
+        Chunks of the GeoJSON document
+    """
+    properties = {'id': str(itinerary.id), 'name': itinerary.name}
+    yield (
+        '{"type": "FeatureCollection", "properties": '
+        + json.dumps(properties, ensure_ascii=False)
+        + ', "features": ['
+    )
+
+    separator = ''
+    for stop, path in iter_legs(itinerary, stops()):
+        location = stop['location']
+        features = []
+        if path:
+            features.append({
+                'type': 'Feature',
+                'geometry': {
+                    'type': 'LineString',
+                    'coordinates': [[lng, lat] for lat, lng in path]
+                },
+                'properties': {
+                    'leg_to': stop['visit_order'],
+                    'distance_km': stop['distance_from_previous'],
+                    'travel_time': stop['travel_time'],
+                    'transport_mode': stop['transport_mode']
+                }
+            })
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [location.longitude, location.latitude]
+            },
+            'properties': {
+                'visit_order': stop['visit_order'],
+                'location_id': str(location.id),
+                'name': location.name,
+                'name_vi': location.name_vi,
+                'address': location.address,
+                'average_visit_duration': location.average_visit_duration
+            }
+        })
+        for feature in features:
+            yield separator + json.dumps(feature, ensure_ascii=False)
+            separator = ','
+
+    yield ']}\n'
+
+
+def _ics_text(value: str) -> str:
+    """Escape a value for an ICS TEXT property."""
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _ics_line(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545, section 3.1)."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+
+    parts, current = [], b''
+    for char in line:
+        size = len(char.encode('utf-8'))
+        if len(current) + size > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char.encode('utf-8')
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def export_ics(
+    itinerary: Itinerary,
+    stops: StopSource,
+    day_start: time = DEFAULT_DAY_START
+) -> Iterator[str]:
+    """
+    Render an itinerary as an iCalendar file with one event per stop.
+
+    Events are laid out back to back from day_start on the trip date
+    (or the creation date): travel time to the stop, then its average
+    visit duration. Times are floating local times.
+
+    Args:
+        itinerary: Itinerary instance
+        stops: Callable returning a stop iterator
+        day_start: Time of day the trip starts
+
+    Yields:
+        Chunks of the ICS document
+    """
+    fmt = '%Y%m%dT%H%M%S'
+    stamp = datetime.now(timezone.utc).strftime(fmt) + 'Z'
+    day = itinerary.trip_date or itinerary.created_at.date()
+    clock = datetime.combine(day, day_start)
+
+    yield _ics_line('BEGIN:VCALENDAR')
+    yield _ics_line('VERSION:2.0')
+    yield _ics_line('PRODID:-//SSS//Itinerary Export//VI')
+    yield _ics_line(f"X-WR-CALNAME:{_ics_text(itinerary.name)}")
+
+    for stop in stops():
+        location = stop['location']
+        clock += timedelta(minutes=stop['travel_time'] or 0)
+        end = clock + timedelta(minutes=location.average_visit_duration or 60)
+        yield ''.join([
+            _ics_line('BEGIN:VEVENT'),
+            _ics_line(f"UID:{itinerary.id}-{stop['visit_order']}@sss"),
+            _ics_line(f"DTSTAMP:{stamp}"),
+            _ics_line(f"DTSTART:{clock.strftime(fmt)}"),
+            _ics_line(f"DTEND:{end.strftime(fmt)}"),
+            _ics_line(f"SUMMARY:{_ics_text(location.name_vi or location.name)}"),
+            _ics_line(f"LOCATION:{_ics_text(location.address or '')}"),
+            _ics_line(f"GEO:{location.latitude};{location.longitude}"),
+            _ics_line('END:VEVENT'),
+        ])
+        clock = end
+
+    yield _ics_line('END:VCALENDAR')
+
+
+# format -> (media type, file extension, exporter)
+EXPORT_FORMATS = {
+    'gpx': ('application/gpx+xml', 'gpx', export_gpx),
+    'geojson': ('application/geo+json', 'geojson', export_geojson),
+    'ics': ('text/calendar', 'ics', export_ics),
+}
@@ -0,0 +1,216 @@
+"""
+Itinerary Pipeline
+
+Builds and saves an itinerary straight from recommendations in one call:
+
+1. load     - user history and candidate locations (every active
+               location, narrowed to the preferred categories when
+               enough of them match)
+2. select   - score candidates (generate_recommendations_vietmap)
+3. order    - nearest-neighbour ordering from the start point
+4. route    - resolve every leg concurrently (cache -> routing -> haversine)
+5. persist  - itinerary and all stops in one transaction
+6. details  - reload the saved itinerary with its stops
+
+Each stage is timed so slow steps show up in the response. Database
+stages run in a worker thread; only scoring and routing, which await
+the routing API, run on the event loop.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, List, Optional
+import uuid
+
+import anyio
+from sqlalchemy.orm import Session
+
+from .itinerary_service import ItineraryService
+from .location_service import LocationService
+from .user_service import UserService
+from .recommend_vietmap import generate_recommendations_vietmap
+from .category_index import get_category_index
+from .route_legs import AVERAGE_SPEED_KMH, haversine, resolve_legs
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    """Record the wall time of a stage in milliseconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def load_candidates(db: Session, preferences: Optional[Dict], max_stops: int):
+    """
+    Load the active locations to score for a recommendation.
+
+    With preferred categories, only locations in one of them are loaded
+    (resolved by the category index), unless fewer than max_stops match.
+
+    Args:
+        db: Database session
+        preferences: Recommendation preferences (preferred_categories, ...)
+        max_stops: Number of stops to select
+
+    Returns:
+        List of Location instances
+    """
+    service = LocationService(db)
+    preferred = (preferences or {}).get('preferred_categories')
+    if preferred:
+        locations = service.get_active_locations(category_ids=preferred)
+        if len(locations) >= max_stops:
+            return locations
+    return service.get_active_locations()
+
+
+def _load(db: Session, user_id: uuid.UUID, preferences: Optional[Dict], max_stops: int):
+    user = UserService(db).get_user_with_history(user_id)
+    if not user:
+        return None, [], None
+    return user, load_candidates(db, preferences, max_stops), get_category_index(db)
+
+
+def order_stops(start_point: Dict, stops: List[Dict]) -> List[Dict]:
+    """
+    Order stops greedily: always visit the nearest remaining stop next.
+
+    Args:
+        start_point: Starting point {lat, lng}
+        stops: Recommendations with "coordinates" {lat, lng}
+
+    Returns:
+        Stops in visit order
+    """
+    remaining = list(stops)
+    ordered = []
+    current = start_point
+    while remaining:
+        nearest = min(remaining, key=lambda stop: haversine(current, stop['coordinates']))
+        remaining.remove(nearest)
+        ordered.append(nearest)
+        current = nearest['coordinates']
+    return ordered
+
+
+async def build_itinerary_from_recommendations(
+    db: Session,
+    user_id: uuid.UUID,
+    start_point: Dict,
+    preferences: Optional[Dict] = None,
+    max_stops: int = 3,
+    transport_mode: str = 'car',
+    name: Optional[str] = None,
+    trip_date: Optional[date] = None
+) -> Optional[Dict]:
+    """
+    Recommend stops for a user and save them as a new itinerary.
+
+    Args:
+        db: Database session
+        user_id: User UUID
+        start_point: Starting point {lat, lng, name?}
+        preferences: Recommendation preferences (preferred_categories, ...)
+        max_stops: Number of stops to select
+        transport_mode: 'walk', 'car', 'bus', or 'grab' for every leg
+        name: Itinerary name (default: generated from the trip date)
+        trip_date: Planned trip date
+
+    Returns:
+        Dictionary with the itinerary details (see
+        ItineraryService.get_itinerary_details), per-stage timings in ms
+        and how many legs came from each source; None if the user does
+        not exist, the transport mode is invalid, nothing could be
+        recommended or saving failed
+
+    Example:
+        result = await build_itinerary_from_recommendations(
+            db,
+            user_id,
+            start_point={"lat": 10.7720, "lng": 106.6981, "name": "Ben Thanh"},
+            preferences={"preferred_categories": [museum_category_id]},
+            max_stops=4
+        )
+        print(result["timings_ms"])
+    """
+    if transport_mode not in AVERAGE_SPEED_KMH:
+        print(f"Transport mode must be one of: {list(AVERAGE_SPEED_KMH)}")
+        return None
+
+    timings: Dict[str, float] = {}
+    point = {'lat': start_point['lat'], 'lng': start_point['lng']}
+
+    with _timed(timings, 'load'):
+        user, locations, category_index = await anyio.to_thread.run_sync(
+            _load, db, user_id, preferences, max_stops
+        )
+    if not user:
+        print(f"User {user_id} not found")
+        return None
+
+    with _timed(timings, 'select'):
+        recommendations = await generate_recommendations_vietmap(
+            user=user,
+            locations=locations,
+            payload={"start_point": point},
+            user_prefs=preferences or {},
+            max_stops=max_stops,
+            category_index=category_index,
+        )
+    if not recommendations:
+        print("No locations to recommend")
+        return None
+
+    with _timed(timings, 'order'):
+        ordered = order_stops(point, recommendations)
+
+    with _timed(timings, 'route'):
+        waypoints = [point] + [
+            {'id': stop['location_id'], **stop['coordinates']} for stop in ordered
+        ]
+        legs = await resolve_legs([
+            (origin, destination, transport_mode)
+            for origin, destination in zip(waypoints, waypoints[1:])
+        ])
+
+    visit_durations = {str(loc.id): loc.average_visit_duration for loc in locations}
+    stops = [
+        {
+            'location_id': stop['location_id'],
+            'distance_from_previous': leg['distance_km'],
+            'travel_time': leg['travel_time'],
+            'transport_mode': transport_mode,
+            'average_visit_duration': visit_durations.get(stop['location_id'])
+        }
+        for stop, leg in zip(ordered, legs)
+    ]
+
+    service = ItineraryService(db)
+    with _timed(timings, 'persist'):
+        itinerary = await anyio.to_thread.run_sync(lambda: service.create_itinerary_with_stops(
+            user_id=user_id,
+            name=name or f"Lịch trình {(trip_date or date.today()).isoformat()}",
+            stops=stops,
+            start_point=start_point,
+            trip_date=trip_date
+        ))
+    if not itinerary:
+        return None
+
+    with _timed(timings, 'details'):
+        details = await anyio.to_thread.run_sync(service.get_itinerary_details, itinerary.id)
+
+    leg_sources = {'cache': 0, 'routing': 0, 'haversine': 0}
+    for leg in legs:
+        leg_sources[leg['source']] += 1
+
+    timings['total'] = round(sum(timings.values()), 1)
+    return {
+        'details': details,
+        'timings_ms': timings,
+        'leg_sources': leg_sources
+    }
@@ -4,13 +4,55 @@ Itinerary Service
 Service class for managing travel itineraries.
 """
 
-from typing import Optional, List, Dict
-from sqlalchemy.orm import Session
+from typing import Optional, List, Dict, Iterator
+from sqlalchemy import select, insert, update, delete, func, literal
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Session, Bundle
 from datetime import date
 import uuid
 
+import anyio
+
 from app.models import Itinerary, ItineraryLocation, Location, User
 from .base_service import BaseService
+from .route_legs import resolve_legs
+
+
+# Columns of one itinerary stop, loaded in the same query as the stop.
+# The location comes back as a lightweight row (not an ORM instance).
+STOP_COLUMNS = (
+    ItineraryLocation.visit_order,
+    ItineraryLocation.distance_from_previous,
+    ItineraryLocation.travel_time,
+    ItineraryLocation.transport_mode,
+    Bundle(
+        'location',
+        Location.id,
+        Location.name,
+        Location.name_vi,
+        Location.address,
+        Location.district,
+        Location.latitude,
+        Location.longitude,
+        Location.average_visit_duration
+    ),
+)
+
+
+def _as_uuid(value) -> uuid.UUID:
+    """Normalize a UUID given as UUID or string."""
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def _stop_dict(row) -> Dict:
+    """Convert a row selected with STOP_COLUMNS into a stop dictionary."""
+    return {
+        'visit_order': row.visit_order,
+        'location': row.location,
+        'distance_from_previous': row.distance_from_previous,
+        'travel_time': row.travel_time,
+        'transport_mode': row.transport_mode
+    }
 
 
 class ItineraryService(BaseService[Itinerary]):
@@ -78,6 +120,108 @@ class ItineraryService(BaseService[Itinerary]):
             status=status
         )
     
+    def create_itinerary_with_stops(
+        self,
+        user_id: uuid.UUID,
+        name: str,
+        stops: List[Dict],
+        description: Optional[str] = None,
+        start_point: Optional[Dict] = None,
+        trip_date: Optional[date] = None,
+        status: str = 'draft'
+    ) -> Optional[Itinerary]:
+        """
+        Create an itinerary together with all of its stops.
+        
+        The itinerary row is inserted with its totals already computed and
+        the stops go in with one multi-row INSERT; both are committed in a
+        single transaction.
+        
+        Args:
+            user_id: User UUID
+            name: Itinerary name
+            stops: Stops in visit order, each with location_id,
+                distance_from_previous, travel_time, transport_mode and
+                average_visit_duration (used for the estimated duration)
+            description: Optional description
+            start_point: Starting location {lat, lng, name}
+            trip_date: Planned trip date
+            status: 'draft', 'active', or 'completed'
+        
+        Returns:
+            Created Itinerary instance or None if the user does not exist,
+            a status or transport mode is invalid, or saving failed
+        
+        Example:
+            itinerary = service.create_itinerary_with_stops(
+                user_id=user_id,
+                name="Day Trip",
+                start_point={"lat": 10.7720, "lng": 106.6981},
+                stops=[{
+                    "location_id": museum_id,
+                    "distance_from_previous": 1.2,
+                    "travel_time": 6,
+                    "transport_mode": "car",
+                    "average_visit_duration": 90
+                }]
+            )
+        """
+        # Verify user exists
+        if not self.db.query(User.id).filter(User.id == user_id).first():
+            print(f"User {user_id} not found")
+            return None
+        
+        if status not in ['draft', 'active', 'completed']:
+            print("Status must be 'draft', 'active', or 'completed'")
+            return None
+        
+        valid_modes = ['walk', 'car', 'bus', 'grab']
+        if any(stop['transport_mode'] not in valid_modes for stop in stops):
+            print(f"Transport mode must be one of: {valid_modes}")
+            return None
+        
+        try:
+            itinerary_id = uuid.uuid4()
+            itinerary = self.db.scalars(
+                insert(Itinerary).values(
+                    id=itinerary_id,
+                    user_id=user_id,
+                    name=name,
+                    description=description,
+                    start_point=start_point,
+                    trip_date=trip_date,
+                    status=status,
+                    total_distance=sum(
+                        stop['distance_from_previous'] or 0 for stop in stops
+                    ),
+                    estimated_duration=sum(
+                        (stop['travel_time'] or 0) + (stop.get('average_visit_duration') or 0)
+                        for stop in stops
+                    )
+                ).returning(Itinerary)
+            ).first()
+            
+            if stops:
+                self.db.execute(insert(ItineraryLocation), [
+                    {
+                        'id': uuid.uuid4(),
+                        'itinerary_id': itinerary_id,
+                        'location_id': _as_uuid(stop['location_id']),
+                        'visit_order': order,
+                        'distance_from_previous': stop['distance_from_previous'],
+                        'travel_time': stop['travel_time'],
+                        'transport_mode': stop['transport_mode']
+                    }
+                    for order, stop in enumerate(stops, start=1)
+                ])
+            
+            self.db.commit()
+            return itinerary
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error creating itinerary with stops: {e}")
+            return None
+    
     def add_location_to_itinerary(
         self,
         itinerary_id: uuid.UUID,
@@ -153,10 +297,14 @@ class ItineraryService(BaseService[Itinerary]):
             )
             
             self.db.add(itin_loc)
-            self.db.commit()
             
-            # Update itinerary totals
-            self._update_itinerary_totals(itinerary_id)
+            # Update itinerary totals with this stop's leg and visit time
+            self._apply_totals_delta(
+                itinerary_id,
+                distance=distance_from_previous or 0,
+                duration=(travel_time or 0) + (location.average_visit_duration or 0)
+            )
+            self.db.commit()
             
             return True
         except Exception as e:
@@ -180,20 +328,30 @@ class ItineraryService(BaseService[Itinerary]):
             True if removed, False otherwise
         """
         try:
-            itin_loc = self.db.query(ItineraryLocation).filter(
+            row = self.db.query(
+                ItineraryLocation,
+                Location.average_visit_duration
+            ).join(
+                Location, Location.id == ItineraryLocation.location_id
+            ).filter(
                 ItineraryLocation.itinerary_id == itinerary_id,
                 ItineraryLocation.location_id == location_id
             ).first()
             
-            if not itin_loc:
+            if not row:
                 print("Location not in itinerary")
                 return False
             
+            itin_loc, visit_duration = row
             self.db.delete(itin_loc)
-            self.db.commit()
             
-            # Update itinerary totals
-            self._update_itinerary_totals(itinerary_id)
+            # Take this stop's leg and visit time off the itinerary totals
+            self._apply_totals_delta(
+                itinerary_id,
+                distance=-(itin_loc.distance_from_previous or 0),
+                duration=-((itin_loc.travel_time or 0) + (visit_duration or 0))
+            )
+            self.db.commit()
             
             return True
         except Exception as e:
@@ -208,6 +366,8 @@ class ItineraryService(BaseService[Itinerary]):
         """
         Get all locations in an itinerary with details.
         
+        Stops and their locations are loaded with one joined query.
+        
         Args:
             itinerary_id: Itinerary UUID
             
@@ -220,64 +380,502 @@ class ItineraryService(BaseService[Itinerary]):
                 print(f"{loc['visit_order']}. {loc['location'].name_vi}")
         """
         try:
-            itin_locs = self.db.query(ItineraryLocation).filter(
+            rows = self.db.query(*STOP_COLUMNS).join(
+                Location, Location.id == ItineraryLocation.location_id
+            ).filter(
                 ItineraryLocation.itinerary_id == itinerary_id
             ).order_by(ItineraryLocation.visit_order).all()
             
-            result = []
-            for itin_loc in itin_locs:
-                location = self.db.query(Location).filter(
-                    Location.id == itin_loc.location_id
-                ).first()
-                
-                result.append({
-                    'visit_order': itin_loc.visit_order,
-                    'location': location,
-                    'distance_from_previous': itin_loc.distance_from_previous,
-                    'travel_time': itin_loc.travel_time,
-                    'transport_mode': itin_loc.transport_mode
-                })
-            
-            return result
+            return [_stop_dict(row) for row in rows]
         except Exception as e:
             print(f"Error getting itinerary locations: {e}")
             return []
     
-    def _update_itinerary_totals(self, itinerary_id: uuid.UUID):
+    def iter_itinerary_locations(
+        self,
+        itinerary_id: uuid.UUID,
+        batch_size: int = 200
+    ) -> Iterator[Dict]:
         """
-        Update total distance and duration for an itinerary.
+        Stream the stops of an itinerary in visit order.
+        
+        Same rows as get_itinerary_locations, fetched batch_size at a
+        time with a server-side cursor instead of all at once.
         
         Args:
             itinerary_id: Itinerary UUID
+            batch_size: Rows fetched per round-trip
+        
+        Yields:
+            Stop dictionaries (see get_itinerary_locations)
+        
+        Example:
+            for stop in service.iter_itinerary_locations(itinerary_id):
+                print(stop['visit_order'], stop['location'].name_vi)
         """
-        try:
-            itin_locs = self.db.query(ItineraryLocation).filter(
+        result = self.db.execute(
+            select(*STOP_COLUMNS).join(
+                Location, Location.id == ItineraryLocation.location_id
+            ).where(
                 ItineraryLocation.itinerary_id == itinerary_id
-            ).all()
-            
-            total_distance = sum(
-                loc.distance_from_previous or 0 for loc in itin_locs
-            )
-            total_duration = sum(
-                loc.travel_time or 0 for loc in itin_locs
+            ).order_by(ItineraryLocation.visit_order),
+            execution_options={'yield_per': batch_size}
+        )
+        for row in result:
+            yield _stop_dict(row)
+    
+    def _apply_totals_delta(
+        self,
+        itinerary_id: uuid.UUID,
+        distance: float,
+        duration: int
+    ):
+        """
+        Adjust itinerary totals in place with one UPDATE (no commit).
+        
+        Args:
+            itinerary_id: Itinerary UUID
+            distance: Kilometres to add (negative to subtract)
+            duration: Minutes to add (negative to subtract)
+        """
+        self.db.execute(
+            update(Itinerary)
+            .where(Itinerary.id == itinerary_id)
+            .values(
+                total_distance=func.coalesce(Itinerary.total_distance, 0) + distance,
+                estimated_duration=func.coalesce(Itinerary.estimated_duration, 0) + duration
             )
+            .execution_options(synchronize_session=False)
+        )
+    
+    def repair_itinerary_totals(self, itinerary_id: uuid.UUID) -> bool:
+        """
+        Recompute total distance and duration from all stops.
+        
+        Regular edits maintain totals incrementally; this is the explicit
+        full recompute for repairing drift. Runs as one UPDATE.
+        
+        Args:
+            itinerary_id: Itinerary UUID
             
-            # Add visit durations
-            for itin_loc in itin_locs:
-                location = self.db.query(Location).filter(
-                    Location.id == itin_loc.location_id
-                ).first()
-                if location and location.average_visit_duration:
-                    total_duration += location.average_visit_duration
+        Returns:
+            True if the itinerary was updated, False otherwise
             
-            # Update itinerary
-            self.update(
-                itinerary_id,
-                total_distance=total_distance,
-                estimated_duration=total_duration
+        Example:
+            service.repair_itinerary_totals(itinerary_id)
+        """
+        stops = select(
+            ItineraryLocation.distance_from_previous,
+            ItineraryLocation.travel_time,
+            Location.average_visit_duration
+        ).join(
+            Location, Location.id == ItineraryLocation.location_id
+        ).where(
+            ItineraryLocation.itinerary_id == itinerary_id
+        ).subquery()
+        
+        total_distance = select(
+            func.coalesce(func.sum(stops.c.distance_from_previous), 0)
+        ).scalar_subquery()
+        total_duration = select(
+            func.coalesce(func.sum(
+                func.coalesce(stops.c.travel_time, 0)
+                + func.coalesce(stops.c.average_visit_duration, 0)
+            ), 0)
+        ).scalar_subquery()
+        
+        try:
+            result = self.db.execute(
+                update(Itinerary)
+                .where(Itinerary.id == itinerary_id)
+                .values(
+                    total_distance=total_distance,
+                    estimated_duration=total_duration
+                )
+                .execution_options(synchronize_session=False)
             )
+            self.db.commit()
+            return result.rowcount > 0
+        except Exception as e:
+            self.db.rollback()
+            print(f"Error repairing itinerary totals: {e}")
+            return False
+    
+    async def apply_itinerary_edits(
+        self,
+        itinerary_id: uuid.UUID,
+        operations: List[Dict]
+    ) -> Optional[Dict]:
+        """
+        Apply a batch of stop edits in one transaction.
+        
+        Operations are applied in order to the in-memory stop list:
+        
+        - {"op": "add", "location_id": ..., "position": 2, "transport_mode": "walk"}
+          (position is 1-based, default: append)
+        - {"op": "remove", "location_id": ...}
+        - {"op": "reorder", "location_ids": [...]} (all current stops, new order)
+        
+        Only legs whose previous stop changed are recomputed, from the
+        leg cache when possible and otherwise through the routing API (see
+        _resolve_changed_legs); the rest keep their stored distance and
+        travel time. Stops are written with one DELETE, one
+        multi-row INSERT and one bulk UPDATE, and totals are set from the
+        resulting stop list. The database work runs in a worker thread
+        (_load_edit, _save_edit); only the leg lookups run on the event loop.
+        
+        Args:
+            itinerary_id: Itinerary UUID
+            operations: List of edit operations
+            
+        Returns:
+            Updated itinerary details (see get_itinerary_details) plus
+            "legs" statistics, or None if the itinerary does not exist or
+            an operation is invalid
+            
+        Example:
+            details = await service.apply_itinerary_edits(itinerary_id, [
+                {"op": "add", "location_id": museum_id, "position": 1},
+                {"op": "remove", "location_id": cafe_id},
+            ])
+        """
+        try:
+            loaded = await anyio.to_thread.run_sync(self._load_edit, itinerary_id, operations)
+            if not loaded:
+                return None
+            start_point, original, stops, before = loaded
+            
+            leg_stats = await self._resolve_changed_legs(start_point, original, stops)
+            
+            details = await anyio.to_thread.run_sync(self._save_edit, itinerary_id, before, stops)
+            if details:
+                details['legs'] = leg_stats
+            return details
         except Exception as e:
-            print(f"Error updating itinerary totals: {e}")
+            await anyio.to_thread.run_sync(self.db.rollback)
+            print(f"Error applying itinerary edits: {e}")
+            return None
+    
+    def _load_edit(self, itinerary_id: uuid.UUID, operations: List[Dict]):
+        """
+        Load an itinerary's stops and apply edit operations to them.
+        
+        Returns:
+            (itinerary start point, original stops, edited stops, stored values of
+            the original stops by id), or None if the itinerary does not
+            exist or an operation is invalid. The stored values are taken
+            here because _resolve_changed_legs updates stops in place.
+        """
+        itinerary = self.get_by_id(itinerary_id)
+        if not itinerary:
+            print(f"Itinerary {itinerary_id} not found")
+            return None
+        
+        rows = self.db.query(
+            ItineraryLocation.id,
+            ItineraryLocation.location_id,
+            ItineraryLocation.visit_order,
+            ItineraryLocation.distance_from_previous,
+            ItineraryLocation.travel_time,
+            ItineraryLocation.transport_mode,
+            Location.latitude,
+            Location.longitude,
+            Location.average_visit_duration
+        ).join(
+            Location, Location.id == ItineraryLocation.location_id
+        ).filter(
+            ItineraryLocation.itinerary_id == itinerary_id
+        ).order_by(ItineraryLocation.visit_order).all()
+        
+        original = [dict(row._mapping) for row in rows]
+        before = {
+            stop['id']: (
+                stop['visit_order'],
+                stop['distance_from_previous'],
+                stop['travel_time']
+            )
+            for stop in original
+        }
+        
+        # Locations referenced by add operations, loaded in one query
+        added_ids = {
+            _as_uuid(op['location_id'])
+            for op in operations if op.get('op') == 'add'
+        }
+        new_locations = {}
+        if added_ids:
+            new_locations = {
+                row.id: row
+                for row in self.db.query(
+                    Location.id,
+                    Location.latitude,
+                    Location.longitude,
+                    Location.average_visit_duration
+                ).filter(Location.id.in_(added_ids)).all()
+            }
+        
+        stops = self._apply_operations(original, operations, new_locations)
+        if stops is None:
+            return None
+        return itinerary.start_point, original, stops, before
+    
+    def _save_edit(
+        self,
+        itinerary_id: uuid.UUID,
+        before: Dict,
+        stops: List[Dict]
+    ) -> Optional[Dict]:
+        """
+        Write an edited stop list and the itinerary totals, then commit.
+        
+        Returns:
+            Updated itinerary details (see get_itinerary_details)
+        """
+        # Write stops: removed, new, then changed
+        kept_ids = {stop['id'] for stop in stops if stop['id']}
+        removed_ids = [id for id in before if id not in kept_ids]
+        if removed_ids:
+            self.db.execute(
+                delete(ItineraryLocation)
+                .where(ItineraryLocation.id.in_(removed_ids))
+                .execution_options(synchronize_session=False)
+            )
+        
+        new_rows = [
+            {
+                'id': uuid.uuid4(),
+                'itinerary_id': itinerary_id,
+                'location_id': stop['location_id'],
+                'visit_order': stop['visit_order'],
+                'distance_from_previous': stop['distance_from_previous'],
+                'travel_time': stop['travel_time'],
+                'transport_mode': stop['transport_mode']
+            }
+            for stop in stops if not stop['id']
+        ]
+        if new_rows:
+            self.db.execute(insert(ItineraryLocation), new_rows)
+        
+        changed_rows = [
+            {
+                'id': stop['id'],
+                'visit_order': stop['visit_order'],
+                'distance_from_previous': stop['distance_from_previous'],
+                'travel_time': stop['travel_time']
+            }
+            for stop in stops
+            if stop['id'] and before[stop['id']] != (
+                stop['visit_order'],
+                stop['distance_from_previous'],
+                stop['travel_time']
+            )
+        ]
+        if changed_rows:
+            self.db.execute(update(ItineraryLocation), changed_rows)
+        
+        self.db.execute(
+            update(Itinerary)
+            .where(Itinerary.id == itinerary_id)
+            .values(
+                total_distance=sum(
+                    stop['distance_from_previous'] or 0 for stop in stops
+                ),
+                estimated_duration=sum(
+                    (stop['travel_time'] or 0) + (stop['average_visit_duration'] or 0)
+                    for stop in stops
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        
+        return self.get_itinerary_details(itinerary_id)
+    
+    async def reorder_itinerary(
+        self,
+        itinerary_id: uuid.UUID,
+        location_ids: List[uuid.UUID]
+    ) -> Optional[Dict]:
+        """
+        Put an itinerary's stops in a new order.
+        
+        Swapping two stops changes at most four legs; only those are
+        recomputed (see apply_itinerary_edits).
+        
+        Args:
+            itinerary_id: Itinerary UUID
+            location_ids: Every stop's location UUID, in the new order
+            
+        Returns:
+            Updated itinerary details with "legs" statistics, or None
+            
+        Example:
+            details = await service.reorder_itinerary(itinerary_id, [b_id, a_id, c_id])
+            print(details['legs']['saved_api_calls'])
+        """
+        return await self.apply_itinerary_edits(
+            itinerary_id,
+            [{'op': 'reorder', 'location_ids': location_ids}]
+        )
+    
+    def _apply_operations(
+        self,
+        original: List[Dict],
+        operations: List[Dict],
+        new_locations: Dict
+    ) -> Optional[List[Dict]]:
+        """
+        Apply edit operations to a copy of the stop list.
+        
+        Args:
+            original: Current stops (dicts, in visit order)
+            operations: Edit operations (see apply_itinerary_edits)
+            new_locations: Rows of locations referenced by add operations
+            
+        Returns:
+            New ordered stop list, or None if an operation is invalid.
+            New stops have id None.
+        """
+        valid_modes = ['walk', 'car', 'bus', 'grab']
+        stops = list(original)
+        
+        for op in operations:
+            kind = op.get('op')
+            
+            if kind == 'add':
+                location_id = _as_uuid(op['location_id'])
+                location = new_locations.get(location_id)
+                if not location:
+                    print(f"Location {location_id} not found")
+                    return None
+                if any(stop['location_id'] == location_id for stop in stops):
+                    print("Location already in itinerary")
+                    return None
+                
+                transport_mode = op.get('transport_mode') or 'car'
+                if transport_mode not in valid_modes:
+                    print(f"Transport mode must be one of: {valid_modes}")
+                    return None
+                
+                position = op.get('position')
+                index = len(stops) if position is None else min(max(position - 1, 0), len(stops))
+                stops.insert(index, {
+                    'id': None,
+                    'location_id': location_id,
+                    'visit_order': None,
+                    'distance_from_previous': None,
+                    'travel_time': None,
+                    'transport_mode': transport_mode,
+                    'latitude': location.latitude,
+                    'longitude': location.longitude,
+                    'average_visit_duration': location.average_visit_duration
+                })
+            
+            elif kind == 'remove':
+                location_id = _as_uuid(op['location_id'])
+                index = next(
+                    (i for i, stop in enumerate(stops) if stop['location_id'] == location_id),
+                    None
+                )
+                if index is None:
+                    print("Location not in itinerary")
+                    return None
+                stops.pop(index)
+            
+            elif kind == 'reorder':
+                order = [_as_uuid(location_id) for location_id in op.get('location_ids', [])]
+                by_location = {stop['location_id']: stop for stop in stops}
+                if len(order) != len(by_location) or set(order) != set(by_location):
+                    print("Reorder must list every stop of the itinerary exactly once")
+                    return None
+                stops = [by_location[location_id] for location_id in order]
+            
+            else:
+                print(f"Unknown itinerary edit operation: {kind}")
+                return None
+        
+        return stops
+    
+    async def _resolve_changed_legs(
+        self,
+        start_point: Optional[Dict],
+        original: List[Dict],
+        stops: List[Dict]
+    ) -> Dict[str, int]:
+        """
+        Renumber stops and recompute legs whose previous stop changed.
+        
+        Unchanged legs keep their stored values. Changed legs are looked
+        up in the leg cache by (from, to, transport mode) and only the
+        misses are routed, concurrently (see route_legs.resolve_legs).
+        The first leg starts at the itinerary's start point when it has
+        coordinates. Stops are updated in place. Runs on the event loop,
+        so it takes plain values and does no database work.
+        
+        Args:
+            start_point: Itinerary start point ({lat, lng, ...} or None)
+            original: Stops before the edit
+            stops: Stops after the edit
+            
+        Returns:
+            Leg statistics: total_legs, unchanged, recomputed,
+            from_cache, api_calls, estimated and saved_api_calls (legs
+            not sent to the routing API)
+        """
+        start = start_point or {}
+        start_point = (
+            {'lat': start['lat'], 'lng': start['lng']}
+            if 'lat' in start and 'lng' in start else None
+        )
+        
+        def point(stop):
+            return {'id': stop['location_id'], 'lat': stop['latitude'], 'lng': stop['longitude']}
+        
+        previous_before = {}
+        previous = None
+        for stop in original:
+            previous_before[stop['id']] = previous
+            previous = stop['location_id']
+        
+        stats = {
+            'total_legs': len(stops),
+            'unchanged': 0,
+            'recomputed': 0,
+            'from_cache': 0,
+            'api_calls': 0,
+            'estimated': 0
+        }
+        pending = []
+        previous = None
+        previous_point = start_point
+        
+        for order, stop in enumerate(stops, start=1):
+            stop['visit_order'] = order
+            
+            if stop['id'] and previous_before[stop['id']] == previous:
+                stats['unchanged'] += 1
+            elif not previous_point:
+                stop['distance_from_previous'] = 0
+                stop['travel_time'] = 0
+                stats['recomputed'] += 1
+            else:
+                stats['recomputed'] += 1
+                pending.append((stop, previous_point))
+            
+            previous = stop['location_id']
+            previous_point = point(stop)
+        
+        legs = await resolve_legs([
+            (origin, point(stop), stop['transport_mode']) for stop, origin in pending
+        ])
+        sources = {'cache': 'from_cache', 'routing': 'api_calls', 'haversine': 'estimated'}
+        for (stop, _), leg in zip(pending, legs):
+            stop['distance_from_previous'] = leg['distance_km']
+            stop['travel_time'] = leg['travel_time']
+            stats[sources[leg['source']]] += 1
+        
+        stats['saved_api_calls'] = stats['total_legs'] - stats['api_calls']
+        return stats
     
     def get_user_itineraries(
         self,
@@ -350,6 +948,9 @@ class ItineraryService(BaseService[Itinerary]):
         """
         Get complete itinerary details with all locations.
         
+        Runs a single query: the itinerary outer-joined with its stops and
+        their locations, ordered by visit_order.
+        
         Args:
             itinerary_id: Itinerary UUID
             
@@ -362,17 +963,104 @@ class ItineraryService(BaseService[Itinerary]):
             print(f"Total locations: {len(details['locations'])}")
             print(f"Total distance: {details['itinerary'].total_distance}km")
         """
-        itinerary = self.get_by_id(itinerary_id)
-        if not itinerary:
-            return None
+        details = self.get_itineraries_details([itinerary_id])
+        return details[0] if details else None
+    
+    def get_itineraries_details(
+        self,
+        itinerary_ids: List[uuid.UUID]
+    ) -> List[Dict]:
+        """
+        Get details for many itineraries with one query.
         
-        locations = self.get_itinerary_locations(itinerary_id)
+        Args:
+            itinerary_ids: Itinerary UUIDs
+            
+        Returns:
+            List of detail dictionaries (same shape as get_itinerary_details)
+            
+        Example:
+            for details in service.get_itineraries_details([id1, id2]):
+                print(details['itinerary'].name, details['total_stops'])
+        """
+        if not itinerary_ids:
+            return []
         
-        return {
-            'itinerary': itinerary,
-            'locations': locations,
-            'total_stops': len(locations)
-        }
+        return self._load_details(Itinerary.id.in_(itinerary_ids))
+    
+    def get_user_itineraries_details(
+        self,
+        user_id: uuid.UUID,
+        status: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 100
+    ) -> List[Dict]:
+        """
+        Get a page of a user's itineraries with all their stops.
+        
+        The page of itinerary ids is a subquery, so the whole page is
+        loaded with one query.
+        
+        Args:
+            user_id: User UUID
+            status: Filter by status ('draft', 'active', 'completed')
+            skip: Pagination skip
+            limit: Pagination limit
+            
+        Returns:
+            List of detail dictionaries, newest itinerary first
+            
+        Example:
+            itineraries = service.get_user_itineraries_details(user_id)
+        """
+        page = select(Itinerary.id).where(Itinerary.user_id == user_id)
+        if status:
+            page = page.where(Itinerary.status == status)
+        page = page.order_by(
+            Itinerary.created_at.desc()
+        ).offset(skip).limit(limit)
+        
+        return self._load_details(Itinerary.id.in_(page))
+    
+    def _load_details(self, condition) -> List[Dict]:
+        """
+        Load itineraries matching a condition together with their stops.
+        
+        Args:
+            condition: SQL filter on Itinerary
+            
+        Returns:
+            List of detail dictionaries, newest itinerary first
+        """
+        try:
+            rows = self.db.query(Itinerary, *STOP_COLUMNS).outerjoin(
+                ItineraryLocation, ItineraryLocation.itinerary_id == Itinerary.id
+            ).outerjoin(
+                Location, Location.id == ItineraryLocation.location_id
+            ).filter(
+                condition
+            ).order_by(
+                Itinerary.created_at.desc(),
+                Itinerary.id,
+                ItineraryLocation.visit_order
+            ).all()
+            
+            details = {}
+            for row in rows:
+                itinerary = row.Itinerary
+                entry = details.setdefault(itinerary.id, {
+                    'itinerary': itinerary,
+                    'locations': []
+                })
+                if row.visit_order is not None:
+                    entry['locations'].append(_stop_dict(row))
+            
+            for entry in details.values():
+                entry['total_stops'] = len(entry['locations'])
+            return list(details.values())
+        except Exception as e:
+            print(f"Error loading itinerary details: {e}")
+            return []
     
     def duplicate_itinerary(
         self,
@@ -382,6 +1070,10 @@ class ItineraryService(BaseService[Itinerary]):
         """
         Duplicate an existing itinerary.
         
+        Copies the itinerary row and then all of its stops with two
+        INSERT ... SELECT statements in one transaction. Totals are
+        carried over from the original rather than recomputed.
+        
         Args:
             itinerary_id: Itinerary UUID to duplicate
             new_name: Name for the new itinerary
@@ -396,37 +1088,56 @@ class ItineraryService(BaseService[Itinerary]):
             )
         """
         try:
-            # Get original itinerary
-            original = self.get_by_id(itinerary_id)
-            if not original:
-                return None
+            new_id = uuid.uuid4()
+            new_id_value = literal(new_id, UUID(as_uuid=True))
             
-            # Create new itinerary
-            new_itinerary = self.create_itinerary(
-                user_id=original.user_id,
-                name=new_name or f"{original.name} (Copy)",
-                description=original.description,
-                start_point=original.start_point,
-                end_point=original.end_point,
-                status='draft'
-            )
+            new_itinerary = self.db.scalars(
+                insert(Itinerary).from_select(
+                    [
+                        'id', 'user_id', 'name', 'description',
+                        'start_point', 'end_point',
+                        'total_distance', 'estimated_duration', 'status'
+                    ],
+                    select(
+                        new_id_value,
+                        Itinerary.user_id,
+                        literal(new_name) if new_name else Itinerary.name + " (Copy)",
+                        Itinerary.description,
+                        Itinerary.start_point,
+                        Itinerary.end_point,
+                        Itinerary.total_distance,
+                        Itinerary.estimated_duration,
+                        literal('draft')
+                    ).where(Itinerary.id == itinerary_id)
+                ).returning(Itinerary)
+            ).first()
             
             if not new_itinerary:
+                self.db.rollback()
                 return None
             
-            # Copy locations
-            locations = self.get_itinerary_locations(itinerary_id)
-            for loc_data in locations:
-                self.add_location_to_itinerary(
-                    itinerary_id=new_itinerary.id,
-                    location_id=loc_data['location'].id,
-                    visit_order=loc_data['visit_order'],
-                    distance_from_previous=loc_data['distance_from_previous'],
-                    travel_time=loc_data['travel_time'],
-                    transport_mode=loc_data['transport_mode']
+            # Copy stops
+            self.db.execute(
+                insert(ItineraryLocation).from_select(
+                    [
+                        'id', 'itinerary_id', 'location_id', 'visit_order',
+                        'distance_from_previous', 'travel_time', 'transport_mode'
+                    ],
+                    select(
+                        func.gen_random_uuid(),
+                        new_id_value,
+                        ItineraryLocation.location_id,
+                        ItineraryLocation.visit_order,
+                        ItineraryLocation.distance_from_previous,
+                        ItineraryLocation.travel_time,
+                        ItineraryLocation.transport_mode
+                    ).where(ItineraryLocation.itinerary_id == itinerary_id)
                 )
+            )
             
+            self.db.commit()
             return new_itinerary
         except Exception as e:
+            self.db.rollback()
             print(f"Error duplicating itinerary: {e}")
             return None
@@ -0,0 +1,389 @@
+"""
+Top Reviewers Leaderboard
+
+Review counts per user, maintained on every review write so the top-k
+reviewers can be read without scanning the reviews table.
+
+Counts are kept per bucket: all time, the current ISO week and the
+current month. The store is pluggable:
+
+- InMemoryLeaderboardStore: sorted list per bucket (default)
+- RedisLeaderboardStore: one Redis sorted set per bucket, shared by all
+  workers (LEADERBOARD_BACKEND=redis)
+
+Warm-up and writes that arrive while the store is still cold share a
+lock (a Redis lock for the Redis store), so a review committed while
+the warm-up query runs is counted once the warm-up is done.
+
+Writes are reported after their commit, so one committed just before
+the warm-up query could be counted twice: by the query and by its own
+record_review. The warm-up therefore keeps the query's snapshot
+(pg_current_snapshot()) and writes pass their transaction id
+(pg_current_xact_id()); a write whose transaction the snapshot already
+sees is skipped. Writes reported without a transaction id are always
+applied.
+"""
+
+import os
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .cache import get_redis_client
+
+LEADERBOARD_BACKEND = os.getenv("LEADERBOARD_BACKEND", "memory")
+
+WINDOWS = ('all', 'week', 'month')
+
+# Review counts per user for every window, plus the snapshot the counts
+# were read at (one row even without reviews)
+WARM_SQL = """
+    WITH counts AS (
+        SELECT
+            user_id,
+            COUNT(*) AS all_count,
+            COUNT(*) FILTER (WHERE created_at >= :week_start) AS week_count,
+            COUNT(*) FILTER (WHERE created_at >= :month_start) AS month_count
+        FROM reviews
+        GROUP BY user_id
+    )
+    SELECT pg_current_snapshot()::text AS snapshot, counts.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN counts ON TRUE
+"""
+
+
+def snapshot_sees(snapshot: str, xid: int) -> bool:
+    """
+    Whether a committed transaction is visible in a Postgres snapshot.
+
+    Args:
+        snapshot: pg_current_snapshot() text, "xmin:xmax:xip,..."
+        xid: pg_current_xact_id() of the transaction
+
+    Example:
+        snapshot_sees("100:105:102", 99)   # True
+        snapshot_sees("100:105:102", 102)  # False (still running)
+    """
+    xmin, xmax, xip = snapshot.split(':')
+    if xid < int(xmin):
+        return True
+    return xid < int(xmax) and str(xid) not in xip.split(',')
+
+
+def window_buckets(when: datetime) -> Dict[str, str]:
+    """
+    Get the bucket key of each window for a point in time.
+
+    Args:
+        when: Review creation time
+
+    Returns:
+        Dictionary mapping window name to bucket key
+
+    Example:
+        window_buckets(datetime(2024, 11, 20))
+        # {'all': 'all', 'week': 'week:2024-W47', 'month': 'month:2024-11'}
+    """
+    year, week, _ = when.isocalendar()
+    return {
+        'all': 'all',
+        'week': f"week:{year}-W{week:02d}",
+        'month': f"month:{when.year}-{when.month:02d}",
+    }
+
+
+class InMemoryLeaderboardStore:
+    """
+    Per-process leaderboard store.
+
+    Each bucket keeps a score dict plus a list of (-score, user_id) kept
+    sorted with bisect, so top-k is a slice.
+    """
+
+    def __init__(self):
+        self._scores: Dict[str, Dict[str, int]] = {}
+        self._ranking: Dict[str, List[Tuple[int, str]]] = {}
+        self._warm = False
+        self._snapshot: Optional[str] = None
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+
+    def increment(self, bucket: str, user_id: str, amount: int = 1):
+        with self._lock:
+            scores = self._scores.setdefault(bucket, {})
+            ranking = self._ranking.setdefault(bucket, [])
+
+            old = scores.get(user_id, 0)
+            if old:
+                del ranking[bisect_left(ranking, (-old, user_id))]
+
+            new = old + amount
+            if new > 0:
+                scores[user_id] = new
+                insort(ranking, (-new, user_id))
+            else:
+                scores.pop(user_id, None)
+
+    def replace(self, bucket: str, scores: Dict[str, int]):
+        with self._lock:
+            self._scores[bucket] = {u: s for u, s in scores.items() if s > 0}
+            self._ranking[bucket] = sorted(
+                (-s, u) for u, s in self._scores[bucket].items()
+            )
+
+    def top(self, bucket: str, k: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            return [(u, -s) for s, u in self._ranking.get(bucket, [])[:k]]
+
+    def prune(self, keep: Iterable[str]):
+        """Drop every bucket not in keep (past weeks and months)."""
+        keep = set(keep)
+        with self._lock:
+            for bucket in [b for b in self._scores if b not in keep]:
+                del self._scores[bucket]
+                self._ranking.pop(bucket, None)
+
+    def is_warm(self) -> bool:
+        return self._warm
+
+    def mark_warm(self, snapshot: Optional[str] = None):
+        self._snapshot = snapshot
+        self._warm = True
+
+    def warm_snapshot(self) -> Optional[str]:
+        return self._snapshot
+
+    def warm_lock(self):
+        return self._warm_lock
+
+
+class RedisLeaderboardStore:
+    """
+    Leaderboard store backed by Redis sorted sets (ZINCRBY / ZREVRANGE).
+
+    Windowed buckets expire on their own once the window is over.
+    """
+
+    KEY_PREFIX = "sss:leaderboard:"
+    WINDOW_TTL = {
+        'week': int(timedelta(weeks=5).total_seconds()),
+        'month': int(timedelta(days=62).total_seconds()),
+    }
+
+    # Longest a warm-up may hold the warm lock
+    WARM_LOCK_TIMEOUT = 60
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, bucket: str) -> str:
+        return f"{self.KEY_PREFIX}{bucket}"
+
+    def _expire(self, pipe, bucket: str):
+        ttl = self.WINDOW_TTL.get(bucket.split(':')[0])
+        if ttl:
+            pipe.expire(self._key(bucket), ttl)
+
+    def increment(self, bucket: str, user_id: str, amount: int = 1):
+        pipe = self.client.pipeline()
+        pipe.zincrby(self._key(bucket), amount, user_id)
+        pipe.zremrangebyscore(self._key(bucket), '-inf', 0)
+        self._expire(pipe, bucket)
+        pipe.execute()
+
+    def replace(self, bucket: str, scores: Dict[str, int]):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(bucket))
+        scores = {u: s for u, s in scores.items() if s > 0}
+        if scores:
+            pipe.zadd(self._key(bucket), scores)
+            self._expire(pipe, bucket)
+        pipe.execute()
+
+    def top(self, bucket: str, k: int) -> List[Tuple[str, int]]:
+        rows = self.client.zrevrange(self._key(bucket), 0, k - 1, withscores=True)
+        return [(user_id, int(score)) for user_id, score in rows]
+
+    def prune(self, keep: Iterable[str]):
+        # Past windows expire on their own (WINDOW_TTL)
+        pass
+
+    def is_warm(self) -> bool:
+        return bool(self.client.exists(self._key('warm')))
+
+    def mark_warm(self, snapshot: Optional[str] = None):
+        self.client.set(self._key('warm'), snapshot or '')
+
+    def warm_snapshot(self) -> Optional[str]:
+        value = self.client.get(self._key('warm'))
+        # Stores warmed before snapshots were kept hold "1"
+        return value if value and ':' in value else None
+
+    def warm_lock(self):
+        return self.client.lock(
+            self._key('warm_lock'),
+            timeout=self.WARM_LOCK_TIMEOUT,
+            blocking_timeout=self.WARM_LOCK_TIMEOUT
+        )
+
+
+class Leaderboard:
+    """
+    Top reviewers by review count, overall and per week/month.
+
+    The store is filled once from the reviews table (warm) and then kept
+    up to date by record_review on every review write. Only the current
+    week and month are kept; older buckets are dropped when a new window
+    starts.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._current: Dict[str, str] = {}
+        # Snapshot of the warm-up query, once known (it never changes)
+        self._snapshot: Optional[str] = None
+
+    def record_review(
+        self,
+        user_id,
+        created_at: Optional[datetime] = None,
+        amount: int = 1,
+        xid: Optional[int] = None
+    ):
+        """
+        Count (or uncount, with amount=-1) reviews in every window bucket.
+
+        Writes before the first warm are skipped; warming reads them from
+        the database anyway. A write that arrives during warm-up waits for
+        it, and is applied unless the warm-up query already saw it. Reviews
+        from past weeks/months only count towards 'all'.
+
+        Args:
+            user_id: User UUID
+            created_at: Review creation time (defaults to now)
+            amount: Number of reviews added (negative when deleting)
+            xid: pg_current_xact_id() of the committed write
+        """
+        try:
+            if not self.store.is_warm():
+                with self.store.warm_lock():
+                    if not self.store.is_warm():
+                        return
+            if not self._counted_by_warm(xid):
+                self._increment(user_id, created_at, amount)
+        except Exception as e:
+            print(f"Error updating leaderboard: {e}")
+
+    def _counted_by_warm(self, xid: Optional[int]) -> bool:
+        """Whether the warm-up query already included a write."""
+        if xid is None:
+            return False
+        if self._snapshot is None:
+            self._snapshot = self.store.warm_snapshot()
+        return bool(self._snapshot) and snapshot_sees(self._snapshot, xid)
+
+    def _increment(self, user_id, created_at: Optional[datetime], amount: int):
+        current = self._current_buckets()
+        for window, bucket in window_buckets(created_at or datetime.now()).items():
+            if bucket == current[window]:
+                self.store.increment(bucket, str(user_id), amount)
+
+    def _current_buckets(self, now: Optional[datetime] = None) -> Dict[str, str]:
+        """Buckets of the current windows; drops old ones when a window rolls over."""
+        current = window_buckets(now or datetime.now())
+        if current != self._current:
+            self._current = current
+            self.store.prune(current.values())
+        return current
+
+    def top(
+        self,
+        k: int = 10,
+        window: str = 'all',
+        now: Optional[datetime] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        Get the top-k (user_id, review_count) pairs for a window.
+
+        Args:
+            k: Number of reviewers
+            window: 'all', 'week' or 'month'
+            now: Reference time for the window (defaults to now)
+
+        Returns:
+            List of (user_id, review_count), highest first
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"window must be one of {WINDOWS}")
+        bucket = window_buckets(now or datetime.now())[window]
+        return self.store.top(bucket, k)
+
+    def warm(self, db: Session):
+        """
+        Load current counts from the reviews table if not done yet.
+
+        Runs one grouped query covering all windows, holding the warm
+        lock so concurrent record_review calls are applied after it (or
+        skipped when the query already saw them).
+
+        Args:
+            db: Database session
+        """
+        if self.store.is_warm():
+            return
+
+        with self.store.warm_lock():
+            if not self.store.is_warm():
+                self._load(db)
+
+    def _load(self, db: Session):
+        now = datetime.now()
+        week_start = datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+        month_start = datetime(now.year, now.month, 1)
+
+        rows = db.execute(
+            text(WARM_SQL),
+            {'week_start': week_start, 'month_start': month_start}
+        ).all()
+        counts = [row for row in rows if row.user_id is not None]
+
+        buckets = self._current_buckets(now)
+        for window in WINDOWS:
+            self.store.replace(
+                buckets[window],
+                {str(row.user_id): getattr(row, f'{window}_count') for row in counts}
+            )
+        self._snapshot = rows[0].snapshot
+        self.store.mark_warm(self._snapshot)
+
+
+_leaderboard: Optional[Leaderboard] = None
+
+
+def get_leaderboard() -> Leaderboard:
+    """
+    Get the process-wide leaderboard (backend chosen by LEADERBOARD_BACKEND).
+
+    Returns:
+        Leaderboard instance
+
+    Example:
+        board = get_leaderboard()
+        board.warm(db)
+        top = board.top(5, window='week')
+    """
+    global _leaderboard
+
+    if _leaderboard is None:
+        client = get_redis_client() if LEADERBOARD_BACKEND == 'redis' else None
+        if client is not None:
+            store = RedisLeaderboardStore(client)
+        else:
+            store = InMemoryLeaderboardStore()
+        _leaderboard = Leaderboard(store)
+    return _leaderboard
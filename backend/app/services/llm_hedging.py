@@ -0,0 +1,303 @@
+"""
+LLM Hedging
+
+Optional tail-latency protection for LLM calls (LLM_HEDGE=on):
+
+1. The primary model is called.
+2. If it has not answered after the hedge delay, a second request goes
+   to the hedge model (LLM_HEDGE_MODEL, e.g. a cheaper flash-lite model)
+   and whichever answers first wins; the other call is cancelled.
+3. If the primary fails, the hedge model is used as fallback.
+
+Hedges are extra load, so they are bounded twice: a hedge needs its own
+LLMScheduler slot, taken without waiting (skipped when the lane is full
+or has a queue, so LLM_MAX_CONCURRENCY still caps upstream calls), and
+at most LLM_HEDGE_MAX_RATE of requests are hedged (a token bucket
+refilled by every request, holding up to LLM_HEDGE_BURST hedges). In an
+upstream slowdown, where every call is slow, the hedge rate stays at
+LLM_HEDGE_MAX_RATE instead of doubling the load.
+
+The hedge delay is the LLM_HEDGE_PERCENTILE latency of the primary
+model, tracked over its recent calls (LatencyTracker), clamped to
+[LLM_HEDGE_MIN_DELAY_MS, LLM_HEDGE_MAX_DELAY_MS]; until enough samples
+exist, LLM_HEDGE_DEFAULT_DELAY_MS is used.
+
+    provider = with_hedging(get_llm_provider())
+    text = await provider.generate(prompt)
+    print(hedging_metrics()["hedge_rate"])
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .llm_providers import LLMProvider, LLM_PROVIDER, get_llm_provider
+from .llm_scheduler import LLMScheduler, llm_scheduler
+
+load_dotenv()
+
+LLM_HEDGE = os.getenv("LLM_HEDGE", "off").lower() in ("1", "on", "true", "yes")
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "gemini-2.5-flash-lite")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY_MS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "2000"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "300"))
+LLM_HEDGE_MAX_DELAY_MS = float(os.getenv("LLM_HEDGE_MAX_DELAY_MS", "8000"))
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+LLM_HEDGE_BURST = float(os.getenv("LLM_HEDGE_BURST", "3"))
+
+# Latencies kept per model
+LATENCY_WINDOW = 500
+
+
+class LatencyTracker:
+    """
+    Recent call latencies per model.
+
+    Example:
+        tracker.record("gemini-2.5-flash", 1.3)
+        tracker.percentile("gemini-2.5-flash", 0.95)  # seconds
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float):
+        self.samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, model: str) -> int:
+        return len(self.samples.get(model, ()))
+
+    def percentile(self, model: str, fraction: float) -> Optional[float]:
+        """Latency (seconds) at the given fraction, or None without samples."""
+        values = sorted(self.samples.get(model, ()))
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(len(values) * fraction))]
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for a model before hedging."""
+        if self.count(model) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY_MS / 1000
+        delay = self.percentile(model, LLM_HEDGE_PERCENTILE) * 1000
+        return min(max(delay, LLM_HEDGE_MIN_DELAY_MS), LLM_HEDGE_MAX_DELAY_MS) / 1000
+
+    def summary(self) -> Dict[str, Dict]:
+        return {
+            model: {
+                "samples": self.count(model),
+                "p50_ms": round(self.percentile(model, 0.5) * 1000, 1),
+                "p95_ms": round(self.percentile(model, 0.95) * 1000, 1),
+                "p99_ms": round(self.percentile(model, 0.99) * 1000, 1),
+            }
+            for model in self.samples
+        }
+
+
+# Shared by every hedged provider in the process
+latency_tracker = LatencyTracker()
+_stats = {
+    "requests": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0, "errors": 0,
+    "skipped_no_slot": 0, "skipped_budget": 0,
+}
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a fraction of requests.
+
+    Every request adds `rate` tokens (up to `burst`); a hedge costs one.
+
+    Example:
+        budget = HedgeBudget(rate=0.1, burst=3)
+        budget.on_request()
+        if budget.try_spend():
+            ...  # hedge
+    """
+
+    def __init__(self, rate: float = LLM_HEDGE_MAX_RATE, burst: float = LLM_HEDGE_BURST):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+
+    def on_request(self):
+        self.tokens = min(self.burst, self.tokens + self.rate)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def _model_name(provider: LLMProvider) -> str:
+    return getattr(provider, "model_name", provider.name)
+
+
+class HedgedProvider(LLMProvider):
+    """Primary provider with a delayed hedge request and fallback (see module docstring)."""
+
+    name = "hedged"
+
+    def __init__(
+        self,
+        primary: LLMProvider,
+        hedge: LLMProvider,
+        tracker: LatencyTracker = latency_tracker,
+        scheduler: LLMScheduler = llm_scheduler,
+        lane: str = "interactive",
+        budget: Optional[HedgeBudget] = None
+    ):
+        self.primary = primary
+        self.hedge = hedge
+        self.tracker = tracker
+        self.scheduler = scheduler
+        self.lane = lane
+        self.budget = budget or HedgeBudget()
+        self.model_name = _model_name(primary)
+
+    async def _timed(self, provider: LLMProvider, prompt: str) -> str:
+        started = time.monotonic()
+        try:
+            text = await provider.generate(prompt)
+        except asyncio.CancelledError:
+            # Lost the race: it took at least this long, which still
+            # tells the tracker about the tail
+            self.tracker.record(_model_name(provider), time.monotonic() - started)
+            raise
+        self.tracker.record(_model_name(provider), time.monotonic() - started)
+        return text
+
+    def _start_hedge(self, prompt: str) -> Optional[asyncio.Task]:
+        """Start a hedge if the budget and a free scheduler slot allow it."""
+        if not self.budget.try_spend():
+            _stats["skipped_budget"] += 1
+            return None
+        if not self.scheduler.try_acquire(self.lane):
+            # Unused token goes back: the slot, not the budget, said no
+            self.budget.tokens += 1
+            _stats["skipped_no_slot"] += 1
+            return None
+        hedge = asyncio.create_task(self._timed(self.hedge, prompt))
+        # Released when the task ends, also when it is cancelled before
+        # it got to run
+        hedge.add_done_callback(lambda _: self.scheduler.release(self.lane))
+        return hedge
+
+    async def generate(self, prompt: str) -> str:
+        _stats["requests"] += 1
+        self.budget.on_request()
+        primary = asyncio.create_task(self._timed(self.primary, prompt))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.tracker.hedge_delay(self.model_name))
+            hedge = None if done else self._start_hedge(prompt)
+            if hedge is None:
+                # Answered before the hedge delay, or no hedge allowed
+                await asyncio.wait({primary})
+                if not primary.exception():
+                    return primary.result()
+                # Primary failed: fall back (sequentially, in the caller's slot)
+                _stats["fallbacks"] += 1
+                print(f"LLM primary failed, falling back to {_model_name(self.hedge)}: {primary.exception()!r}")
+                return await self._timed(self.hedge, prompt)
+
+            _stats["hedged"] += 1
+            text, winner = await self._first_success(primary, hedge)
+            if winner is hedge:
+                _stats["hedge_wins"] += 1
+            return text
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        except Exception:
+            _stats["errors"] += 1
+            raise
+
+    @staticmethod
+    async def _first_success(*tasks: asyncio.Task) -> Tuple[str, asyncio.Task]:
+        """Result of the first task to succeed; the others are cancelled."""
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), task
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # Streams are not hedged; the hedge model is only a fallback when
+        # the primary fails before its first piece
+        started = False
+        try:
+            async for text in self.primary.stream(prompt):
+                started = True
+                yield text
+            return
+        except Exception as e:
+            if started:
+                raise
+            _stats["fallbacks"] += 1
+            print(f"LLM primary stream failed, falling back to {_model_name(self.hedge)}: {e!r}")
+        async for text in self.hedge.stream(prompt):
+            yield text
+
+
+def with_hedging(
+    provider: LLMProvider,
+    scheduler: LLMScheduler = llm_scheduler,
+    lane: str = "interactive"
+) -> LLMProvider:
+    """
+    Wrap a provider with hedging when LLM_HEDGE is on.
+
+    The hedge uses the same backend (LLM_PROVIDER) with LLM_HEDGE_MODEL.
+
+    Args:
+        provider: Primary provider
+        scheduler: Scheduler the caller's calls run in (hedges take an
+            extra slot from it)
+        lane: The caller's lane
+
+    Returns:
+        HedgedProvider, or the provider itself when hedging is off
+    """
+    if not LLM_HEDGE:
+        return provider
+    return HedgedProvider(
+        provider,
+        get_llm_provider(LLM_PROVIDER, model_name=LLM_HEDGE_MODEL),
+        scheduler=scheduler,
+        lane=lane
+    )
+
+
+def hedging_metrics() -> Dict:
+    """
+    Hedging counters since process start and per-model latencies.
+
+    Returns:
+        {"enabled", "requests", "hedged", "hedge_rate", "hedge_wins",
+         "win_rate", "fallbacks", "errors", "skipped_no_slot",
+         "skipped_budget", "max_rate", "models"}
+    """
+    requests = _stats["requests"]
+    hedged = _stats["hedged"]
+    return {
+        "enabled": LLM_HEDGE,
+        **_stats,
+        "hedge_rate": round(hedged / requests, 3) if requests else 0.0,
+        "win_rate": round(_stats["hedge_wins"] / hedged, 3) if hedged else 0.0,
+        "max_rate": LLM_HEDGE_MAX_RATE,
+        "models": latency_tracker.summary(),
+    }
@@ -0,0 +1,202 @@
+"""
+LLM Providers
+
+Backends behind AIService, selected with LLM_PROVIDER:
+
+- "gemini" (default): Google Gemini through google.generativeai
+- "stub": local, deterministic answers with configurable latency and
+  error rate, for load tests and capacity planning without network
+
+Every provider answers a prompt with plain text (generate) or with text
+pieces as they are produced (stream):
+
+    provider = get_llm_provider()
+    text = await provider.generate("Return JSON: ...")
+    async for piece in provider.stream(prompt):
+        ...
+"""
+
+import os
+import re
+import json
+import math
+import random
+import asyncio
+from typing import AsyncIterator, Optional
+
+from dotenv import load_dotenv
+
+from app.startup_report import timed
+
+load_dotenv()
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+# Stub settings: latency is log-normal around the median, errors are
+# raised with the given probability (on any call, and mid-stream)
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "800"))
+LLM_STUB_LATENCY_SIGMA = float(os.getenv("LLM_STUB_LATENCY_SIGMA", "0.5"))
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0.0"))
+LLM_STUB_SEED = os.getenv("LLM_STUB_SEED")
+
+
+class LLMError(Exception):
+    """A provider failed to answer."""
+
+
+class LLMProvider:
+    """Base class of LLM backends."""
+
+    name = "base"
+
+    async def generate(self, prompt: str) -> str:
+        """Answer a prompt with the complete text."""
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Answer a prompt piece by piece (default: one piece)."""
+        yield await self.generate(prompt)
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini (google.generativeai)."""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: Optional[str] = None):
+        # Imported here so the stub (and workers without AI traffic)
+        # never load the Gemini SDK
+        with timed("google.generativeai"):
+            import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. finish reason only)
+                continue
+            if text:
+                yield text
+
+
+class StubProvider(LLMProvider):
+    """
+    Local stand-in for Gemini.
+
+    Answers depend only on the prompt: the router, classifier and
+    extraction prompts get valid JSON (extraction uses the rule-based
+    extractor without a gazetteer), everything else a short canned
+    answer. Latency and errors are random; set LLM_STUB_SEED for
+    repeatable runs.
+
+    Example:
+        provider = StubProvider(latency_ms=200, error_rate=0.05, seed=1)
+        text = await provider.generate(prompt)
+    """
+
+    name = "stub"
+
+    def __init__(
+        self,
+        latency_ms: float = LLM_STUB_LATENCY_MS,
+        latency_sigma: float = LLM_STUB_LATENCY_SIGMA,
+        error_rate: float = LLM_STUB_ERROR_RATE,
+        seed: Optional[str] = LLM_STUB_SEED,
+        model_name: str = "stub"
+    ):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def _latency(self) -> float:
+        """Seconds for one call: log-normal with median latency_ms."""
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.random.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000
+
+    def _maybe_fail(self):
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise LLMError("stub provider: simulated upstream error")
+
+    @staticmethod
+    def _user_message(prompt: str) -> str:
+        match = re.search(r'"""(.*?)"""', prompt, re.DOTALL) or re.search(r"User:\s*(.*)", prompt, re.DOTALL)
+        return match.group(1).strip() if match else prompt.strip()
+
+    def answer(self, prompt: str) -> str:
+        """The deterministic answer to a prompt (no latency, no errors)."""
+        from .intent_rules import Gazetteer, extract_intent
+
+        message = self._user_message(prompt)
+        intent, confidence = extract_intent(message, Gazetteer({}, {}))
+        mode = "recommend" if intent["start"] or intent["poi_type"] else "chat"
+
+        if "intent router" in prompt:
+            return json.dumps(
+                {"mode": mode, "confidence": max(confidence, 0.5), "intent": intent},
+                ensure_ascii=False
+            )
+        if "strict classifier" in prompt:
+            return json.dumps({"mode": mode, "confidence": max(confidence, 0.5)})
+        if "extraction engine" in prompt:
+            return "```json\n" + json.dumps(intent, ensure_ascii=False) + "\n```"
+        return (
+            "Đây là câu trả lời mẫu từ LLM stub. "
+            f"Bạn đã hỏi: {message[:80]}"
+        )
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self._latency())
+        self._maybe_fail()
+        return self.answer(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text = self.answer(prompt)
+        words = text.split(" ")
+        # Time to first piece is most of the latency, like a real model
+        total = self._latency()
+        await asyncio.sleep(total * 0.6)
+        self._maybe_fail()
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(total * 0.4 / len(words))
+            yield word if i == len(words) - 1 else word + " "
+
+
+PROVIDERS = {
+    "gemini": GeminiProvider,
+    "stub": StubProvider,
+}
+
+
+def get_llm_provider(name: Optional[str] = None, **kwargs) -> LLMProvider:
+    """
+    Build the provider named by `name` or LLM_PROVIDER.
+
+    Args:
+        name: "gemini" or "stub" (default: LLM_PROVIDER)
+        **kwargs: Passed to the provider constructor
+
+    Returns:
+        LLMProvider instance
+
+    Example:
+        provider = get_llm_provider("stub", latency_ms=50)
+    """
+    name = (name or LLM_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{name}', expected one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](**kwargs)
@@ -0,0 +1,272 @@
+"""
+LLM Scheduler
+
+Admission control for LLM calls. Every call takes a slot before it
+reaches the provider:
+
+- at most LLM_MAX_CONCURRENCY calls are in flight per process
+- callers wait in priority lanes: "interactive" (chat requests) is
+  always served before "background" (batch jobs), and background calls
+  never hold more than LLM_BACKGROUND_MAX slots
+- every call has a deadline covering queueing and the call itself; when
+  it passes, the wait or the provider call is cancelled and LLMTimeout
+  is raised
+
+    text = await llm_scheduler.run(lambda: provider.generate(prompt))
+
+    async with llm_scheduler.slot("background") as deadline:
+        ...
+
+    if llm_scheduler.try_acquire("interactive"):  # extra call, only if free
+        try:
+            ...
+        finally:
+            llm_scheduler.release("interactive")
+
+Queue depth, wait times, timeouts and errors per lane are available
+from llm_scheduler.metrics().
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from .llm_providers import LLMError
+
+load_dotenv()
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_BACKGROUND_MAX = int(os.getenv("LLM_BACKGROUND_MAX", str(max(1, LLM_MAX_CONCURRENCY // 2))))
+
+# Default deadline (seconds) per lane, queueing included
+LANE_TIMEOUTS = {
+    "interactive": float(os.getenv("LLM_INTERACTIVE_TIMEOUT", "20")),
+    "background": float(os.getenv("LLM_BACKGROUND_TIMEOUT", "120")),
+}
+
+# Highest priority first
+LANES = ("interactive", "background")
+
+# Wait times kept per lane for percentiles
+WAIT_SAMPLES = 1000
+
+T = TypeVar("T")
+
+
+class LLMTimeout(LLMError):
+    """An LLM call missed its deadline (while queued or running)."""
+
+
+class _LaneStats:
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.queue_timeouts = 0
+        self.run_timeouts = 0
+        self.cancelled = 0
+        self.max_queue_depth = 0
+        self.waits_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+
+def _percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 1)
+
+
+class LLMScheduler:
+    """
+    Concurrency cap with priority lanes and deadlines (see module docstring).
+
+    Example:
+        scheduler = LLMScheduler(max_concurrency=4)
+        text = await scheduler.run(lambda: provider.generate(prompt), timeout=5)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        background_max: int = LLM_BACKGROUND_MAX
+    ):
+        self.max_concurrency = max_concurrency
+        self.background_max = min(background_max, max_concurrency)
+        self.active = {lane: 0 for lane in LANES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self.stats = {lane: _LaneStats() for lane in LANES}
+
+    def _can_start(self, lane: str) -> bool:
+        if sum(self.active.values()) >= self.max_concurrency:
+            return False
+        return lane != "background" or self.active["background"] < self.background_max
+
+    def _queue_depth(self, lane: str) -> int:
+        return sum(1 for waiter in self.waiters[lane] if not waiter.done())
+
+    def _wake_next(self):
+        """Hand free slots to waiters, highest-priority lane first."""
+        for lane in LANES:
+            queue = self.waiters[lane]
+            while queue and self._can_start(lane):
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self.active[lane] += 1
+                    waiter.set_result(None)
+
+    def try_acquire(self, lane: str = "interactive") -> bool:
+        """
+        Take a slot without waiting, for optional extra calls (hedges).
+
+        Fails when the lane is at its cap or anyone is queued in it or a
+        higher-priority lane, so extra calls never delay queued ones.
+
+        Returns:
+            True if a slot was taken (give it back with release)
+        """
+        queued_ahead = any(self._queue_depth(l) for l in LANES[:LANES.index(lane) + 1])
+        if queued_ahead or not self._can_start(lane):
+            return False
+        self.active[lane] += 1
+        return True
+
+    def release(self, lane: str = "interactive"):
+        """Give back a slot taken with try_acquire."""
+        self._release(lane)
+
+    async def _acquire(self, lane: str, deadline: float):
+        if self.try_acquire(lane):
+            return
+
+        stats = self.stats[lane]
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[lane].append(waiter)
+        stats.max_queue_depth = max(stats.max_queue_depth, self._queue_depth(lane))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Slot granted just as the deadline passed: give it back
+                self._release(lane)
+            else:
+                waiter.cancel()
+            stats.queue_timeouts += 1
+            raise LLMTimeout(f"LLM call waited in the {lane} queue past its deadline")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(lane)
+            else:
+                waiter.cancel()
+            stats.cancelled += 1
+            raise
+
+    def _release(self, lane: str):
+        self.active[lane] -= 1
+        self._wake_next()
+
+    @asynccontextmanager
+    async def slot(self, lane: str = "interactive", timeout: Optional[float] = None):
+        """
+        Hold one slot for the duration of the block.
+
+        Args:
+            lane: "interactive" or "background"
+            timeout: Seconds for queueing plus the block (default: the lane's)
+
+        Yields:
+            The deadline (time.monotonic() value) the block should respect
+
+        Raises:
+            LLMTimeout: The deadline passed while waiting for a slot
+        """
+        if lane not in self.stats:
+            raise ValueError(f"Unknown lane '{lane}', expected one of: {', '.join(LANES)}")
+        stats = self.stats[lane]
+        stats.submitted += 1
+        started = time.monotonic()
+        deadline = started + (timeout if timeout is not None else LANE_TIMEOUTS[lane])
+
+        await self._acquire(lane, deadline)
+        stats.waits_ms.append((time.monotonic() - started) * 1000)
+        try:
+            yield deadline
+            stats.completed += 1
+        except (asyncio.TimeoutError, LLMTimeout):
+            stats.run_timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            self._release(lane)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        lane: str = "interactive",
+        timeout: Optional[float] = None
+    ) -> T:
+        """
+        Run one LLM call in a slot, cancelling it at the deadline.
+
+        Args:
+            call: Function returning the awaitable to run (only called
+                once a slot is free)
+            lane: "interactive" or "background"
+            timeout: Seconds for queueing plus the call (default: the lane's)
+
+        Returns:
+            The call's result
+
+        Raises:
+            LLMTimeout: The deadline passed while queued or running
+        """
+        async with self.slot(lane, timeout) as deadline:
+            try:
+                return await asyncio.wait_for(call(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                raise LLMTimeout(f"LLM call ({lane}) did not finish before its deadline")
+
+    def metrics(self) -> Dict:
+        """
+        Current load and per-lane counters.
+
+        Returns:
+            {"max_concurrency", "in_flight", "lanes": {lane: {...}}}
+        """
+        lanes = {}
+        for lane in LANES:
+            stats = self.stats[lane]
+            waits = list(stats.waits_ms)
+            lanes[lane] = {
+                "in_flight": self.active[lane],
+                "queue_depth": self._queue_depth(lane),
+                "max_queue_depth": stats.max_queue_depth,
+                "submitted": stats.submitted,
+                "completed": stats.completed,
+                "errors": stats.errors,
+                "queue_timeouts": stats.queue_timeouts,
+                "run_timeouts": stats.run_timeouts,
+                "cancelled": stats.cancelled,
+                "wait_ms_p50": _percentile(waits, 0.5),
+                "wait_ms_p95": _percentile(waits, 0.95),
+                "wait_ms_max": round(max(waits), 1) if waits else 0.0,
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "background_max": self.background_max,
+            "in_flight": sum(self.active.values()),
+            "lanes": lanes,
+        }
+
+
+# Shared by every AIService in the process
+llm_scheduler = LLMScheduler()
@@ -6,12 +6,19 @@ Service class for managing locations with advanced search and filtering.
 
 from typing import Optional, List, Dict
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, text
 import uuid
 import math
 
-from app.models import Location, LocationCategory, Category, Review
+from app.models import Location, LocationCategory, Category
 from .base_service import BaseService
+from .rating_aggregates import rating_distribution
+from .category_service import invalidate_category_caches
+from .category_index import get_category_index
+
+
+# Location columns kept in the category index
+INDEXED_COLUMNS = {'is_active', 'district', 'price_level'}
 
 
 class LocationService(BaseService[Location]):
@@ -95,6 +102,7 @@ class LocationService(BaseService[Location]):
             
             if not location:
                 return None
+            invalidate_category_caches()
             
             # Add categories
             if category_ids:
@@ -141,6 +149,7 @@ class LocationService(BaseService[Location]):
             )
             self.db.add(loc_cat)
             self.db.commit()
+            invalidate_category_caches()
             return True
         except Exception as e:
             self.db.rollback()
@@ -171,6 +180,7 @@ class LocationService(BaseService[Location]):
             if loc_cat:
                 self.db.delete(loc_cat)
                 self.db.commit()
+                invalidate_category_caches()
                 return True
             return False
         except Exception as e:
@@ -178,6 +188,30 @@ class LocationService(BaseService[Location]):
             print(f"Error removing category: {e}")
             return False
     
+    def update(self, id: uuid.UUID, **kwargs) -> Optional[Location]:
+        """
+        Update a location, dropping the cached category data when an
+        indexed column (is_active, district, price_level) changes.
+        
+        Args:
+            id: Location UUID
+            **kwargs: Fields to update
+            
+        Returns:
+            Updated Location instance or None if failed
+        """
+        location = super().update(id, **kwargs)
+        if location and INDEXED_COLUMNS & kwargs.keys():
+            invalidate_category_caches()
+        return location
+    
+    def delete(self, id: uuid.UUID) -> bool:
+        """Delete a location (and its category links) and drop the cached category data."""
+        deleted = super().delete(id)
+        if deleted:
+            invalidate_category_caches()
+        return deleted
+    
     def get_location_categories(self, location_id: uuid.UUID) -> List[Category]:
         """
         Get all categories for a location.
@@ -213,7 +247,9 @@ class LocationService(BaseService[Location]):
         category_ids: Optional[List[uuid.UUID]] = None,
         is_active: bool = True,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        all_category_ids: Optional[List[uuid.UUID]] = None,
+        exclude_category_ids: Optional[List[uuid.UUID]] = None
     ) -> List[Location]:
         """
         Advanced location search with multiple filters.
@@ -224,10 +260,12 @@ class LocationService(BaseService[Location]):
             min_rating: Minimum rating
             max_rating: Maximum rating
             price_level: Price level filter
-            category_ids: List of category UUIDs
+            category_ids: Category UUIDs, any of which must match (OR)
             is_active: Only active locations
             skip: Pagination skip
             limit: Pagination limit
+            all_category_ids: Category UUIDs that must all match (AND)
+            exclude_category_ids: Category UUIDs that must not match (NOT)
             
         Returns:
             List of matching locations
@@ -272,15 +310,23 @@ class LocationService(BaseService[Location]):
             if price_level:
                 filters.append(Location.price_level == price_level)
             
+            # Category filters, resolved by the in-memory category index
+            location_ids = self._category_filter_ids(
+                any_categories=category_ids,
+                all_categories=all_category_ids,
+                exclude_categories=exclude_category_ids,
+                district=district,
+                price_level=price_level,
+                active_only=is_active
+            )
+            if location_ids is not None:
+                if not location_ids:
+                    return []
+                filters.append(Location.id.in_(location_ids))
+            
             # Base query
             query_obj = self.db.query(Location)
             
-            # Category filter
-            if category_ids:
-                query_obj = query_obj.join(LocationCategory).filter(
-                    LocationCategory.category_id.in_(category_ids)
-                )
-            
             # Apply all filters
             if filters:
                 query_obj = query_obj.filter(and_(*filters))
@@ -326,15 +372,22 @@ class LocationService(BaseService[Location]):
                 print(f"{loc['name_vi']} - {loc['distance_km']}km")
         """
         try:
+            params = {
+                'lat': latitude,
+                'lng': longitude,
+                'radius_km': radius_km,
+                'limit': limit
+            }
+            
             # Haversine formula SQL
-            haversine = f"""
-                (6371 * acos(
-                    cos(radians({latitude})) *
+            haversine = """
+                (6371 * acos(LEAST(1.0,
+                    cos(radians(:lat)) *
                     cos(radians(latitude)) *
-                    cos(radians(longitude) - radians({longitude})) +
-                    sin(radians({latitude})) *
+                    cos(radians(longitude) - radians(:lng)) +
+                    sin(radians(:lat)) *
                     sin(radians(latitude))
-                ))
+                )))
             """
             
             # Base query
@@ -350,25 +403,25 @@ class LocationService(BaseService[Location]):
             
             # Add filters
             if min_rating:
-                query += f" AND rating >= {min_rating}"
+                query += " AND rating >= :min_rating"
+                params['min_rating'] = min_rating
             
-            # Category filter (requires join)
-            if category_ids:
-                cat_ids_str = "','".join([str(cid) for cid in category_ids])
-                query += f"""
-                    AND id IN (
-                        SELECT location_id FROM location_categories
-                        WHERE category_id IN ('{cat_ids_str}')
-                    )
-                """
+            # Category filter, resolved by the in-memory category index
+            location_ids = self._category_filter_ids(any_categories=category_ids)
+            if location_ids is not None:
+                if not location_ids:
+                    return []
+                query += " AND id = ANY(CAST(:location_ids AS uuid[]))"
+                params['location_ids'] = [str(location_id) for location_id in location_ids]
             
-            query += f"""
-                HAVING distance < {radius_km}
+            query = f"""
+                SELECT * FROM ({query}) AS nearby
+                WHERE distance < :radius_km
                 ORDER BY distance
-                LIMIT {limit}
+                LIMIT :limit
             """
             
-            result = self.db.execute(query)
+            result = self.db.execute(text(query), params)
             
             locations = []
             for row in result:
@@ -393,6 +446,71 @@ class LocationService(BaseService[Location]):
             print(f"Error finding nearby locations: {e}")
             return []
     
+    def get_active_locations(
+        self,
+        category_ids: Optional[List[uuid.UUID]] = None
+    ) -> List[Location]:
+        """
+        Get every active location, without pagination.
+        
+        Meant for building candidate sets (e.g. recommendations), where
+        a page limit would silently drop locations.
+        
+        Args:
+            category_ids: Category UUIDs, any of which must match (OR),
+                resolved by the category index
+            
+        Returns:
+            List of active locations
+            
+        Example:
+            candidates = service.get_active_locations(category_ids=[museum_cat_id])
+        """
+        try:
+            filters = [Location.is_active == True]
+            location_ids = self._category_filter_ids(any_categories=category_ids)
+            if location_ids is not None:
+                if not location_ids:
+                    return []
+                filters.append(Location.id.in_(location_ids))
+            return self.db.query(Location).filter(*filters).all()
+        except Exception as e:
+            print(f"Error getting active locations: {e}")
+            return []
+    
+    def _category_filter_ids(
+        self,
+        any_categories: Optional[List[uuid.UUID]] = None,
+        all_categories: Optional[List[uuid.UUID]] = None,
+        exclude_categories: Optional[List[uuid.UUID]] = None,
+        district: Optional[str] = None,
+        price_level: Optional[str] = None,
+        active_only: bool = True
+    ) -> Optional[List[uuid.UUID]]:
+        """
+        Resolve category filters to location ids with the category index.
+        
+        District, price level and active flag narrow the bitset too, so
+        the id list handed to SQL is as short as possible; the SQL
+        filters on those columns still apply.
+        
+        Returns:
+            Matching location UUIDs, or None if no category filter is given
+        """
+        if not (any_categories or all_categories or exclude_categories):
+            return None
+        
+        index = get_category_index(self.db)
+        bits = index.match(
+            all_categories=all_categories,
+            any_categories=any_categories,
+            exclude_categories=exclude_categories,
+            districts=[district] if district else None,
+            price_levels=[price_level] if price_level else None,
+            active_only=active_only
+        )
+        return index.location_ids(bits)
+    
     def get_popular_locations(
         self,
         min_rating: float = 4.0,
@@ -445,21 +563,15 @@ class LocationService(BaseService[Location]):
             if not location:
                 return {}
             
-            # Get review statistics
-            reviews = self.db.query(Review).filter(
-                Review.location_id == location_id
-            ).all()
-            
-            rating_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-            for review in reviews:
-                rating_distribution[review.rating] += 1
+            # Review statistics come from the stored aggregate columns
+            distribution = rating_distribution(location)
             
             return {
                 'location_id': str(location_id),
                 'name_vi': location.name_vi,
-                'total_reviews': len(reviews),
+                'total_reviews': location.review_count or 0,
                 'average_rating': location.rating,
-                'rating_distribution': rating_distribution,
+                'rating_distribution': distribution,
                 'categories': [cat.name_vi for cat in self.get_location_categories(location_id)]
             }
         except Exception as e:
@@ -0,0 +1,222 @@
+"""
+Rating Aggregates
+
+Keeps the denormalized rating columns on ``locations`` (rating,
+review_count, rating_sum and the rating_count_1..5 histogram) in sync
+with the reviews table.
+
+rating_sum and the histogram cover the rows in ``reviews``. rating and
+review_count also include the source ratings a location was imported
+with (base_review_count reviews summing to base_rating_sum), so a
+seeded 4.7 from 1500 reviews stays about 4.7 after the first platform
+review:
+
+    review_count = base_review_count + reviews
+    rating = (base_rating_sum + rating_sum) / review_count
+
+Existing databases get the columns with migrations/001_rating_aggregates.sql.
+
+Review writes apply a small delta in the same transaction as the write,
+so the hot path never recounts reviews. ``rebuild_location_aggregates``
+recomputes everything from the reviews table in bulk and is meant to be
+run as a reconciliation job:
+
+    python -m app.services.rating_aggregates
+"""
+
+from typing import Dict, Iterable, Optional
+from sqlalchemy import update, case, cast, func, text, Float
+from sqlalchemy.orm import Session
+import uuid
+
+from app.models import Location
+
+RATING_LEVELS = (1, 2, 3, 4, 5)
+
+
+def histogram_column(level: int):
+    """Return the Location column holding the count for a rating level."""
+    return getattr(Location, f"rating_count_{level}")
+
+
+def rating_distribution(location: Location) -> Dict[int, int]:
+    """
+    Read the stored 1-5 histogram of a location.
+
+    Args:
+        location: Location instance
+
+    Returns:
+        Dictionary mapping each rating (1-5) to its review count
+    """
+    return {
+        level: getattr(location, f"rating_count_{level}") or 0
+        for level in RATING_LEVELS
+    }
+
+
+def apply_rating_delta(
+    db: Session,
+    location_id: uuid.UUID,
+    added: Optional[int] = None,
+    removed: Optional[int] = None
+) -> None:
+    """
+    Apply one review write to a location's aggregates.
+
+    Issues a single UPDATE that adjusts the running sum, count, histogram
+    and average in place. The caller owns the transaction; nothing is
+    committed here.
+
+    Args:
+        db: Database session
+        location_id: Location UUID
+        added: Rating that now counts towards the location (create/update)
+        removed: Rating that no longer counts (update/delete)
+
+    Example:
+        # Review rating changed from 3 to 5
+        apply_rating_delta(db, location_id, added=5, removed=3)
+    """
+    count_delta = (added is not None) - (removed is not None)
+    sum_delta = (added or 0) - (removed or 0)
+
+    new_count = func.coalesce(Location.review_count, 0) + count_delta
+    new_sum = Location.rating_sum + sum_delta
+
+    values = {
+        Location.review_count: new_count,
+        Location.rating_sum: new_sum,
+        Location.rating: case(
+            (new_count > 0, (Location.base_rating_sum + cast(new_sum, Float)) / new_count),
+            else_=None
+        ),
+    }
+    for level in RATING_LEVELS:
+        delta = (added == level) - (removed == level)
+        if delta:
+            column = histogram_column(level)
+            values[column] = column + delta
+
+    db.execute(
+        update(Location)
+        .where(Location.id == location_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+GROUPED_REVIEWS_SQL = """
+    SELECT
+        location_id,
+        COUNT(*) AS review_count,
+        SUM(rating) AS rating_sum,
+        COUNT(*) FILTER (WHERE rating = 1) AS count_1,
+        COUNT(*) FILTER (WHERE rating = 2) AS count_2,
+        COUNT(*) FILTER (WHERE rating = 3) AS count_3,
+        COUNT(*) FILTER (WHERE rating = 4) AS count_4,
+        COUNT(*) FILTER (WHERE rating = 5) AS count_5
+    FROM {source}
+    {where}
+    GROUP BY location_id
+"""
+
+REBUILD_SQL = """
+    UPDATE locations AS l SET
+        review_count = t.base_review_count + COALESCE(a.review_count, 0),
+        rating_sum = COALESCE(a.rating_sum, 0),
+        rating_count_1 = COALESCE(a.count_1, 0),
+        rating_count_2 = COALESCE(a.count_2, 0),
+        rating_count_3 = COALESCE(a.count_3, 0),
+        rating_count_4 = COALESCE(a.count_4, 0),
+        rating_count_5 = COALESCE(a.count_5, 0),
+        rating = (t.base_rating_sum + COALESCE(a.rating_sum, 0))
+            / NULLIF(t.base_review_count + COALESCE(a.review_count, 0), 0)
+    FROM locations AS t
+    LEFT JOIN ({grouped}) AS a ON a.location_id = t.id
+    WHERE l.id = t.id {location_filter}
+"""
+
+ADD_REVIEWS_SQL = """
+    UPDATE locations AS l SET
+        review_count = COALESCE(l.review_count, 0) + d.review_count,
+        rating_sum = l.rating_sum + d.rating_sum,
+        rating_count_1 = l.rating_count_1 + d.count_1,
+        rating_count_2 = l.rating_count_2 + d.count_2,
+        rating_count_3 = l.rating_count_3 + d.count_3,
+        rating_count_4 = l.rating_count_4 + d.count_4,
+        rating_count_5 = l.rating_count_5 + d.count_5,
+        rating = (l.base_rating_sum + l.rating_sum + d.rating_sum)
+            / (COALESCE(l.review_count, 0) + d.review_count)
+    FROM ({grouped}) AS d
+    WHERE l.id = d.location_id
+"""
+
+
+def add_reviews_sql(source: str) -> str:
+    """
+    Build an UPDATE that folds newly inserted reviews into the aggregates.
+
+    Meant to be embedded as a data-modifying CTE next to the INSERT, so
+    the insert and the aggregate delta run as one statement.
+
+    Args:
+        source: Name of a CTE/table with location_id and rating columns
+
+    Returns:
+        SQL text of the UPDATE statement
+    """
+    return ADD_REVIEWS_SQL.format(
+        grouped=GROUPED_REVIEWS_SQL.format(source=source, where="")
+    )
+
+
+def rebuild_location_aggregates(
+    db: Session,
+    location_ids: Optional[Iterable[uuid.UUID]] = None
+) -> int:
+    """
+    Recompute rating aggregates from the reviews table (plus each
+    location's base source ratings) in bulk.
+
+    One grouped UPDATE covers every requested location (or all of them).
+    The caller owns the transaction; nothing is committed here.
+
+    Args:
+        db: Database session
+        location_ids: Locations to rebuild (None = all locations)
+
+    Returns:
+        Number of locations updated
+
+    Example:
+        rebuilt = rebuild_location_aggregates(db, [location_id])
+        db.commit()
+    """
+    params = {}
+    review_filter = location_filter = ""
+    if location_ids is not None:
+        params['ids'] = [str(location_id) for location_id in location_ids]
+        if not params['ids']:
+            return 0
+        review_filter = "WHERE location_id = ANY(CAST(:ids AS uuid[]))"
+        location_filter = "AND t.id = ANY(CAST(:ids AS uuid[]))"
+
+    grouped = GROUPED_REVIEWS_SQL.format(source="reviews", where=review_filter)
+    result = db.execute(
+        text(REBUILD_SQL.format(grouped=grouped, location_filter=location_filter)),
+        params
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rebuilt = rebuild_location_aggregates(db)
+        db.commit()
+        print(f"Rebuilt rating aggregates for {rebuilt} locations")
+    finally:
+        db.close()
@@ -1,44 +1,13 @@
 import math
 from math import log
-from app.services.vietmap_service import VietMapService
+from app.services.route_legs import resolve_legs
 
 
 def normalize_point(p):
     return {"lat": p["lat"], "lng": p["lng"]}
 
 
-async def get_route_distance_km(start, end):
-    """Use VietMap Route API for real-world travel distance."""
-    try:
-        res = await VietMapService.route(
-            start=(start["lat"], start["lng"]),
-            end=(end["lat"], end["lng"]),
-            vehicle="car",
-        )
-        dist = res.get("distance_m")
-
-        if "paths" in res and len(res["paths"]) > 0:
-            dist = res["paths"][0]["distance"]
-
-        if dist:
-            return dist / 1000.0
-    except:
-        pass
-    return None
-
-
-def haversine(a, b):
-    R = 6371
-    from math import sin, cos, atan2, radians, sqrt
-
-    dlat = radians(b["lat"] - a["lat"])
-    dlon = radians(b["lng"] - a["lng"])
-    la1, la2 = radians(a["lat"]), radians(b["lat"])
-    h = sin(dlat / 2) ** 2 + cos(la1) * cos(la2) * sin(dlon / 2) ** 2
-    return 2 * R * atan2(sqrt(h), sqrt(1 - h))
-
-
-def calculate_weighted_score(location, dst_km, preferences, user_history):
+def calculate_weighted_score(location, dst_km, preferences, user_history, category_index=None):
     distance_score = max(0, 1 - dst_km / 10)
 
     rating_score = (location.rating or 0) / 5
@@ -46,9 +15,13 @@ def calculate_weighted_score(location, dst_km, preferences, user_history):
     popularity_score = min(1, log(1 + pop) / log(1000))
 
     pref_cat = preferences.get("preferred_categories", [])
-    loc_cat = [str(c.category_id) for c in location.categories]
 
-    if pref_cat:
+    if pref_cat and category_index is not None:
+        # Membership bit tests instead of loading location.categories
+        match = len([c for c in pref_cat if category_index.has(location.id, "category", c)])
+        category_score = match / len(pref_cat)
+    elif pref_cat:
+        loc_cat = [str(c.category_id) for c in location.categories]
         match = len([x for x in loc_cat if x in pref_cat])
         category_score = match / len(pref_cat)
     else:
@@ -76,43 +49,58 @@ def calculate_weighted_score(location, dst_km, preferences, user_history):
     }
 
 
-async def generate_recommendations_vietmap(user, locations, payload, user_prefs, max_stops=1):
+async def generate_recommendations_vietmap(
+    user, locations, payload, user_prefs, max_stops=1, category_index=None
+):
 
     start_point = normalize_point(payload["start_point"])
     user_history = user.get("history", [])
 
     recs = []
 
-    for loc in locations:
-        dst_km = await get_route_distance_km(
-            start_point, {"lat": loc.latitude, "lng": loc.longitude}
-        )
+    # Route distances to every candidate, resolved concurrently
+    # (leg cache -> VietMap route -> haversine)
+    legs = await resolve_legs([
+        (start_point, {"id": loc.id, "lat": loc.latitude, "lng": loc.longitude}, "car")
+        for loc in locations
+    ])
 
-        if not dst_km:
-            dst_km = haversine(
-                start_point, {"lat": loc.latitude, "lng": loc.longitude}
-        )
+    for loc, leg in zip(locations, legs):
+        dst_km = leg["distance_km"]
 
         score = calculate_weighted_score(
             location=loc,
             dst_km=dst_km,
             preferences=user_prefs,
             user_history=user_history,
+            category_index=category_index,
         )
 
         recs.append(
             {
                 "location_id": str(loc.id),
+                "name": loc.name,
                 "name_vi": loc.name_vi,
                 "district": loc.district,
                 "distance_km": dst_km,
                 "coordinates": {"lat": loc.latitude, "lng": loc.longitude},
-                "categories": (
-                    [c.category.name for c in loc.categories] if loc.categories else []
-                ),
                 "score": score["total"],
+                "_location": loc,
             }
         )
 
     recs.sort(key=lambda x: x["score"], reverse=True)
-    return recs[:max_stops]
+    top = recs[:max_stops]
+
+    # Category names only for the returned stops
+    for rec in top:
+        loc = rec.pop("_location")
+        if category_index is not None:
+            rec["categories"] = [
+                category_index.category_names[c] for c in category_index.categories_of(loc.id)
+            ]
+        else:
+            rec["categories"] = (
+                [c.category.name for c in loc.categories] if loc.categories else []
+            )
+    return top
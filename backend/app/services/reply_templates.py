@@ -0,0 +1,97 @@
+"""
+Reply Templates
+
+Locally rendered recommendation replies, used when the LLM narrative
+does not arrive within its latency budget. The reply follows the
+language of the user's message (Vietnamese or English) and is built
+from the selected locations' names, categories, districts and
+distances:
+
+    reply = render_recommendation_reply(results, "cà phê gần Bến Thành")
+    # "Mình gợi ý cho bạn 3 địa điểm: Highlands Coffee Nguyễn Huệ
+    #  (café, District 1, khoảng 0.8 km), ..."
+"""
+
+import re
+import unicodedata
+from typing import Dict, List
+
+# Common unaccented Vietnamese words (for messages typed without accents)
+VI_WORDS = {
+    'toi', 'minh', 'dang', 'muon', 'di', 'gan', 'quan', 'cho', 'goi', 'y',
+    'o', 'dau', 'nao', 'khong', 'ban', 'an', 'choi', 'nhe', 'voi', 'gi',
+}
+EN_WORDS = {
+    'i', 'im', 'am', 'want', 'to', 'near', 'the', 'a', 'where', 'what',
+    'find', 'some', 'please', 'around', 'looking', 'for', 'is', 'me', 'go',
+}
+
+
+def detect_language(message: str) -> str:
+    """
+    Guess whether a message is Vietnamese ('vi') or English ('en').
+
+    Any Vietnamese diacritic means 'vi'; otherwise the more frequent set
+    of common words wins, with 'vi' on ties.
+    """
+    if 'đ' in message.lower():
+        return 'vi'
+    decomposed = unicodedata.normalize('NFD', message)
+    if any(unicodedata.combining(ch) for ch in decomposed):
+        return 'vi'
+    words = re.findall(r"[a-z]+", message.lower())
+    english = sum(word in EN_WORDS for word in words)
+    vietnamese = sum(word in VI_WORDS for word in words)
+    return 'en' if english > vietnamese else 'vi'
+
+
+def _name(result: Dict, language: str) -> str:
+    preferred = result.get('name_vi') if language == 'vi' else result.get('name')
+    return preferred or result.get('name_vi') or result.get('name') or ''
+
+
+def _describe(result: Dict, language: str) -> str:
+    name = _name(result, language)
+    details = []
+    if result.get('categories'):
+        details.append(', '.join(c.lower() for c in result['categories'][:2]))
+    if result.get('district'):
+        details.append(result['district'])
+    if result.get('distance_km') is not None:
+        prefix = 'khoảng' if language == 'vi' else 'about'
+        details.append(f"{prefix} {result['distance_km']:.1f} km")
+    return f"{name} ({', '.join(details)})" if details else name
+
+
+def render_recommendation_reply(results: List[Dict], message: str = '') -> str:
+    """
+    Render a 2-3 sentence reply for recommended locations.
+
+    Args:
+        results: Recommendations (name_vi, name, district, categories,
+            distance_km), best first
+        message: The user's message, used to pick the language
+
+    Returns:
+        Reply text
+
+    Example:
+        render_recommendation_reply(results, "coffee near Notre Dame")
+        # "3 places are a good fit for you: ..."
+    """
+    language = detect_language(message)
+    places = '; '.join(_describe(result, language) for result in results)
+    first = _name(results[0], language) if results else ''
+
+    if language == 'en':
+        count = '1 place is' if len(results) == 1 else f"{len(results)} places are"
+        return (
+            f"{count} a good fit for you: {places}. "
+            f"{first} is the best match, so you may want to start there. "
+            "Enjoy your trip!"
+        )
+    return (
+        f"Mình gợi ý cho bạn {len(results)} địa điểm: {places}. "
+        f"{first} phù hợp nhất, bạn có thể ghé đó trước. "
+        "Chúc bạn có chuyến đi vui vẻ!"
+    )
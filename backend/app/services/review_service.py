@@ -4,14 +4,93 @@ Review Service
 Service class for managing location reviews.
 """
 
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Iterable
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import String, cast, column, delete, func, select, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from datetime import date
 import uuid
+import time
 
 from app.models import Review, Location, User
 from .base_service import BaseService
+from .leaderboard import get_leaderboard
+from .rating_aggregates import (
+    apply_rating_delta,
+    add_reviews_sql,
+    rebuild_location_aggregates,
+    histogram_column,
+    RATING_LEVELS,
+)
+
+# Error codes returned by ReviewService.insert_review
+INVALID_RATING = 'invalid_rating'
+USER_NOT_FOUND = 'user_not_found'
+LOCATION_NOT_FOUND = 'location_not_found'
+DUPLICATE_REVIEW = 'duplicate_review'
+DATABASE_ERROR = 'database_error'
+
+# Foreign key / check constraint name -> error code
+CONSTRAINT_ERRORS = {
+    'reviews_user_id_fkey': USER_NOT_FOUND,
+    'reviews_location_id_fkey': LOCATION_NOT_FOUND,
+    'check_review_rating': INVALID_RATING,
+}
+
+# Insert the review and fold it into the location aggregates in one
+# statement. ON CONFLICT turns a duplicate into an empty result; the
+# foreign keys reject unknown users/locations. xid identifies the write
+# to the leaderboard (see leaderboard.snapshot_sees).
+INSERT_REVIEW_SQL = f"""
+    WITH inserted AS (
+        INSERT INTO reviews (id, location_id, user_id, rating, comment, visit_date)
+        VALUES (:id, :location_id, :user_id, :rating, :comment, :visit_date)
+        ON CONFLICT (user_id, location_id) DO NOTHING
+        RETURNING id, location_id, user_id, rating, comment, visit_date, created_at
+    ), aggregated AS (
+        {add_reviews_sql('inserted')}
+    )
+    SELECT inserted.*, pg_current_xact_id()::text AS xid FROM inserted
+"""
+
+# Batch version of INSERT_REVIEW_SQL: the batch arrives as parallel arrays,
+# rows referencing unknown users/locations are filtered by the joins, and
+# the aggregates of every affected location are updated once per batch.
+BULK_INSERT_REVIEWS_SQL = f"""
+    WITH batch AS (
+        SELECT * FROM unnest(
+            CAST(:ids AS uuid[]),
+            CAST(:location_ids AS uuid[]),
+            CAST(:user_ids AS uuid[]),
+            CAST(:ratings AS integer[]),
+            CAST(:comments AS text[]),
+            CAST(:visit_dates AS date[])
+        ) AS b(id, location_id, user_id, rating, comment, visit_date)
+    ), valid AS (
+        SELECT b.*
+        FROM batch b
+        JOIN users u ON u.id = b.user_id
+        JOIN locations l ON l.id = b.location_id
+    ), inserted AS (
+        INSERT INTO reviews (id, location_id, user_id, rating, comment, visit_date)
+        SELECT id, location_id, user_id, rating, comment, visit_date FROM valid
+        ON CONFLICT (user_id, location_id) DO NOTHING
+        RETURNING location_id, user_id, rating
+    ), aggregated AS (
+        {add_reviews_sql('inserted')}
+    )
+    SELECT
+        (SELECT COUNT(*) FROM valid) AS valid_count,
+        (SELECT COUNT(*) FROM inserted) AS inserted_count,
+        pg_current_xact_id()::text AS xid,
+        (
+            SELECT json_object_agg(user_id, review_count)
+            FROM (
+                SELECT user_id, COUNT(*) AS review_count
+                FROM inserted GROUP BY user_id
+            ) AS per_user
+        ) AS user_counts
+"""
 
 
 class ReviewService(BaseService[Review]):
@@ -19,7 +98,9 @@ class ReviewService(BaseService[Review]):
     Service class for Review operations.
     
     Handles review creation, updates, and statistics.
-    Note: Location ratings are automatically updated via database trigger.
+    Note: Location rating aggregates (rating, review_count, rating_sum and
+    the 1-5 histogram) are updated incrementally in the same transaction
+    as every review create, update and delete.
     """
     
     def __init__(self, db: Session):
@@ -56,37 +137,193 @@ class ReviewService(BaseService[Review]):
                 visit_date=date(2024, 11, 20)
             )
         """
-        # Validate rating
-        if rating < 1 or rating > 5:
-            print("Rating must be between 1 and 5")
-            return None
-        
-        # Check if user exists
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
-            print(f"User {user_id} not found")
-            return None
-        
-        # Check if location exists
-        location = self.db.query(Location).filter(Location.id == location_id).first()
-        if not location:
-            print(f"Location {location_id} not found")
-            return None
-        
-        # Check if user already reviewed this location
-        existing_review = self.get_user_review(user_id, location_id)
-        if existing_review:
-            print(f"User already reviewed this location")
-            return None
-        
-        # Create review (trigger will auto-update location rating)
-        return self.create(
+        review, error = self.insert_review(
             user_id=user_id,
             location_id=location_id,
             rating=rating,
             comment=comment,
             visit_date=visit_date
         )
+        if error:
+            print(f"Cannot create review: {error}")
+        return review
+    
+    def insert_review(
+        self,
+        user_id: uuid.UUID,
+        location_id: uuid.UUID,
+        rating: int,
+        comment: Optional[str] = None,
+        visit_date: Optional[date] = None
+    ) -> Tuple[Optional[Review], Optional[str]]:
+        """
+        Insert a review in a single round-trip.
+        
+        One INSERT ... ON CONFLICT statement writes the review and updates
+        the location aggregates. The (user_id, location_id) unique
+        constraint rejects duplicates and the foreign keys reject unknown
+        users and locations, so concurrent posts cannot create duplicates.
+        
+        Args:
+            user_id: User UUID
+            location_id: Location UUID
+            rating: Rating (1-5)
+            comment: Optional review text
+            visit_date: Optional visit date
+            
+        Returns:
+            Tuple of (Review, None) on success or (None, error_code) where
+            error_code is one of INVALID_RATING, USER_NOT_FOUND,
+            LOCATION_NOT_FOUND, DUPLICATE_REVIEW or DATABASE_ERROR
+            
+        Example:
+            review, error = service.insert_review(user_id, location_id, 5)
+            if error == DUPLICATE_REVIEW:
+                print("Already reviewed")
+        """
+        if rating < 1 or rating > 5:
+            return None, INVALID_RATING
+        
+        try:
+            row = self.db.execute(
+                select(Review, column('xid', String)).from_statement(text(INSERT_REVIEW_SQL)),
+                {
+                    'id': str(uuid.uuid4()),
+                    'location_id': str(location_id),
+                    'user_id': str(user_id),
+                    'rating': rating,
+                    'comment': comment,
+                    'visit_date': visit_date
+                }
+            ).first()
+            
+            if not row:
+                self.db.rollback()
+                return None, DUPLICATE_REVIEW
+            review, xid = row
+            
+            # Detach before commit so the returned row is not expired and
+            # re-fetched on first attribute access
+            self.db.expunge(review)
+            self.db.commit()
+            get_leaderboard().record_review(review.user_id, review.created_at, xid=int(xid))
+            return review, None
+        except IntegrityError as e:
+            self.db.rollback()
+            constraint = getattr(getattr(e.orig, 'diag', None), 'constraint_name', None)
+            if constraint in CONSTRAINT_ERRORS:
+                return None, CONSTRAINT_ERRORS[constraint]
+            print(f"Integrity Error: {e}")
+            return None, DATABASE_ERROR
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            print(f"Error creating review: {e}")
+            return None, DATABASE_ERROR
+    
+    def bulk_ingest_reviews(
+        self,
+        reviews: Iterable[Dict],
+        batch_size: int = 1000
+    ) -> Dict:
+        """
+        Import a stream of reviews in batches.
+        
+        Reviews are written with one statement per batch that also
+        updates the rating aggregates of the affected locations. Each
+        batch is committed on its own and only the current batch is held
+        in memory, so the input can be a generator of any length.
+        Duplicates on (user_id, location_id) keep the first occurrence:
+        within a batch they are dropped before the INSERT, across batches
+        (and against existing reviews) ON CONFLICT skips them.
+        
+        Args:
+            reviews: Iterable of dicts with user_id, location_id, rating and
+                optional comment and visit_date
+            batch_size: Reviews per INSERT statement
+            
+        Returns:
+            Dictionary with ingest counters and throughput: rows read
+            (received_per_second) and rows written (inserted_per_second)
+            
+        Example:
+            stats = service.bulk_ingest_reviews(partner_feed(), batch_size=5000)
+            print(f"{stats['inserted']} reviews at {stats['inserted_per_second']}/s")
+        """
+        stats = {
+            'received': 0,
+            'inserted': 0,
+            'invalid': 0,
+            'duplicates': 0,
+            'missing_references': 0,
+            'failed': 0,
+            'batches': 0,
+        }
+        started = time.perf_counter()
+        # (user_id, location_id) -> review, for the current batch only
+        batch: Dict[Tuple[str, str], Dict] = {}
+        
+        for data in reviews:
+            stats['received'] += 1
+            rating = data.get('rating')
+            if not isinstance(rating, int) or rating < 1 or rating > 5:
+                stats['invalid'] += 1
+                continue
+            
+            key = (str(data['user_id']), str(data['location_id']))
+            if key in batch:
+                stats['duplicates'] += 1
+                continue
+            
+            batch[key] = data
+            if len(batch) >= batch_size:
+                self._ingest_batch(list(batch.values()), stats)
+                batch = {}
+        
+        if batch:
+            self._ingest_batch(list(batch.values()), stats)
+        
+        elapsed = time.perf_counter() - started
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        for counter in ('received', 'inserted'):
+            stats[f'{counter}_per_second'] = (
+                round(stats[counter] / elapsed, 1) if elapsed > 0 else 0
+            )
+        return stats
+    
+    def _ingest_batch(self, batch: List[Dict], stats: Dict):
+        """
+        Write one deduplicated batch and update ingest counters.
+        
+        Args:
+            batch: Validated review dicts
+            stats: Counters to update in place
+        """
+        try:
+            row = self.db.execute(
+                text(BULK_INSERT_REVIEWS_SQL),
+                {
+                    'ids': [str(uuid.uuid4()) for _ in batch],
+                    'location_ids': [str(r['location_id']) for r in batch],
+                    'user_ids': [str(r['user_id']) for r in batch],
+                    'ratings': [r['rating'] for r in batch],
+                    'comments': [r.get('comment') for r in batch],
+                    'visit_dates': [r.get('visit_date') for r in batch]
+                }
+            ).one()
+            self.db.commit()
+            
+            stats['batches'] += 1
+            stats['inserted'] += row.inserted_count
+            stats['duplicates'] += row.valid_count - row.inserted_count
+            stats['missing_references'] += len(batch) - row.valid_count
+            
+            leaderboard = get_leaderboard()
+            for user_id, count in (row.user_counts or {}).items():
+                leaderboard.record_review(user_id, amount=count, xid=int(row.xid))
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            stats['failed'] += len(batch)
+            print(f"Error ingesting review batch: {e}")
     
     def get_user_review(
         self,
@@ -157,6 +394,110 @@ class ReviewService(BaseService[Review]):
         
         return self.update(review_id, **update_data)
     
+    def _get_for_update(self, id: uuid.UUID) -> Optional[Review]:
+        """
+        Load a review with a row lock (SELECT ... FOR UPDATE).
+        
+        Concurrent updates/deletes of the same review wait for each
+        other, so each one sees the committed rating of the previous one
+        and its aggregate delta is applied exactly once.
+        
+        Args:
+            id: Review UUID
+            
+        Returns:
+            Locked Review instance (freshly read) or None if not found
+        """
+        return self.db.query(Review).filter(
+            Review.id == id
+        ).with_for_update().populate_existing().first()
+    
+    def update(self, id: uuid.UUID, **kwargs) -> Optional[Review]:
+        """
+        Update a review, moving its rating contribution if the rating changes.
+        
+        The review row is locked until commit, so the old rating the
+        delta is computed from cannot be stale.
+        
+        Args:
+            id: Review UUID
+            **kwargs: Fields to update
+            
+        Returns:
+            Updated Review instance or None if failed
+        """
+        try:
+            review = self._get_for_update(id)
+            if not review:
+                self.db.rollback()
+                return None
+            
+            old_rating = review.rating
+            for key, value in kwargs.items():
+                if hasattr(review, key):
+                    setattr(review, key, value)
+            
+            if review.rating != old_rating:
+                self.db.flush()
+                apply_rating_delta(
+                    self.db,
+                    review.location_id,
+                    added=review.rating,
+                    removed=old_rating
+                )
+            
+            self.db.commit()
+            self.db.refresh(review)
+            return review
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            print(f"Error updating review: {e}")
+            return None
+    
+    def delete(self, id: uuid.UUID) -> bool:
+        """
+        Delete a review and remove its rating from the location aggregates.
+        
+        The review row is locked first, and the rating is removed only
+        when this call actually deleted the row (DELETE ... RETURNING), so two concurrent
+        deletes of the same review decrement the aggregates once.
+        
+        Args:
+            id: Review UUID
+            
+        Returns:
+            True if deleted, False otherwise
+            
+        Example:
+            success = service.delete(review_id)
+        """
+        try:
+            review = self._get_for_update(id)
+            if not review:
+                self.db.rollback()
+                return False
+            
+            user_id, location_id = review.user_id, review.location_id
+            rating, created_at = review.rating, review.created_at
+            
+            xid = self.db.execute(
+                delete(Review)
+                .where(Review.id == id)
+                .returning(cast(func.pg_current_xact_id(), String))
+            ).scalar()
+            if xid is None:
+                self.db.rollback()
+                return False
+            
+            apply_rating_delta(self.db, location_id, removed=rating)
+            self.db.commit()
+            get_leaderboard().record_review(user_id, created_at, amount=-1, xid=int(xid))
+            return True
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            print(f"Error deleting review: {e}")
+            return False
+    
     def get_location_reviews(
         self,
         location_id: uuid.UUID,
@@ -231,6 +572,33 @@ class ReviewService(BaseService[Review]):
             print(f"Error getting user reviews: {e}")
             return []
     
+    def get_rating_distribution(self, location_id: uuid.UUID) -> Dict[int, int]:
+        """
+        Get the 1-5 rating histogram for a location.
+        
+        Reads the histogram columns stored on the location, so the cost
+        does not depend on how many reviews the location has.
+        
+        Args:
+            location_id: Location UUID
+            
+        Returns:
+            Dictionary mapping each rating (1-5) to its review count
+            
+        Example:
+            distribution = service.get_rating_distribution(location_id)
+            print(f"5 stars: {distribution[5]}")
+        """
+        row = self.db.query(
+            *[histogram_column(level) for level in RATING_LEVELS]
+        ).filter(
+            Location.id == location_id
+        ).first()
+        
+        if not row:
+            return {level: 0 for level in RATING_LEVELS}
+        return {level: count or 0 for level, count in zip(RATING_LEVELS, row)}
+    
     def get_review_statistics(self, location_id: uuid.UUID) -> Dict:
         """
         Get detailed review statistics for a location.
@@ -247,31 +615,24 @@ class ReviewService(BaseService[Review]):
             print(f"Distribution: {stats['rating_distribution']}")
         """
         try:
-            reviews = self.db.query(Review).filter(
-                Review.location_id == location_id
-            ).all()
+            distribution = self.get_rating_distribution(location_id)
+            total_reviews = sum(distribution.values())
             
-            if not reviews:
+            if not total_reviews:
                 return {
                     'total_reviews': 0,
                     'average_rating': 0,
-                    'rating_distribution': {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+                    'rating_distribution': distribution
                 }
             
-            # Calculate distribution
-            distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-            total_rating = 0
-            
-            for review in reviews:
-                distribution[review.rating] += 1
-                total_rating += review.rating
+            total_rating = sum(rating * count for rating, count in distribution.items())
             
             return {
-                'total_reviews': len(reviews),
-                'average_rating': round(total_rating / len(reviews), 2),
+                'total_reviews': total_reviews,
+                'average_rating': round(total_rating / total_reviews, 2),
                 'rating_distribution': distribution,
                 'percentage_distribution': {
-                    rating: round((count / len(reviews)) * 100, 1)
+                    rating: round((count / total_reviews) * 100, 1)
                     for rating, count in distribution.items()
                 }
             }
@@ -279,41 +640,78 @@ class ReviewService(BaseService[Review]):
             print(f"Error getting review statistics: {e}")
             return {}
     
-    def get_top_reviewers(self, limit: int = 10) -> List[Dict]:
+    def reconcile_location_aggregates(
+        self,
+        location_ids: Optional[List[uuid.UUID]] = None
+    ) -> int:
+        """
+        Rebuild location rating aggregates from the reviews table.
+        
+        Repair operation for drift (manual SQL edits, imports); the
+        regular write paths keep aggregates up to date incrementally.
+        
+        Args:
+            location_ids: Locations to rebuild (None = all locations)
+            
+        Returns:
+            Number of locations rebuilt
+            
+        Example:
+            rebuilt = service.reconcile_location_aggregates()
+        """
+        try:
+            rebuilt = rebuild_location_aggregates(self.db, location_ids)
+            self.db.commit()
+            return rebuilt
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            print(f"Error reconciling location aggregates: {e}")
+            return 0
+    
+    def get_top_reviewers(self, limit: int = 10, window: str = 'all') -> List[Dict]:
         """
         Get users with most reviews.
         
+        Reads the incrementally maintained leaderboard (O(limit)) and
+        loads only the returned users.
+        
         Args:
             limit: Maximum results
+            window: 'all', 'week' (this ISO week) or 'month' (this month)
             
         Returns:
             List of dictionaries with user info and review count
             
         Example:
-            top_reviewers = service.get_top_reviewers(limit=5)
+            top_reviewers = service.get_top_reviewers(limit=5, window='week')
             for reviewer in top_reviewers:
                 print(f"{reviewer['full_name']}: {reviewer['review_count']} reviews")
         """
         try:
-            result = self.db.query(
-                User.id,
-                User.full_name,
-                User.email,
-                func.count(Review.id).label('review_count')
-            ).join(Review).group_by(
-                User.id, User.full_name, User.email
-            ).order_by(
-                func.count(Review.id).desc()
-            ).limit(limit).all()
+            leaderboard = get_leaderboard()
+            leaderboard.warm(self.db)
+            ranking = leaderboard.top(limit, window)
+            if not ranking:
+                return []
+            
+            users = {
+                str(row.id): row
+                for row in self.db.query(
+                    User.id, User.full_name, User.email
+                ).filter(
+                    User.id.in_([user_id for user_id, _ in ranking])
+                ).all()
+            }
             
             return [
                 {
-                    'user_id': str(row.id),
-                    'full_name': row.full_name,
-                    'email': row.email,
-                    'review_count': row.review_count
+                    'user_id': user_id,
+                    'full_name': users[user_id].full_name,
+                    'email': users[user_id].email,
+                    'review_count': review_count
                 }
-                for row in result
+                for user_id, review_count in ranking
+                if user_id in users
             ]
         except Exception as e:
             print(f"Error getting top reviewers: {e}")
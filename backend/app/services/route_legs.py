@@ -0,0 +1,260 @@
+"""
+Route Legs
+
+Distance, travel time and geometry of one leg between two points.
+
+Legs are resolved in three steps, cheapest first:
+
+1. Leg cache, keyed by (from, to, transport mode)
+2. VietMap routing API (result is cached)
+3. Straight-line (haversine) estimate at an average speed per mode
+
+``resolve_legs`` resolves many legs concurrently, with at most
+ROUTING_CONCURRENCY routing requests in flight. With the Redis leg cache
+(CACHE_BACKEND=redis) cache reads and writes run in a worker thread, so
+they do not block the event loop.
+"""
+
+import os
+import asyncio
+from math import sin, cos, atan2, radians, sqrt
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from .cache import RedisCache, make_cache
+from .vietmap_service import VietMapService, BASE_URL as VIETMAP_BASE_URL
+
+load_dotenv()
+
+ROUTING_CONCURRENCY = int(os.getenv("ROUTING_CONCURRENCY", "8"))
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Average door-to-door speed (km/h) per transport mode, used when a leg
+# cannot be routed
+AVERAGE_SPEED_KMH = {'walk': 4.5, 'car': 20, 'bus': 15, 'grab': 20}
+
+# VietMap routing profile per transport mode
+VEHICLE_BY_MODE = {'walk': 'foot', 'car': 'car', 'bus': 'car', 'grab': 'motorcycle'}
+
+LEG_CACHE = make_cache("route_leg", maxsize=20000, ttl=ROUTE_CACHE_TTL)
+
+
+async def _cache_get(key: str) -> Optional[Dict]:
+    if isinstance(LEG_CACHE, RedisCache):
+        return await asyncio.to_thread(LEG_CACHE.get, key)
+    return LEG_CACHE.get(key)
+
+
+async def _cache_set(key: str, leg: Dict):
+    if isinstance(LEG_CACHE, RedisCache):
+        await asyncio.to_thread(LEG_CACHE.set, key, leg)
+    else:
+        LEG_CACHE.set(key, leg)
+
+
+def haversine(a, b):
+    R = 6371
+
+    dlat = radians(b["lat"] - a["lat"])
+    dlon = radians(b["lng"] - a["lng"])
+    la1, la2 = radians(a["lat"]), radians(b["lat"])
+    h = sin(dlat / 2) ** 2 + cos(la1) * cos(la2) * sin(dlon / 2) ** 2
+    return 2 * R * atan2(sqrt(h), sqrt(1 - h))
+
+
+def estimate_leg(origin: Dict, destination: Dict, transport_mode: str) -> Dict:
+    """
+    Estimate a leg from straight-line distance and average speed.
+
+    Args:
+        origin: Previous point {lat, lng}
+        destination: Next point {lat, lng}
+        transport_mode: 'walk', 'car', 'bus', or 'grab'
+
+    Returns:
+        Dictionary with distance_km and travel_time (minutes)
+    """
+    distance = haversine(origin, destination)
+    speed = AVERAGE_SPEED_KMH.get(transport_mode, AVERAGE_SPEED_KMH['car'])
+    return {
+        'distance_km': round(distance, 3),
+        'travel_time': round(distance / speed * 60)
+    }
+
+
+def point_key(point: Dict) -> str:
+    """
+    Cache key of a point: its location id if known, else rounded coordinates.
+
+    Example:
+        point_key({"id": location_id, "lat": 10.77, "lng": 106.70})  # location id
+        point_key({"lat": 10.772, "lng": 106.6981})  # "10.77200,106.69810"
+    """
+    if point.get('id'):
+        return str(point['id'])
+    return f"{float(point['lat']):.5f},{float(point['lng']):.5f}"
+
+
+def leg_cache_key(origin: Dict, destination: Dict, transport_mode: str) -> str:
+    """Build the leg cache key for (from, to, transport mode)."""
+    return f"{point_key(origin)}|{point_key(destination)}|{transport_mode}"
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[Tuple[float, float]]:
+    """
+    Decode an encoded polyline (as returned by VietMap routing).
+
+    Args:
+        encoded: Encoded polyline string
+        precision: Number of decimal places encoded (5 for VietMap)
+
+    Returns:
+        List of (lat, lng) points
+    """
+    points = []
+    index = lat = lng = 0
+    factor = 10 ** precision
+
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+
+    return points
+
+
+def cached_geometry(
+    origin: Dict,
+    destination: Dict,
+    transport_mode: str
+) -> Optional[List[Tuple[float, float]]]:
+    """
+    Get the routed path of a leg from the leg cache, without routing.
+
+    Args:
+        origin: Start point {lat, lng} (optionally with location id)
+        destination: End point {lat, lng} (optionally with location id)
+        transport_mode: 'walk', 'car', 'bus', or 'grab'
+
+    Returns:
+        List of (lat, lng) points, or None if the leg has no cached geometry
+    """
+    cached = LEG_CACHE.get(leg_cache_key(origin, destination, transport_mode))
+    if not cached or not cached.get('geometry'):
+        return None
+    try:
+        return decode_polyline(cached['geometry'])
+    except (IndexError, TypeError) as e:
+        print(f"Invalid cached route geometry: {e}")
+        return None
+
+
+def _parse_route(response) -> Optional[Dict]:
+    """Extract distance, time and geometry from a VietMap route response."""
+    if not isinstance(response, dict) or not response.get('paths'):
+        return None
+    path = response['paths'][0]
+    if not path.get('distance'):
+        return None
+    return {
+        'distance_km': round(path['distance'] / 1000.0, 3),
+        'travel_time': round((path.get('time') or 0) / 60000),
+        'geometry': path.get('points')
+    }
+
+
+async def resolve_leg(
+    origin: Dict,
+    destination: Dict,
+    transport_mode: str = 'car',
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Dict:
+    """
+    Resolve one leg: cache, then routing API, then haversine estimate.
+
+    Args:
+        origin: Start point {lat, lng} (optionally with location id)
+        destination: End point {lat, lng} (optionally with location id)
+        transport_mode: 'walk', 'car', 'bus', or 'grab'
+        semaphore: Optional limit on concurrent routing requests
+
+    Returns:
+        Dictionary with distance_km, travel_time (minutes), geometry
+        (encoded polyline or None) and source ('cache', 'routing' or
+        'haversine')
+
+    Example:
+        leg = await resolve_leg(
+            {"lat": 10.7720, "lng": 106.6981},
+            {"id": museum_id, "lat": 10.7797, "lng": 106.6918},
+            transport_mode="walk"
+        )
+    """
+    key = leg_cache_key(origin, destination, transport_mode)
+    cached = await _cache_get(key)
+    if cached:
+        return {**cached, 'source': 'cache'}
+
+    if VIETMAP_BASE_URL:
+        try:
+            request = VietMapService.route(
+                start=(origin['lat'], origin['lng']),
+                end=(destination['lat'], destination['lng']),
+                vehicle=VEHICLE_BY_MODE.get(transport_mode, 'car'),
+            )
+            if semaphore:
+                async with semaphore:
+                    response = await request
+            else:
+                response = await request
+            leg = _parse_route(response)
+            if leg:
+                await _cache_set(key, leg)
+                return {**leg, 'source': 'routing'}
+        except Exception as e:
+            print(f"Routing error, using straight-line estimate: {e}")
+
+    return {
+        **estimate_leg(origin, destination, transport_mode),
+        'geometry': None,
+        'source': 'haversine'
+    }
+
+
+async def resolve_legs(
+    legs: Sequence[Tuple[Dict, Dict, str]],
+    concurrency: int = ROUTING_CONCURRENCY
+) -> List[Dict]:
+    """
+    Resolve many legs concurrently.
+
+    Args:
+        legs: List of (origin, destination, transport_mode)
+        concurrency: Maximum routing requests in flight
+
+    Returns:
+        Resolved legs (see resolve_leg), in input order
+
+    Example:
+        results = await resolve_legs([
+            (start, first_stop, "car"),
+            (first_stop, second_stop, "car"),
+        ])
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    return list(await asyncio.gather(*(
+        resolve_leg(origin, destination, transport_mode, semaphore)
+        for origin, destination, transport_mode in legs
+    )))
@@ -6,10 +6,11 @@ Service class for managing users and user preferences.
 
 from typing import Optional, List
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 import uuid
 
-from app.models import User, UserPreference, Review, Location
+from app.models import User, UserPreference, Review, Location, LocationCategory
 from .base_service import BaseService
 
 
@@ -247,27 +248,56 @@ class UserService(BaseService[User]):
 
 
     def get_user_with_history(self, user_id):
+        """
+        Get a user with their review history for recommendations.
+        
+        Runs two queries regardless of history length: one for the user
+        and one that joins reviews, locations and categories, aggregating
+        each location's category ids into an array.
+        
+        Args:
+            user_id: User's UUID
+            
+        Returns:
+            Dictionary with user id, email and review history
+            
+        Example:
+            data = service.get_user_with_history(user_id)
+            for h in data['history']:
+                print(h['location_id'], h['rating'], h['categories'])
+        """
         try:
-            user = self.db.query(User).filter(User.id == user_id).first()
+            user = self.db.query(User.id, User.email).filter(User.id == user_id).first()
             if not user:
                 return None
 
             # History: list of reviews with location details
-            reviews = (
-                self.db.query(Review)
+            category_ids = func.array_agg(LocationCategory.category_id).filter(
+                LocationCategory.category_id.isnot(None)
+            )
+            rows = (
+                self.db.query(
+                    Review.location_id,
+                    Review.rating,
+                    Location.district,
+                    Location.price_level,
+                    category_ids.label("category_ids")
+                )
                 .join(Location, Review.location_id == Location.id)
+                .outerjoin(LocationCategory, LocationCategory.location_id == Location.id)
                 .filter(Review.user_id == user_id)
+                .group_by(Review.id, Location.id)
                 .all()
             )
 
             history = []
-            for r in reviews:
+            for r in rows:
                 history.append({
                     "location_id": str(r.location_id),
                     "rating": r.rating,
-                    "categories": [str(c.category_id) for c in r.location.categories],
-                    "district": r.location.district,
-                    "price_level": r.location.price_level
+                    "categories": [str(c) for c in r.category_ids or []],
+                    "district": r.district,
+                    "price_level": r.price_level
                 })
 
             return {
@@ -0,0 +1,93 @@
+"""
+Startup Report
+
+Import and initialization cost per module, so slow worker boots can be
+traced to what they load:
+
+    with timed("app.routers.ai_routes"):
+        from app.routers.ai_routes import router as ai_router
+
+    with timed("AIService", kind="init"):
+        service = AIService()
+
+    startup_report()  # entries sorted by cost
+
+Each entry records wall time, how many modules were newly imported and
+the growth of the process's peak RSS. Times are measured from the first
+import of this module (main.py imports it first).
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_process_started = time.perf_counter()
+_entries: List[Dict] = []
+
+
+def _peak_rss_kb() -> int:
+    if resource is None:
+        return 0
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+@contextmanager
+def timed(name: str, kind: str = "import"):
+    """
+    Record the cost of the block as one report entry.
+
+    Args:
+        name: Module or component name
+        kind: "import" or "init"
+    """
+    modules_before = len(sys.modules)
+    rss_before = _peak_rss_kb()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _entries.append({
+            "name": name,
+            "kind": kind,
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "new_modules": len(sys.modules) - modules_before,
+            "peak_rss_growth_mb": round((_peak_rss_kb() - rss_before) / 1024, 1),
+            "at_ms": round((started - _process_started) * 1000, 1),
+        })
+
+
+def startup_report() -> Dict:
+    """
+    Everything recorded so far, most expensive first.
+
+    Returns:
+        {"since_start_ms", "modules_loaded", "peak_rss_mb", "entries"}
+    """
+    return {
+        "since_start_ms": round((time.perf_counter() - _process_started) * 1000, 1),
+        "modules_loaded": len(sys.modules),
+        "peak_rss_mb": round(_peak_rss_kb() / 1024, 1),
+        "entries": sorted(_entries, key=lambda entry: entry["ms"], reverse=True),
+    }
+
+
+def print_startup_report():
+    """Print the report, one line per entry."""
+    report = startup_report()
+    print(
+        f"Startup: {report['since_start_ms']} ms, {report['modules_loaded']} modules, "
+        f"peak RSS {report['peak_rss_mb']} MB"
+    )
+    for entry in report["entries"]:
+        print(
+            f"  {entry['kind']:<6} {entry['name']:<46} {entry['ms']:>8} ms "
+            f"{entry['new_modules']:>5} modules {entry['peak_rss_growth_mb']:>6} MB"
+        )
@@ -0,0 +1,103 @@
+---------------------------------------------------------------
+-- 001: rating aggregates and one review per user and location
+--
+-- Brings a database created from an older schema.sql up to date with
+-- the incremental rating aggregates (app.services.rating_aggregates):
+--
+--   1. adds rating_sum, the rating_count_1..5 histogram and the
+--      base_review_count / base_rating_sum source ratings
+--   2. moves the current rating/review_count into the base columns,
+--      minus whatever the histogram already covers (nothing on a
+--      database that predates the aggregates: nothing ever counted
+--      reviews rows into rating/review_count)
+--   3. removes duplicate reviews (keeps each user's newest review of a
+--      location) and adds uq_reviews_user_location
+--   4. replaces idx_reviews_location_id by idx_reviews_location_rating
+--   5. rebuilds the aggregates from the reviews table
+--
+-- Safe to run more than once; runs in one transaction:
+--
+--   psql "$DATABASE_URL" -f backend/migrations/001_rating_aggregates.sql
+---------------------------------------------------------------
+BEGIN;
+
+ALTER TABLE locations
+    ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count_1 INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count_2 INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count_3 INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count_4 INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS rating_count_5 INTEGER NOT NULL DEFAULT 0;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'locations' AND column_name = 'base_review_count'
+    ) THEN
+        ALTER TABLE locations
+            ADD COLUMN base_review_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN base_rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0;
+
+        UPDATE locations SET
+            base_review_count = GREATEST(
+                COALESCE(review_count, 0)
+                - (rating_count_1 + rating_count_2 + rating_count_3
+                   + rating_count_4 + rating_count_5),
+                0
+            ),
+            base_rating_sum = GREATEST(
+                COALESCE(rating, 0) * COALESCE(review_count, 0) - rating_sum,
+                0
+            );
+    END IF;
+END $$;
+
+-- One review per (user, location): keep the newest
+DELETE FROM reviews AS r
+USING reviews AS newer
+WHERE newer.user_id = r.user_id
+  AND newer.location_id = r.location_id
+  AND (newer.created_at, newer.id) > (r.created_at, r.id);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_reviews_user_location'
+    ) THEN
+        ALTER TABLE reviews
+            ADD CONSTRAINT uq_reviews_user_location UNIQUE (user_id, location_id);
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_reviews_location_rating ON reviews (location_id, rating);
+DROP INDEX IF EXISTS idx_reviews_location_id;
+
+-- Same rebuild as app.services.rating_aggregates.rebuild_location_aggregates
+UPDATE locations AS l SET
+    review_count = t.base_review_count + COALESCE(a.review_count, 0),
+    rating_sum = COALESCE(a.rating_sum, 0),
+    rating_count_1 = COALESCE(a.count_1, 0),
+    rating_count_2 = COALESCE(a.count_2, 0),
+    rating_count_3 = COALESCE(a.count_3, 0),
+    rating_count_4 = COALESCE(a.count_4, 0),
+    rating_count_5 = COALESCE(a.count_5, 0),
+    rating = (t.base_rating_sum + COALESCE(a.rating_sum, 0))
+        / NULLIF(t.base_review_count + COALESCE(a.review_count, 0), 0)
+FROM locations AS t
+LEFT JOIN (
+    SELECT
+        location_id,
+        COUNT(*) AS review_count,
+        SUM(rating) AS rating_sum,
+        COUNT(*) FILTER (WHERE rating = 1) AS count_1,
+        COUNT(*) FILTER (WHERE rating = 2) AS count_2,
+        COUNT(*) FILTER (WHERE rating = 3) AS count_3,
+        COUNT(*) FILTER (WHERE rating = 4) AS count_4,
+        COUNT(*) FILTER (WHERE rating = 5) AS count_5
+    FROM reviews
+    GROUP BY location_id
+) AS a ON a.location_id = t.id
+WHERE l.id = t.id;
+
+COMMIT;
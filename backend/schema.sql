@@ -41,6 +41,14 @@ CREATE TABLE locations (
   average_visit_duration INTEGER,
   rating DOUBLE PRECISION,
   review_count INTEGER DEFAULT 0,
+  base_review_count INTEGER NOT NULL DEFAULT 0,
+  base_rating_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+  rating_sum INTEGER NOT NULL DEFAULT 0,
+  rating_count_1 INTEGER NOT NULL DEFAULT 0,
+  rating_count_2 INTEGER NOT NULL DEFAULT 0,
+  rating_count_3 INTEGER NOT NULL DEFAULT 0,
+  rating_count_4 INTEGER NOT NULL DEFAULT 0,
+  rating_count_5 INTEGER NOT NULL DEFAULT 0,
   opening_hours JSONB,
   closing_hours JSONB,
   is_active BOOLEAN DEFAULT TRUE,
@@ -66,7 +74,8 @@ CREATE TABLE reviews (
   visit_date DATE,
   created_at TIMESTAMP DEFAULT NOW(),
   updated_at TIMESTAMP DEFAULT NOW(),
-  CONSTRAINT check_review_rating CHECK (rating >= 1 AND rating <= 5)
+  CONSTRAINT check_review_rating CHECK (rating >= 1 AND rating <= 5),
+  CONSTRAINT uq_reviews_user_location UNIQUE (user_id, location_id)
 );
 
 CREATE TABLE itineraries (
@@ -112,7 +121,7 @@ CREATE TABLE user_preferences (
 
 CREATE INDEX IF NOT EXISTS idx_locations_lat_lon ON locations (latitude, longitude);
 CREATE INDEX IF NOT EXISTS idx_locations_district ON locations (district);
-CREATE INDEX IF NOT EXISTS idx_reviews_location_id ON reviews (location_id);
+CREATE INDEX IF NOT EXISTS idx_reviews_location_rating ON reviews (location_id, rating);
 CREATE INDEX IF NOT EXISTS idx_reviews_user_id ON reviews (user_id);
 
 DO $$
@@ -167,6 +167,41 @@ SELECT
 FROM tmp_loc l
 WHERE random() > 0.5;
 
+---------------------------------------------------------------
+-- RATING AGGREGATES (same rebuild as app.services.rating_aggregates)
+-- The seeded rating/review_count are source ratings without review
+-- rows: keep them as the base and add the seeded reviews on top.
+---------------------------------------------------------------
+UPDATE locations SET
+    base_review_count = COALESCE(review_count, 0),
+    base_rating_sum = COALESCE(rating, 0) * COALESCE(review_count, 0);
+
+UPDATE locations AS l SET
+    review_count = t.base_review_count + COALESCE(a.review_count, 0),
+    rating_sum = COALESCE(a.rating_sum, 0),
+    rating_count_1 = COALESCE(a.count_1, 0),
+    rating_count_2 = COALESCE(a.count_2, 0),
+    rating_count_3 = COALESCE(a.count_3, 0),
+    rating_count_4 = COALESCE(a.count_4, 0),
+    rating_count_5 = COALESCE(a.count_5, 0),
+    rating = (t.base_rating_sum + COALESCE(a.rating_sum, 0))
+        / NULLIF(t.base_review_count + COALESCE(a.review_count, 0), 0)
+FROM locations AS t
+LEFT JOIN (
+    SELECT
+        location_id,
+        COUNT(*) AS review_count,
+        SUM(rating) AS rating_sum,
+        COUNT(*) FILTER (WHERE rating = 1) AS count_1,
+        COUNT(*) FILTER (WHERE rating = 2) AS count_2,
+        COUNT(*) FILTER (WHERE rating = 3) AS count_3,
+        COUNT(*) FILTER (WHERE rating = 4) AS count_4,
+        COUNT(*) FILTER (WHERE rating = 5) AS count_5
+    FROM reviews
+    GROUP BY location_id
+) AS a ON a.location_id = t.id
+WHERE l.id = t.id;
+
 ---------------------------------------------------------------
 -- DONE
 ---------------------------------------------------------------
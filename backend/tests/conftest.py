@@ -0,0 +1,66 @@
+"""
+Shared fixtures for the backend tests.
+
+Tests using the db fixture run against the Postgres database in
+DATABASE_URL (schema.sql loaded) and are skipped when it is not set.
+Every such test works inside a transaction that is rolled back
+afterwards, so the database is left unchanged.
+"""
+
+import os
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+# app.database builds its engine on import; it only connects when used
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/sss")
+
+
+@pytest.fixture
+def db():
+    """Session bound to a connection whose transaction is rolled back."""
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+
+    from app.database import engine
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture
+def count_queries(db):
+    """
+    Count the SQL statements sent by the db session inside a block.
+
+    Example:
+        with count_queries() as queries:
+            service.get_user_with_history(user_id)
+        assert len(queries) == 2
+    """
+    from contextlib import contextmanager
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        connection = db.connection()
+        event.listen(connection, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(connection, "before_cursor_execute", record)
+
+    return counter
@@ -0,0 +1,44 @@
+"""
+Bulk review ingestion: duplicates within a batch and across batches are
+both skipped and counted, without remembering earlier batches.
+"""
+
+import uuid
+
+from app.models import Location, Review, User
+from app.services.review_service import ReviewService
+
+
+def test_duplicates_within_and_across_batches(db):
+    user = User(email=f"bulk-{uuid.uuid4()}@example.com", full_name="Bulk Test")
+    locations = [
+        Location(name=f"Bulk {i}", name_vi=f"Bulk {i}", address="1 Test Street",
+                 latitude=10.77, longitude=106.70)
+        for i in range(3)
+    ]
+    db.add_all([user, *locations])
+    db.flush()
+
+    def row(location, rating):
+        return {'user_id': user.id, 'location_id': location.id, 'rating': rating}
+
+    reviews = [
+        row(locations[0], 5),
+        row(locations[0], 1),   # same batch: dropped before the INSERT
+        row(locations[1], 4),
+        row(locations[0], 2),   # next batch: skipped by ON CONFLICT
+        row(locations[2], 3),
+        {'rating': 9},          # invalid
+    ]
+
+    stats = ReviewService(db).bulk_ingest_reviews(iter(reviews), batch_size=2)
+
+    assert stats['received'] == 6
+    assert stats['inserted'] == 3
+    assert stats['duplicates'] == 2
+    assert stats['invalid'] == 1
+    ratings = {
+        r.location_id: r.rating
+        for r in db.query(Review).filter(Review.user_id == user.id)
+    }
+    assert ratings == {locations[0].id: 5, locations[1].id: 4, locations[2].id: 3}
@@ -0,0 +1,94 @@
+"""
+Rule-based intent extraction: confident hits only for complete, simple
+requests, and no fast path for messages whose "start point" is just
+text after a start cue.
+"""
+
+import pytest
+
+from app.services.intent_rules import (
+    RULE_CONFIDENCE_THRESHOLD,
+    Gazetteer,
+    extract_intent,
+)
+
+GAZETTEER = Gazetteer(
+    places={
+        'cho ben thanh': 'Chợ Bến Thành',
+        'ben thanh market': 'Chợ Bến Thành',
+        'nha tho duc ba': 'Nhà thờ Đức Bà',
+        'notre dame cathedral': 'Nhà thờ Đức Bà',
+    },
+    categories={'cafe': 'Café', 'museum': 'Museum'},
+)
+
+
+@pytest.mark.parametrize("message, start, poi_type", [
+    ("Tôi đang ở Chợ Bến Thành, muốn đi uống cà phê", "Chợ Bến Thành", "Café"),
+    ("coffee near Notre Dame Cathedral", "Nhà thờ Đức Bà", "Café"),
+    ("Đi từ Chợ Bến Thành đến bảo tàng", "Chợ Bến Thành", "Museum"),
+    ("museum from Ben Thanh Market to the river", "Chợ Bến Thành", "Museum"),
+])
+def test_simple_requests_hit(message, start, poi_type):
+    intent, confidence = extract_intent(message, GAZETTEER)
+
+    assert confidence >= RULE_CONFIDENCE_THRESHOLD
+    assert intent['start'] == start
+    assert intent['poi_type'] == poi_type
+
+
+def test_follow_up_uses_known_start():
+    intent, confidence = extract_intent("còn quán ăn thì sao?", GAZETTEER, known_start=True)
+
+    assert confidence >= RULE_CONFIDENCE_THRESHOLD
+    assert intent['start'] == ''
+    assert intent['poi_type'] == 'food'
+
+
+@pytest.mark.parametrize("message", [
+    "Tư vấn giúp tôi đi đâu chơi",
+    "Gợi ý giúp mình vài chỗ chơi từ thiện",
+    "Hôm nay tôi ở nhà, gợi ý phim hay",
+    "Tôi ở Việt Nam được 3 ngày, nên đi đâu?",
+    "from now on answer in english, recommend a cafe",
+])
+def test_no_fast_path_without_a_known_start(message):
+    _, confidence = extract_intent(message, GAZETTEER)
+
+    assert confidence < RULE_CONFIDENCE_THRESHOLD
+
+
+def test_unknown_start_overrides_session_start():
+    # A start given in the message replaces the session's one, so an
+    # unknown start is not trusted in a follow-up either
+    intent, confidence = extract_intent(
+        "Tôi ở Việt Nam được 3 ngày, nên đi đâu?", GAZETTEER, known_start=True
+    )
+
+    assert intent['start']
+    assert confidence < RULE_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("message", [
+    "Tư vấn giúp tôi đi đâu chơi",
+    "Gợi ý giúp mình vài chỗ chơi từ thiện",
+    "Hôm nay tôi ở nhà, gợi ý phim hay",
+    "from now on answer in english, recommend a cafe",
+])
+def test_start_cues_do_not_match_ordinary_words(message):
+    intent, _ = extract_intent(message, GAZETTEER)
+
+    assert intent['start'] == ''
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("Quán cà phê giá rẻ gần Chợ Bến Thành", 'budget'),
+    ("quan ca phe gia re gan cho ben thanh", 'budget'),
+    ("Cần quán cà phê gấp gần Chợ Bến Thành", 'fast'),
+    ("Đến Chợ Bến Thành thì rẽ trái, có quán cà phê nào không", 'unknown'),
+    ("Tôi muốn gặp bạn ở quán cà phê gần Chợ Bến Thành", 'unknown'),
+])
+def test_cues_respect_accents(message, intent):
+    extracted, _ = extract_intent(message, GAZETTEER)
+
+    assert extracted['intent'] == intent
@@ -0,0 +1,50 @@
+"""
+Batch itinerary edits: stops are rewritten and only changed legs are
+recomputed.
+"""
+
+import asyncio
+import uuid
+
+from app.models import ItineraryLocation, Location, User
+from app.services import route_legs
+from app.services.itinerary_service import ItineraryService
+
+
+def test_reorder_rewrites_stops(db, monkeypatch):
+    monkeypatch.setattr(route_legs, 'VIETMAP_BASE_URL', None)
+    user = User(email=f"edit-{uuid.uuid4()}@example.com", full_name="Edit Test")
+    locations = [
+        Location(name=f"Edit {i}", name_vi=f"Edit {i}", address="1 Test Street",
+                 latitude=10.77 + i / 100, longitude=106.70)
+        for i in range(3)
+    ]
+    db.add_all([user, *locations])
+    db.flush()
+
+    service = ItineraryService(db)
+    itinerary = service.create_itinerary_with_stops(
+        user_id=user.id,
+        name="Edit Trip",
+        stops=[
+            {'location_id': location.id, 'distance_from_previous': 1.0,
+             'travel_time': 5, 'transport_mode': 'car'}
+            for location in locations
+        ]
+    )
+    a, b, c = (location.id for location in locations)
+
+    details = asyncio.run(service.reorder_itinerary(itinerary.id, [b, a, c]))
+
+    assert details['legs']['total_legs'] == 3
+    assert details['legs']['unchanged'] == 0   # every stop got a new predecessor
+    assert details['legs']['api_calls'] == 0
+    order = [
+        row.location_id
+        for row in db.query(ItineraryLocation)
+        .filter(ItineraryLocation.itinerary_id == itinerary.id)
+        .order_by(ItineraryLocation.visit_order)
+    ]
+    assert order == [b, a, c]
+
+    assert asyncio.run(service.reorder_itinerary(itinerary.id, [a, b])) is None
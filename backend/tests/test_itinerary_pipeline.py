@@ -0,0 +1,69 @@
+"""
+Itinerary pipeline: candidates are every active location, and invalid
+input is rejected before anything is written.
+"""
+
+import asyncio
+import uuid
+
+from app.models import Itinerary, Location, User
+from app.services import route_legs
+from app.services.itinerary_pipeline import build_itinerary_from_recommendations
+from app.services.itinerary_service import ItineraryService
+from app.services.location_service import LocationService
+
+START = {'lat': 10.7720, 'lng': 106.6981}
+
+
+def _user(db):
+    user = User(email=f"pipeline-{uuid.uuid4()}@example.com", full_name="Pipeline Test")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def test_active_locations_are_not_paginated(db):
+    db.add_all([
+        Location(name=f"Pipeline {i}", name_vi=f"Pipeline {i}", address="1 Test Street",
+                 latitude=10.77, longitude=106.70, is_active=i % 2 == 0)
+        for i in range(240)
+    ])
+    db.flush()
+
+    active = db.query(Location).filter(Location.is_active == True).count()
+    assert active > 100
+    assert len(LocationService(db).get_active_locations()) == active
+
+
+def test_build_saves_itinerary(db, monkeypatch):
+    monkeypatch.setattr(route_legs, 'VIETMAP_BASE_URL', None)
+    user = _user(db)
+    db.add_all([
+        Location(name=f"Stop {i}", name_vi=f"Stop {i}", address="1 Test Street",
+                 latitude=10.77 + i / 1000, longitude=106.70)
+        for i in range(3)
+    ])
+    db.flush()
+
+    result = asyncio.run(build_itinerary_from_recommendations(
+        db, user.id, start_point=START, max_stops=2, transport_mode='walk'
+    ))
+
+    assert len(result['details']['locations']) == 2
+    assert set(result['timings_ms']) >= {'load', 'select', 'route', 'persist', 'details'}
+
+
+def test_invalid_input_is_rejected(db):
+    user = _user(db)
+    service = ItineraryService(db)
+    stop = {'location_id': uuid.uuid4(), 'distance_from_previous': 1.0,
+            'travel_time': 5, 'transport_mode': 'boat'}
+
+    assert service.create_itinerary_with_stops(user.id, "Trip", [stop]) is None
+    assert service.create_itinerary_with_stops(
+        uuid.uuid4(), "Trip", [{**stop, 'transport_mode': 'car'}]
+    ) is None
+    assert asyncio.run(build_itinerary_from_recommendations(
+        db, user.id, start_point=START, transport_mode='boat'
+    )) is None
+    assert db.query(Itinerary).filter(Itinerary.user_id == user.id).count() == 0
@@ -0,0 +1,80 @@
+"""
+Leaderboard warm-up: a review committed before the warm-up query but
+reported after it is counted once.
+"""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.models import Location, User
+from app.services import leaderboard as leaderboard_module
+from app.services.leaderboard import (
+    InMemoryLeaderboardStore,
+    Leaderboard,
+    snapshot_sees,
+)
+from app.services.review_service import ReviewService
+from conftest import DATABASE_URL
+
+
+def test_snapshot_sees():
+    assert snapshot_sees("100:105:", 99)
+    assert snapshot_sees("100:105:102", 101)
+    assert not snapshot_sees("100:105:102", 102)   # still running
+    assert not snapshot_sees("100:105:102", 105)   # started later
+
+
+def test_write_reported_after_warm_is_deduped():
+    board = Leaderboard(InMemoryLeaderboardStore())
+    board.store.replace(board._current_buckets()['all'], {'u1': 1})
+    board.store.mark_warm("100:105:102")
+    now = datetime.now()
+
+    board.record_review('u1', now, xid=101)   # already in the warm counts
+    assert board.top(window='all') == [('u1', 1)]
+
+    board.record_review('u1', now, xid=102)   # committed after the snapshot
+    board.record_review('u1', now, xid=107)
+    board.record_review('u1', now)            # no xid: always applied
+    assert board.top(window='all') == [('u1', 4)]
+
+
+def test_review_committed_before_warm_counts_once(monkeypatch):
+    # Needs real commits: a snapshot taken inside the writing transaction
+    # still lists it as running
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    from app.database import SessionLocal
+
+    board = Leaderboard(InMemoryLeaderboardStore())
+    reported = []
+    monkeypatch.setattr(leaderboard_module, '_leaderboard', board)
+    monkeypatch.setattr(board, 'record_review', lambda *a, **kw: reported.append((a, kw)))
+
+    db = SessionLocal()
+    user = User(email=f"board-{uuid.uuid4()}@example.com", full_name="Board Test")
+    location = Location(name="Board", name_vi="Board", address="1 Test Street",
+                        latitude=10.77, longitude=106.70)
+    try:
+        db.add_all([user, location])
+        db.commit()
+        review, error = ReviewService(db).insert_review(
+            user_id=user.id, location_id=location.id, rating=5
+        )
+        assert error is None
+
+        # The warm-up runs between the commit and the report
+        del board.record_review
+        board.warm(db)
+        (args, kwargs), = reported
+        board.record_review(*args, **kwargs)
+
+        assert dict(board.top(10 ** 6, window='all'))[str(user.id)] == 1
+    finally:
+        db.rollback()
+        db.delete(db.merge(user))
+        db.delete(db.merge(location))
+        db.commit()
+        db.close()
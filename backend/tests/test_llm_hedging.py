@@ -0,0 +1,62 @@
+"""
+Hedged LLM calls: the scheduler slot taken for a hedge is always given
+back.
+"""
+
+import asyncio
+
+from app.services.llm_hedging import HedgeBudget, HedgedProvider, LatencyTracker
+from app.services.llm_providers import LLMProvider
+from app.services.llm_scheduler import LLMScheduler
+
+
+class SlowProvider(LLMProvider):
+    name = "slow"
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.seconds)
+        return self.name
+
+
+def _provider(scheduler, primary_seconds=1.0, hedge_seconds=1.0):
+    return HedgedProvider(
+        SlowProvider(primary_seconds),
+        SlowProvider(hedge_seconds),
+        tracker=LatencyTracker(),
+        scheduler=scheduler,
+        budget=HedgeBudget(rate=1, burst=1)
+    )
+
+
+def test_hedge_cancelled_before_it_runs_releases_its_slot():
+    scheduler = LLMScheduler(max_concurrency=2)
+
+    async def scenario():
+        hedge = _provider(scheduler)._start_hedge("prompt")
+        assert scheduler.metrics()["in_flight"] == 1
+        hedge.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert scheduler.metrics()["in_flight"] == 0
+
+
+def test_caller_cancelled_while_hedging_releases_its_slot(monkeypatch):
+    scheduler = LLMScheduler(max_concurrency=2)
+    provider = _provider(scheduler)
+    monkeypatch.setattr(provider.tracker, "hedge_delay", lambda model: 0.01)
+
+    async def scenario():
+        call = asyncio.create_task(provider.generate("prompt"))
+        await asyncio.sleep(0.05)
+        assert scheduler.metrics()["in_flight"] == 1
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert scheduler.metrics()["in_flight"] == 0
@@ -0,0 +1,73 @@
+"""
+LLM scheduler: deadlines, lane priority, and the chat fallback reply
+when a call misses its deadline.
+"""
+
+import asyncio
+
+import pytest
+
+from app.routers import ai_routes
+from app.services.llm_scheduler import LLMScheduler, LLMTimeout
+
+
+def test_call_past_its_deadline_raises_and_frees_the_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def scenario():
+        with pytest.raises(LLMTimeout):
+            await scheduler.run(lambda: asyncio.sleep(1), timeout=0.05)
+
+    asyncio.run(scenario())
+    metrics = scheduler.metrics()
+    assert metrics["in_flight"] == 0
+    assert metrics["lanes"]["interactive"]["run_timeouts"] == 1
+
+
+def test_queued_call_times_out_while_waiting():
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def scenario():
+        busy = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMTimeout):
+            await scheduler.run(lambda: asyncio.sleep(0), timeout=0.05)
+        await busy
+
+    asyncio.run(scenario())
+    assert scheduler.metrics()["lanes"]["interactive"]["queue_timeouts"] == 1
+    assert scheduler.metrics()["in_flight"] == 0
+
+
+def test_interactive_is_served_before_background():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    async def call(lane):
+        async def record():
+            order.append(lane)
+        await scheduler.run(record, lane=lane)
+
+    async def scenario():
+        busy = asyncio.create_task(scheduler.run(lambda: asyncio.sleep(0.05)))
+        await asyncio.sleep(0)
+        # Background queued first, interactive still goes first
+        queued = [asyncio.create_task(call("background"))]
+        await asyncio.sleep(0)
+        queued.append(asyncio.create_task(call("interactive")))
+        await asyncio.gather(busy, *queued)
+
+    asyncio.run(scenario())
+    assert order == ["interactive", "background"]
+
+
+def test_chat_reply_falls_back_when_the_llm_times_out(monkeypatch):
+    class TimingOut:
+        async def generate_short_answer(self, message, timeout=None):
+            raise LLMTimeout("LLM call (interactive) did not finish before its deadline")
+
+    monkeypatch.setattr(ai_routes, "get_ai_service", lambda: TimingOut())
+
+    reply = asyncio.run(ai_routes.short_reply("Bảo tàng nào đẹp?"))
+
+    assert reply == ai_routes.CHAT_FALLBACK_REPLY
@@ -0,0 +1,57 @@
+"""
+Rating aggregates: review writes move a location's rating from its
+source (base) rating, never from zero.
+"""
+
+import uuid
+
+from app.models import Location, User
+from app.services.rating_aggregates import rebuild_location_aggregates
+from app.services.review_service import ReviewService
+
+
+def make_location(db, rating: float, review_count: int) -> Location:
+    """A location imported with a source rating and no review rows."""
+    location = Location(
+        name="Aggregate Test",
+        name_vi="Aggregate Test",
+        address="1 Test Street",
+        latitude=10.77,
+        longitude=106.70,
+        rating=rating,
+        review_count=review_count,
+        base_review_count=review_count,
+        base_rating_sum=rating * review_count,
+    )
+    db.add(location)
+    db.flush()
+    return location
+
+
+def make_user(db) -> User:
+    user = User(email=f"aggregate-{uuid.uuid4()}@example.com", full_name="Aggregate Test")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def test_first_review_keeps_source_rating(db):
+    location = make_location(db, 4.7, 1500)
+    user = make_user(db)
+
+    ReviewService(db).insert_review(user.id, location.id, 5)
+    db.refresh(location)
+
+    assert location.review_count == 1501
+    assert location.rating_sum == 5
+    assert abs(location.rating - (4.7 * 1500 + 5) / 1501) < 1e-9
+
+
+def test_rebuild_keeps_source_rating(db):
+    location = make_location(db, 4.7, 1500)
+
+    rebuild_location_aggregates(db, [location.id])
+    db.refresh(location)
+
+    assert location.review_count == 1500
+    assert abs(location.rating - 4.7) < 1e-9
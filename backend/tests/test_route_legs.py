@@ -0,0 +1,46 @@
+"""
+Leg resolution: the Redis leg cache is used from a worker thread, not
+from the event loop.
+"""
+
+import asyncio
+import threading
+
+from app.services import route_legs
+from app.services.cache import RedisCache
+
+
+class RecordingClient:
+    """Stand-in Redis client that records the thread of every call."""
+
+    def __init__(self):
+        self.values = {}
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.threads.append(threading.get_ident())
+        self.values[key] = value
+
+
+def test_redis_leg_cache_runs_off_the_event_loop(monkeypatch):
+    client = RecordingClient()
+    monkeypatch.setattr(route_legs, 'LEG_CACHE', RedisCache(client, 'route_leg'))
+    monkeypatch.setattr(route_legs, 'VIETMAP_BASE_URL', None)
+    start = {'lat': 10.7720, 'lng': 106.6981}
+    museum = {'id': 'museum', 'lat': 10.7797, 'lng': 106.6918}
+
+    async def resolve():
+        return threading.get_ident(), await route_legs.resolve_legs([
+            (start, museum, 'walk'),
+            (museum, start, 'walk'),
+        ])
+
+    loop_thread, legs = asyncio.run(resolve())
+
+    assert [leg['source'] for leg in legs] == ['haversine', 'haversine']
+    assert len(client.threads) == 2
+    assert loop_thread not in client.threads
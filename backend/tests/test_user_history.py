@@ -0,0 +1,49 @@
+"""
+UserService.get_user_with_history must run a fixed number of queries,
+however long the user's review history is.
+"""
+
+import uuid
+
+import pytest
+
+from app.models import Category, Location, LocationCategory, Review, User
+from app.services.user_service import UserService
+
+
+def make_user_with_reviews(db, review_count: int) -> uuid.UUID:
+    """Insert a user who reviewed review_count new locations (one category each)."""
+    user = User(email=f"history-{uuid.uuid4()}@example.com", full_name="History Test")
+    category = Category(name=f"history-{uuid.uuid4()}", name_vi="Lịch sử test")
+    db.add_all([user, category])
+    db.flush()
+
+    for i in range(review_count):
+        location = Location(
+            name=f"History Test {i}",
+            name_vi=f"History Test {i}",
+            address="1 Test Street",
+            latitude=10.77,
+            longitude=106.70,
+        )
+        db.add(location)
+        db.flush()
+        db.add_all([
+            LocationCategory(location_id=location.id, category_id=category.id),
+            Review(user_id=user.id, location_id=location.id, rating=1 + i % 5),
+        ])
+    db.flush()
+    return user.id
+
+
+@pytest.mark.parametrize("review_count", [1, 200])
+def test_history_query_count_is_constant(db, count_queries, review_count):
+    user_id = make_user_with_reviews(db, review_count)
+    service = UserService(db)
+
+    with count_queries() as queries:
+        data = service.get_user_with_history(user_id)
+
+    assert len(data["history"]) == review_count
+    assert all(len(h["categories"]) == 1 for h in data["history"])
+    assert len(queries) == 2
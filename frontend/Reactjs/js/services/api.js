@@ -359,8 +359,10 @@ class ApiService {
             return this._mockDelay({ mode: "chat", reply: `[Mock] Chat-router`, selected_locations: [] });
         }
         try {
-            const payload = { message, user_id: userId };
+            // session_id lets the server keep context between turns
+            const payload = { message, user_id: userId, session_id: this.chatSessionId ?? null };
             const data = await this._apiPost("/ai/chat-router", payload);
+            this.chatSessionId = data?.session?.session_id ?? this.chatSessionId;
             return {
                 reply: data?.reply ?? "Xin lỗi, server không phản hồi.",
                 selected_locations: data?.selected_locations ?? [],